@@ -8,6 +8,9 @@ from __future__ import annotations
 import json
 import logging
 import sqlite3
+import threading
+import time
+import weakref
 from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
@@ -22,23 +25,147 @@ logger = logging.getLogger("sniper.db")
 
 DB_PATH = Path(__file__).parent / "data" / "sniper.db"
 
+# price_history tiers: raw 5-min snapshots feed 24h charts and 30d trends,
+# hourly OHLC feeds 7d/30d charts, daily OHLC is kept forever for "all".
+RAW_HISTORY_DAYS = 31
+HOURLY_HISTORY_DAYS = 180
+PRUNE_BATCH_SIZE = 5000
+_ROLLUP_BUCKETS = {
+    "price_history_hourly": "%Y-%m-%d %H:00:00",
+    "price_history_daily": "%Y-%m-%d 00:00:00",
+}
 
-@contextmanager
-def get_conn() -> Generator[sqlite3.Connection]:
-    """Return a configured SQLite connection with WAL mode."""
-    conn = sqlite3.connect(str(DB_PATH), timeout=5.0)
+# ~30 distinct statements live in this module; leave headroom for f-string variants.
+STATEMENT_CACHE_SIZE = 64
+
+# Connections are pooled per thread (FastAPI runs sync endpoints in a threadpool,
+# sqlite3 connections must not be shared between threads) and per DB_PATH, so
+# PRAGMAs run once per connection instead of once per query. A thread's
+# connections are closed when the thread exits: AnyIO retires idle workers.
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool: set[sqlite3.Connection] = set()
+_pool_generation = 0  # bumped by close_all_connections() to drop stale thread caches
+
+
+class _ThreadConns:
+    """One thread's connections by (DB_PATH, readonly), closed once the thread drops it."""
+
+    __slots__ = ("__weakref__", "by_key", "generation")
+
+    def __init__(self, generation: int) -> None:
+        self.by_key: dict[tuple[str, bool], sqlite3.Connection] = {}
+        self.generation = generation
+        weakref.finalize(self, _release_conns, self.by_key)
+
+
+def _release_conns(conns: dict[tuple[str, bool], sqlite3.Connection]) -> None:
+    with _pool_lock:
+        _pool.difference_update(conns.values())
+    for conn in conns.values():
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def _open_conn(readonly: bool) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        str(DB_PATH),
+        timeout=5.0,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,  # only so close_all_connections() can close it
+    )
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA busy_timeout=5000")
     conn.execute("PRAGMA foreign_keys=ON")
+    if readonly:
+        # Not mode=ro: a read-only WAL reader cannot create -shm/-wal on a cold DB.
+        conn.execute("PRAGMA query_only=ON")
+    with _pool_lock:
+        _pool.add(conn)
+    return conn
+
+
+def _thread_conn(readonly: bool) -> sqlite3.Connection:
+    conns: _ThreadConns | None = getattr(_local, "conns", None)
+    if conns is None or conns.generation != _pool_generation:
+        conns = _local.conns = _ThreadConns(_pool_generation)
+    key = (str(DB_PATH), readonly)
+    conn = conns.by_key.get(key)
+    if conn is None:
+        conn = conns.by_key[key] = _open_conn(readonly)
+    return conn
+
+
+@contextmanager
+def get_conn() -> Generator[sqlite3.Connection]:
+    """Yield this thread's pooled writer connection; commit on success.
+
+    Nested use in one thread shares the transaction and commits once, at the
+    outermost exit.
+    """
+    conn = _thread_conn(readonly=False)
+    depth = getattr(_local, "write_depth", 0)
+    _local.write_depth = depth + 1
     try:
         yield conn
-        conn.commit()
+        if depth == 0:
+            conn.commit()
     except Exception:
-        conn.rollback()
+        if depth == 0:
+            conn.rollback()
         raise
     finally:
-        conn.close()
+        _local.write_depth = depth
+
+
+@contextmanager
+def get_read_conn() -> Generator[sqlite3.Connection]:
+    """Yield this thread's pooled read-only connection (PRAGMA query_only)."""
+    yield _thread_conn(readonly=True)
+
+
+def close_all_connections() -> None:
+    """Close every pooled connection (shutdown, tests switching DB_PATH)."""
+    global _pool_generation
+    with _pool_lock:
+        conns = list(_pool)
+        _pool.clear()
+        _pool_generation += 1
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+_version_lock = threading.Lock()
+_version_conn: sqlite3.Connection | None = None
+_version_key: tuple[str, int] | None = None  # (DB_PATH, pool generation) of _version_conn
+_version_raw: int | None = None
+_version = 0
+
+
+def data_version() -> int:
+    """Counter that moves whenever anything (this process or the bot) commits to the DB.
+
+    Backed by PRAGMA data_version on one dedicated connection that never
+    writes, so every commit from any other connection is visible to it.
+    """
+    global _version_conn, _version_key, _version_raw, _version
+    with _version_lock:
+        key = (str(DB_PATH), _pool_generation)
+        if _version_conn is None or _version_key != key:
+            _version_conn = _open_conn(readonly=True)
+            _version_key = key
+            _version_raw = None
+        raw = _version_conn.execute("PRAGMA data_version").fetchone()[0]
+        if raw != _version_raw:
+            _version_raw = raw
+            _version += 1
+        return _version
 
 
 @beartype
@@ -70,6 +197,30 @@ def init_db() -> None:
             );
             CREATE INDEX IF NOT EXISTS idx_ph_name_ts
                 ON price_history(name_lower, ts);
+            CREATE INDEX IF NOT EXISTS idx_ph_ts
+                ON price_history(ts);
+
+            CREATE TABLE IF NOT EXISTS price_history_hourly (
+                name_lower  TEXT NOT NULL,
+                bucket      TEXT NOT NULL,
+                open        REAL NOT NULL,
+                high        REAL NOT NULL,
+                low         REAL NOT NULL,
+                close       REAL NOT NULL,
+                samples     INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (name_lower, bucket)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS price_history_daily (
+                name_lower  TEXT NOT NULL,
+                bucket      TEXT NOT NULL,
+                open        REAL NOT NULL,
+                high        REAL NOT NULL,
+                low         REAL NOT NULL,
+                close       REAL NOT NULL,
+                samples     INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (name_lower, bucket)
+            ) WITHOUT ROWID;
 
             CREATE TABLE IF NOT EXISTS alerts (
                 id          INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -100,6 +251,41 @@ def init_db() -> None:
             );
             CREATE UNIQUE INDEX IF NOT EXISTS idx_user_lists_unique
                 ON user_lists(user_id, item_name, list_type);
+
+            -- RU-localized Steam Market names, filled from every Steam search
+            CREATE TABLE IF NOT EXISTS steam_names (
+                hash_name     TEXT PRIMARY KEY,
+                name_ru       TEXT NOT NULL,
+                name_ru_lower TEXT NOT NULL,
+                type_ru       TEXT NOT NULL DEFAULT '',
+                image         TEXT NOT NULL DEFAULT '',
+                name_color    TEXT NOT NULL DEFAULT '',
+                updated_at    TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_steam_names_ru ON steam_names(name_ru_lower);
+
+            -- Latest lis-skins catalog, published by one collector for every process
+            CREATE TABLE IF NOT EXISTS price_catalog (
+                name_lower TEXT PRIMARY KEY,
+                name       TEXT NOT NULL,
+                price      REAL NOT NULL,
+                url        TEXT NOT NULL,
+                count      INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS price_catalog_meta (
+                id         INTEGER PRIMARY KEY CHECK (id = 1),
+                version    INTEGER NOT NULL,
+                items      INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            );
+
+            -- Steam search results per normalized query (hash_names in Steam order)
+            CREATE TABLE IF NOT EXISTS steam_queries (
+                query       TEXT PRIMARY KEY,
+                hash_names  TEXT NOT NULL,
+                complete    INTEGER NOT NULL,
+                fetched_at  REAL NOT NULL
+            );
         """)
         # Migrate: add columns if missing (safe for existing DBs)
         cols = {row[1] for row in conn.execute("PRAGMA table_info(watchlist)")}
@@ -120,11 +306,39 @@ def init_db() -> None:
         if "last_notified_above_at" not in list_cols:
             conn.execute("ALTER TABLE user_lists ADD COLUMN last_notified_above_at TEXT")
 
+        # Backfill rollups once for DBs that predate them
+        for table, fmt in _ROLLUP_BUCKETS.items():
+            if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is None:
+                _backfill_rollup(conn, table, fmt)
+
+
+def _backfill_rollup(conn: sqlite3.Connection, table: str, fmt: str) -> None:
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO {table}(name_lower, bucket, open, high, low, close, samples)
+        SELECT DISTINCT name_lower, bucket,
+               FIRST_VALUE(price_usd) OVER w,
+               MAX(price_usd) OVER w,
+               MIN(price_usd) OVER w,
+               LAST_VALUE(price_usd) OVER w,
+               COUNT(*) OVER w
+        FROM (
+            SELECT id, name_lower, price_usd, ts, strftime(?, ts) AS bucket
+            FROM price_history
+        )
+        WINDOW w AS (
+            PARTITION BY name_lower, bucket ORDER BY ts, id
+            ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+        )
+        """,
+        (fmt,),
+    )
+
 
 @beartype
 def get_watchlist() -> dict[str, list[dict]]:
     """Drop-in replacement for _load_watchlist(). Returns {buy: [...], sell: [...]}."""
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         rows = conn.execute(
             "SELECT * FROM watchlist ORDER BY added_at"
         ).fetchall()
@@ -180,7 +394,7 @@ def remove_item(name: str) -> int:
 @beartype
 def get_watchlist_names() -> set[str]:
     """Return set of name_lower strings from watchlist."""
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         rows = conn.execute(
             "SELECT DISTINCT name_lower FROM watchlist"
         ).fetchall()
@@ -189,23 +403,62 @@ def get_watchlist_names() -> set[str]:
 
 @beartype
 def insert_price_snapshots(snapshots: list[tuple[str, float]]) -> None:
-    """Bulk insert price history rows."""
+    """Bulk insert price history rows and fold them into hourly/daily OHLC."""
     with get_conn() as conn:
         conn.executemany(
             "INSERT INTO price_history(name_lower, price_usd) VALUES (?,?)",
             snapshots,
         )
+        for table, fmt in _ROLLUP_BUCKETS.items():
+            conn.executemany(
+                f"""
+                INSERT INTO {table}(name_lower, bucket, open, high, low, close, samples)
+                VALUES (?, strftime('{fmt}', 'now'), ?, ?, ?, ?, 1)
+                ON CONFLICT(name_lower, bucket) DO UPDATE SET
+                    high=MAX(high, excluded.high),
+                    low=MIN(low, excluded.low),
+                    close=excluded.close,
+                    samples=samples + 1
+                """,
+                [(name, price, price, price, price) for name, price in snapshots],
+            )
+
+
+def _delete_in_batches(table: str, where_sql: str, params: tuple) -> int:
+    """DELETE in short transactions so WAL writers never wait on one big purge."""
+    total = 0
+    while True:
+        with get_conn() as conn:
+            cur = conn.execute(
+                f"DELETE FROM {table} WHERE rowid IN "
+                f"(SELECT rowid FROM {table} WHERE {where_sql} LIMIT ?)",
+                (*params, PRUNE_BATCH_SIZE),
+            )
+            deleted = cur.rowcount
+        total += deleted
+        if deleted < PRUNE_BATCH_SIZE:
+            return total
 
 
 @beartype
-def prune_old_history(days: int = 90) -> int:
-    """Delete price_history rows older than N days. Returns rowcount."""
+def prune_old_history(
+    days: int = RAW_HISTORY_DAYS,
+    hourly_days: int = HOURLY_HISTORY_DAYS,
+) -> int:
+    """Delete raw price_history rows older than N days. Returns rowcount.
+
+    Hourly rollups older than hourly_days go too; daily rollups are kept.
+    """
+    pruned = _delete_in_batches(
+        "price_history", "ts < datetime('now', ?)", (f"-{days} days",)
+    )
+    # Hourly tier is ~12x smaller than raw, one DELETE stays short
     with get_conn() as conn:
-        cur = conn.execute(
-            "DELETE FROM price_history WHERE ts < datetime('now', ?)",
-            (f"-{days} days",),
+        conn.execute(
+            "DELETE FROM price_history_hourly WHERE bucket < strftime('%Y-%m-%d %H:00:00', 'now', ?)",
+            (f"-{hourly_days} days",),
         )
-        return cur.rowcount
+    return pruned
 
 
 @beartype
@@ -271,7 +524,7 @@ def get_price_history(name: str, tf: str = "7d") -> list[dict]:
     Timeframes: '24h', '7d', '30d', 'all'. Defaults to '7d' if invalid.
     """
     tf_map = {"24h": "-1 day", "7d": "-7 days", "30d": "-30 days"}
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         if tf == "all":
             rows = conn.execute(
                 "SELECT price_usd, ts FROM price_history "
@@ -289,6 +542,72 @@ def get_price_history(name: str, tf: str = "7d") -> list[dict]:
     return [dict(row) for row in rows]
 
 
+# Chart timeframe -> (tier table, window). Keeps every chart in the low hundreds of points.
+_CHART_TIERS: dict[str, tuple[str, str | None]] = {
+    "24h": ("price_history", "-1 day"),
+    "7d": ("price_history_hourly", "-7 days"),
+    "30d": ("price_history_hourly", "-30 days"),
+    "all": ("price_history_daily", None),
+}
+
+
+@beartype
+def get_chart_history(name: str, tf: str = "7d") -> list[dict]:
+    """Return chart points from the rollup tier matching the timeframe.
+
+    Raw rows carry only price_usd/ts; rollup rows add open/high/low and use
+    the bucket start as ts and the close as price_usd.
+    """
+    table, modifier = _CHART_TIERS.get(tf, _CHART_TIERS["7d"])
+    if table == "price_history":
+        return get_price_history(name, tf)
+    where_sql = "name_lower = ?"
+    params: list[str] = [name.lower()]
+    if modifier:
+        where_sql += " AND bucket >= strftime('%Y-%m-%d %H:00:00', 'now', ?)"
+        params.append(modifier)
+    with get_read_conn() as conn:
+        rows = conn.execute(
+            f"SELECT close AS price_usd, bucket AS ts, open, high, low FROM {table} "
+            f"WHERE {where_sql} ORDER BY bucket ASC",
+            params,
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+@beartype
+def get_price_trend_points(days: int = 30) -> dict[str, tuple[float, float]]:
+    """Return {name_lower: (mid_price_usd, latest_price_usd)} in one pass.
+
+    For every name with at least two rows in the window, picks the same rows
+    as get_price_history(name, "30d")[len // 2] and [-1] would.
+    """
+    with get_read_conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT name_lower, price_usd, rn, cnt FROM (
+                SELECT name_lower, price_usd,
+                       ROW_NUMBER() OVER (PARTITION BY name_lower ORDER BY ts, id) AS rn,
+                       COUNT(*) OVER (PARTITION BY name_lower) AS cnt
+                FROM price_history
+                WHERE ts >= datetime('now', ?)
+            )
+            WHERE cnt >= 2 AND (rn = cnt / 2 + 1 OR rn = cnt)
+            ORDER BY name_lower, rn
+            """,
+            (f"-{days} days",),
+        ).fetchall()
+    points: dict[str, tuple[float, float]] = {}
+    for row in rows:
+        name = row["name_lower"]
+        if name in points:
+            points[name] = (points[name][0], row["price_usd"])
+        else:
+            # cnt == 2 makes mid and latest the same row
+            points[name] = (row["price_usd"], row["price_usd"])
+    return points
+
+
 @beartype
 def get_portfolio_stats(prices: dict[str, float], rate: float = 0.0) -> dict:
     """Compute portfolio stats from current prices map.
@@ -334,7 +653,7 @@ def get_portfolio_stats(prices: dict[str, float], rate: float = 0.0) -> dict:
 @beartype
 def get_recent_alerts(limit: int = 20) -> list[dict]:
     """Return recent alerts for activity feed, DESC by timestamp."""
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         rows = conn.execute(
             "SELECT name, type, price_usd, target_rub, ts, message "
             "FROM alerts ORDER BY ts DESC LIMIT ?",
@@ -343,10 +662,28 @@ def get_recent_alerts(limit: int = 20) -> list[dict]:
     return [dict(row) for row in rows]
 
 
+@beartype
+def get_alerts_after(after_id: int, limit: int = 50) -> list[dict]:
+    """Return alerts logged after after_id, oldest first (push channel)."""
+    with get_read_conn() as conn:
+        rows = conn.execute(
+            "SELECT id, name, type, price_usd, target_rub, ts, message "
+            "FROM alerts WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id, limit),
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def get_max_alert_id() -> int:
+    with get_read_conn() as conn:
+        row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM alerts").fetchone()
+    return int(row[0])
+
+
 @beartype
 def get_cached_rate(currency: str = "USD") -> float | None:
     """Return cached exchange rate or None if not stored."""
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         row = conn.execute(
             "SELECT rate FROM exchange_rates WHERE currency=?", (currency,)
         ).fetchone()
@@ -451,7 +788,7 @@ def rename_list_item(user_id: str, old_name: str, new_name: str, list_type: str)
 @beartype
 def get_list_items(user_id: str, list_type: str | None = None) -> list[dict]:
     """Return user's list items. If list_type is None, return all lists."""
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         if list_type:
             rows = conn.execute(
                 "SELECT id, item_name, list_type, added_at, "
@@ -522,7 +859,7 @@ def set_list_item_targets(
 @beartype
 def get_all_list_items_with_targets() -> list[dict]:
     """Return all list rows that have at least one alert threshold configured."""
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         rows = conn.execute(
             """
             SELECT id, user_id, item_name, list_type, added_at,
@@ -536,15 +873,23 @@ def get_all_list_items_with_targets() -> list[dict]:
     return [dict(row) for row in rows]
 
 
+_NOTIFIED_COLUMNS = {
+    "below": "last_notified_below_at",
+    "above": "last_notified_above_at",
+}
+
+
+def _notified_column(direction: str) -> str:
+    column = _NOTIFIED_COLUMNS.get(direction)
+    if not column:
+        raise ValueError(f"Unknown direction: {direction}")
+    return column
+
+
 @beartype
 def mark_list_item_notified(item_id: int, direction: str, ts: str | None = None) -> int:
     """Persist the timestamp for the last sent list alert in one direction."""
-    column = {
-        "below": "last_notified_below_at",
-        "above": "last_notified_above_at",
-    }.get(direction)
-    if not column:
-        raise ValueError(f"Unknown direction: {direction}")
+    column = _notified_column(direction)
     ts = ts or datetime.now().isoformat(timespec="seconds")
     with get_conn() as conn:
         cur = conn.execute(
@@ -557,12 +902,7 @@ def mark_list_item_notified(item_id: int, direction: str, ts: str | None = None)
 @beartype
 def clear_list_item_notified(item_id: int, direction: str) -> int:
     """Clear cooldown marker when price leaves the triggered zone."""
-    column = {
-        "below": "last_notified_below_at",
-        "above": "last_notified_above_at",
-    }.get(direction)
-    if not column:
-        raise ValueError(f"Unknown direction: {direction}")
+    column = _notified_column(direction)
     with get_conn() as conn:
         cur = conn.execute(
             f"UPDATE user_lists SET {column}=NULL WHERE id=?",
@@ -571,8 +911,210 @@ def clear_list_item_notified(item_id: int, direction: str) -> int:
         return cur.rowcount
 
 
+@beartype
+def apply_list_alert_state(
+    notified: list[tuple[int, str]],
+    cleared: list[tuple[int, str]],
+    ts: str | None = None,
+) -> int:
+    """Persist one alert pass in a single transaction.
+
+    notified/cleared are (item_id, direction) pairs. Returns rows changed.
+    """
+    for _, direction in (*notified, *cleared):
+        _notified_column(direction)
+    ts = ts or datetime.now().isoformat(timespec="seconds")
+    changed = 0
+    with get_conn() as conn:
+        for direction, column in _NOTIFIED_COLUMNS.items():
+            marks = [(ts, item_id) for item_id, d in notified if d == direction]
+            clears = [(item_id,) for item_id, d in cleared if d == direction]
+            if marks:
+                cur = conn.executemany(f"UPDATE user_lists SET {column}=? WHERE id=?", marks)
+                changed += cur.rowcount
+            if clears:
+                cur = conn.executemany(f"UPDATE user_lists SET {column}=NULL WHERE id=?", clears)
+                changed += cur.rowcount
+    return changed
+
+
 def get_all_list_names() -> set[str]:
     """Return every item_name present in any user_list, regardless of user."""
-    with get_conn() as conn:
+    with get_read_conn() as conn:
         rows = conn.execute("SELECT DISTINCT item_name FROM user_lists").fetchall()
     return {row[0] for row in rows}
+
+
+# --- Shared price catalog ---
+
+
+@beartype
+def publish_price_catalog(
+    upserts: list[tuple[str, str, float, str, int]],
+    removed: list[str],
+    *,
+    replace: bool = False,
+) -> int:
+    """Apply one collection to the shared catalog and return its version.
+
+    upserts are (name_lower, name, price, url, count) rows. The version only
+    moves when rows change; updated_at is refreshed on every publish so
+    readers can tell a live producer from a stale table.
+    """
+    with get_conn() as conn:
+        if replace:
+            conn.execute("DELETE FROM price_catalog")
+        conn.executemany(
+            """
+            INSERT INTO price_catalog(name_lower, name, price, url, count) VALUES (?,?,?,?,?)
+            ON CONFLICT(name_lower) DO UPDATE SET
+                name=excluded.name, price=excluded.price,
+                url=excluded.url, count=excluded.count
+            """,
+            upserts,
+        )
+        conn.executemany(
+            "DELETE FROM price_catalog WHERE name_lower=?",
+            [(name_lower,) for name_lower in removed],
+        )
+        row = conn.execute("SELECT version FROM price_catalog_meta WHERE id=1").fetchone()
+        version = row["version"] if row else 0
+        if replace or upserts or removed:
+            version += 1
+        items = conn.execute("SELECT COUNT(*) FROM price_catalog").fetchone()[0]
+        conn.execute(
+            "INSERT OR REPLACE INTO price_catalog_meta(id, version, items, updated_at) VALUES (1,?,?,?)",
+            (version, items, time.time()),
+        )
+    return version
+
+
+def get_price_catalog_state() -> tuple[int, float]:
+    """Return (version, updated_at) of the shared catalog, (0, 0.0) if never published."""
+    with get_read_conn() as conn:
+        row = conn.execute("SELECT version, updated_at FROM price_catalog_meta WHERE id=1").fetchone()
+    return (row["version"], row["updated_at"]) if row else (0, 0.0)
+
+
+def load_price_catalog() -> tuple[int, list[tuple[str, float, str, int]]]:
+    """Return (version, [(name, price, url, count), ...]) read in one snapshot."""
+    with get_read_conn() as conn:
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT version FROM price_catalog_meta WHERE id=1").fetchone()
+            rows = conn.execute("SELECT name, price, url, count FROM price_catalog").fetchall()
+        finally:
+            conn.commit()
+    return (row["version"] if row else 0), [tuple(r) for r in rows]
+
+
+# --- Steam Market RU name map ---
+
+
+def normalize_ru_name(name: str) -> str:
+    """Lowercase, collapse whitespace and fold ё→е for localized name lookups."""
+    return " ".join(name.lower().split()).replace("ё", "е")
+
+
+def _steam_name_rows(conn: sqlite3.Connection, hash_names: list[str]) -> list[dict]:
+    by_name: dict[str, dict] = {}
+    for start in range(0, len(hash_names), 500):
+        chunk = hash_names[start : start + 500]
+        rows = conn.execute(
+            f"""
+            SELECT hash_name, name_ru, type_ru, image, name_color FROM steam_names
+            WHERE hash_name IN ({",".join("?" * len(chunk))})
+            """,
+            chunk,
+        ).fetchall()
+        by_name.update((row["hash_name"], dict(row)) for row in rows)
+    return [by_name[name] for name in hash_names if name in by_name]
+
+
+@beartype
+def save_steam_search(query: str, results: list[dict], complete: bool) -> None:
+    """Store one Steam search: upsert every returned name, then the query's result list."""
+    now = datetime.now().isoformat(timespec="seconds")
+    with get_conn() as conn:
+        conn.executemany(
+            """
+            INSERT INTO steam_names(hash_name, name_ru, name_ru_lower, type_ru, image, name_color, updated_at)
+            VALUES (?,?,?,?,?,?,?)
+            ON CONFLICT(hash_name) DO UPDATE SET
+                name_ru=excluded.name_ru, name_ru_lower=excluded.name_ru_lower,
+                type_ru=excluded.type_ru, image=excluded.image,
+                name_color=excluded.name_color, updated_at=excluded.updated_at
+            """,
+            [
+                (
+                    r["hash_name"], r["name_ru"], normalize_ru_name(r["name_ru"]),
+                    r.get("type_ru", ""), r.get("image", ""), r.get("name_color", ""), now,
+                )
+                for r in results
+                if r.get("hash_name") and r.get("name_ru")
+            ],
+        )
+        conn.execute(
+            """
+            INSERT INTO steam_queries(query, hash_names, complete, fetched_at)
+            VALUES (?,?,?,?)
+            ON CONFLICT(query) DO UPDATE SET
+                hash_names=excluded.hash_names, complete=excluded.complete,
+                fetched_at=excluded.fetched_at
+            """,
+            (
+                query,
+                json.dumps([r["hash_name"] for r in results if r.get("hash_name")]),
+                int(complete),
+                time.time(),
+            ),
+        )
+
+
+@beartype
+def get_steam_search(query: str, max_age_s: int) -> list[dict] | None:
+    """Return stored results for a normalized query, or None if unknown or stale."""
+    with get_read_conn() as conn:
+        row = conn.execute(
+            "SELECT hash_names FROM steam_queries WHERE query=? AND fetched_at>=?",
+            (query, time.time() - max_age_s),
+        ).fetchone()
+        if row is None:
+            return None
+        return _steam_name_rows(conn, json.loads(row["hash_names"]))
+
+
+@beartype
+def get_complete_steam_queries(max_age_s: int) -> list[str]:
+    """Return fresh queries whose every result page was fetched."""
+    with get_read_conn() as conn:
+        rows = conn.execute(
+            "SELECT query FROM steam_queries WHERE complete=1 AND fetched_at>=?",
+            (time.time() - max_age_s,),
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+@beartype
+def prune_steam_queries(max_age_s: int) -> int:
+    """Delete cached Steam queries older than max_age_s. Returns rowcount."""
+    with get_conn() as conn:
+        cur = conn.execute(
+            "DELETE FROM steam_queries WHERE fetched_at<?",
+            (time.time() - max_age_s,),
+        )
+        return cur.rowcount
+
+
+@beartype
+def get_steam_names_by_ru(name_ru: str) -> list[dict]:
+    """Exact localized-name lookup in the RU→EN map."""
+    with get_read_conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT hash_name, name_ru, type_ru, image, name_color FROM steam_names
+            WHERE name_ru_lower=? ORDER BY hash_name
+            """,
+            (normalize_ru_name(name_ru),),
+        ).fetchall()
+    return [dict(row) for row in rows]
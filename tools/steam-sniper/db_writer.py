@@ -0,0 +1,75 @@
+"""Dedicated SQLite writer thread of the dashboard server.
+
+Collector and list-alert DB work runs here so SQLite I/O never blocks the
+event loop. One thread means those writes are serialized in submission
+order and never contend with each other for the SQLite write lock.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import sqlite3
+from collections.abc import Callable, Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import price_cache
+from beartype import beartype
+
+logger = logging.getLogger("sniper.db_writer")
+
+_executor: ThreadPoolExecutor | None = None  # started on first use, stopped by shutdown()
+
+
+async def run(fn: Callable, *args: object) -> object:
+    """Run fn(*args) on the writer thread and return its result."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sniper-db-writer")
+    return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(fn, *args))
+
+
+def shutdown() -> None:
+    """Wait for queued DB work, then stop the writer thread."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+@beartype
+def persist_collection(
+    prices: Mapping[str, dict],
+    changes: dict,
+    rate: float | None,
+    refresh_trends: Callable[[], object],
+) -> tuple[float | None, int]:
+    """DB half of a collection, run on the writer thread.
+
+    Publishes the shared catalog, stores the rate, snapshots watched items,
+    refreshes trends and prunes history. Returns (cached rate when the live
+    fetch failed, number of snapshots written).
+    """
+    # Single producer for the shared catalog the bot reads (see price_cache).
+    try:
+        price_cache.publish(prices, changes)
+    except sqlite3.Error as e:
+        logger.warning("Failed to publish shared price catalog: %s", e)
+
+    cached_rate = None
+    if rate is not None:
+        db.save_rate("USD", rate)
+    else:
+        cached_rate = db.get_cached_rate("USD")
+
+    snapshots = [
+        (name, prices[name]["price"])
+        for name in db.get_watchlist_names()
+        if name in prices
+    ]
+    if snapshots:
+        db.insert_price_snapshots(snapshots)
+    refresh_trends()
+    db.prune_old_history()
+    return cached_rate, len(snapshots)
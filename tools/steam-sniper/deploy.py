@@ -31,11 +31,24 @@ SERVICE_SNAPSHOT_TIMER = "steam-sniper-snapshot.timer"
 # Project files to upload (relative to this script's directory)
 PROJECT_FILES = [
     "server.py",
+    "db_writer.py",
+    "push_events.py",
+    "list_alerts.py",
     "build_image_cache.py",
     "listings_snapshot.py",
+    "snapshot_update.py",
+    "snapshot_stats.py",
     "main.py",
     "db.py",
     "category.py",
+    "search_index.py",
+    "price_feed.py",
+    "http_cache.py",
+    "tg_outbox.py",
+    "steam_market.py",
+    "price_catalog.py",
+    "price_cache.py",
+    "response_cache.py",
     "dashboard.html",
     "pyproject.toml",
     ".env",
@@ -24,7 +24,20 @@ SERVICE_DASHBOARD = "steam-sniper-dashboard"
 FILES = [
     "db.py",
     "server.py",
+    "db_writer.py",
+    "push_events.py",
+    "list_alerts.py",
     "category.py",
+    "search_index.py",
+    "price_feed.py",
+    "http_cache.py",
+    "tg_outbox.py",
+    "steam_market.py",
+    "price_catalog.py",
+    "price_cache.py",
+    "response_cache.py",
+    "snapshot_update.py",
+    "snapshot_stats.py",
     "dashboard.html",
     "static/css/styles.css",
     "static/js/catalog.js",
@@ -0,0 +1,120 @@
+"""Conditional, compressed downloads of the lis-skins JSON exports.
+
+Each export is cached on disk (already decompressed) next to a small
+``<name>.meta.json`` holding the ETag / Last-Modified validators. Later
+fetches send If-None-Match / If-Modified-Since and ask for gzip (and brotli
+when the optional ``brotli`` package is installed); a 304 leaves the cached
+body untouched and tells the caller it can skip re-parsing.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import urllib.error
+import urllib.request
+import zlib
+from collections.abc import Callable
+from datetime import datetime
+from pathlib import Path
+
+from beartype import beartype
+
+try:
+    import brotli
+except ImportError:  # optional: only advertise br when we can decode it
+    brotli = None
+
+logger = logging.getLogger("sniper.http_cache")
+
+USER_AGENT = "SteamSniper/1.0"
+CHUNK_SIZE = 1 << 16
+
+
+def meta_path(body_path: Path) -> Path:
+    return body_path.with_name(body_path.name + ".meta.json")
+
+
+def _load_meta(body_path: Path) -> dict:
+    path = meta_path(body_path)
+    if not body_path.exists() or not path.exists():
+        return {}
+    try:
+        raw = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return raw if isinstance(raw, dict) else {}
+
+
+def _accept_encoding() -> str:
+    return "gzip, br" if brotli is not None else "gzip"
+
+
+def _decoder(encoding: str) -> tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    encoding = encoding.strip().lower()
+    if encoding in ("", "identity"):
+        return (lambda chunk: chunk), (lambda: b"")
+    if encoding in ("gzip", "x-gzip"):
+        decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return decomp.decompress, decomp.flush
+    if encoding == "br" and brotli is not None:
+        decomp = brotli.Decompressor()
+        return decomp.process, (lambda: b"")
+    raise ValueError(f"Unsupported Content-Encoding: {encoding}")
+
+
+@beartype
+def fetch_to_file(
+    url: str,
+    body_path: Path,
+    *,
+    timeout: int = 30,
+    user_agent: str = USER_AGENT,
+) -> bool:
+    """Refresh body_path from url. Returns False when upstream is unchanged (304).
+
+    The body is written to a temp file and swapped in, then validators are
+    saved, so a crash mid-download never pairs old validators with a partial
+    body.
+    """
+    meta = _load_meta(body_path)
+    headers = {"User-Agent": user_agent, "Accept-Encoding": _accept_encoding()}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    req = urllib.request.Request(url, headers=headers)
+    try:
+        resp = urllib.request.urlopen(req, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            logger.info("Not modified: %s", url)
+            return False
+        raise
+
+    body_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = body_path.with_name(body_path.name + ".tmp")
+    with resp:
+        if resp.status == 304:
+            return False
+        decode, flush = _decoder(resp.headers.get("Content-Encoding") or "")
+        with tmp_path.open("wb") as fh:
+            while chunk := resp.read(CHUNK_SIZE):
+                fh.write(decode(chunk))
+            fh.write(flush())
+        etag = resp.headers.get("ETag") or ""
+        last_modified = resp.headers.get("Last-Modified") or ""
+
+    tmp_path.replace(body_path)
+    meta_path(body_path).write_text(
+        json.dumps(
+            {
+                "url": url,
+                "etag": etag,
+                "last_modified": last_modified,
+                "fetched_at": datetime.now().isoformat(timespec="seconds"),
+            }
+        ),
+        encoding="utf-8",
+    )
+    return True
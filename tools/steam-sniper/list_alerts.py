@@ -0,0 +1,207 @@
+"""Favorite/wishlist price-threshold alerts sent after every collection.
+
+Thresholds are evaluated in memory against the current catalog, due alerts
+go to Telegram through tg_outbox in as few messages as fit, and cooldown
+changes are written back in one transaction on the DB writer thread.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+
+import db
+import db_writer
+import push_events
+import tg_outbox
+from beartype import beartype
+
+logger = logging.getLogger("sniper.list_alerts")
+
+LIST_ALERT_COOLDOWN = timedelta(hours=6)
+MSK = timezone(timedelta(hours=3))
+
+# Resolves an item name to its catalog entry ({name, price, url, count}) or None.
+FindItem = Callable[[str], dict | None]
+
+_alert_task: asyncio.Task | None = None  # list alerts run beside the collector
+
+
+def _parse_timestamp(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=MSK)
+    return parsed.astimezone(MSK)
+
+
+def _notified_recently(value: str | None) -> bool:
+    ts = _parse_timestamp(value)
+    if ts is None:
+        return False
+    return datetime.now(MSK) - ts < LIST_ALERT_COOLDOWN
+
+
+def _list_alert_chat_ids() -> list[str]:
+    raw = (
+        os.environ.get("LIST_ALERT_CHAT_IDS")
+        or os.environ.get("LESHA_TG_CHAT_ID")
+        or os.environ.get("ALERT_CHAT_IDS", "")
+    )
+    ids: list[str] = []
+    for part in raw.split(","):
+        cid = part.strip()
+        if cid and cid not in ids:
+            ids.append(cid)
+    return ids
+
+
+def _list_type_label(list_type: str) -> str:
+    return "Избранное" if list_type == "favorite" else "Хотелки"
+
+
+def _format_list_alert_message(
+    entry: dict,
+    direction: str,
+    current_price_rub: float,
+    url: str,
+) -> str:
+    target = entry["target_below_rub"] if direction == "below" else entry["target_above_rub"]
+    icon = "🔴" if direction == "below" else "🟢"
+    title = "Цена упала" if direction == "below" else "Цена выросла"
+    lines = [
+        f"{icon} {title}: {entry['item_name']}",
+        f"Сейчас: {round(current_price_rub):,} ₽".replace(",", " "),
+        f"Твой target: {round(float(target or 0)):,} ₽".replace(",", " "),
+        f"Список: {_list_type_label(entry['list_type'])}",
+    ]
+    if url:
+        lines.append(f"lis-skins: {url}")
+    return "\n".join(lines)
+
+
+async def send_telegram_message(text: str, chat_ids: list[str] | None = None) -> int:
+    token = os.environ.get("TELEGRAM_BOT_TOKEN")
+    chat_ids = chat_ids or _list_alert_chat_ids()
+    if not token or not chat_ids:
+        return 0
+    return await tg_outbox.send(token, chat_ids, text)
+
+
+def _evaluate_list_alerts(
+    entries: list[dict],
+    rate: float,
+    find_item: FindItem,
+) -> tuple[list[tuple[dict, str, float, str]], list[tuple[int, str]]]:
+    """Match every thresholded list row against the in-memory price map.
+
+    Returns (due, cleared): alerts to send as (entry, direction, price_rub, url)
+    and (item_id, direction) cooldown markers to reset.
+    """
+    due: list[tuple[dict, str, float, str]] = []
+    cleared: list[tuple[int, str]] = []
+    items: dict[str, dict | None] = {}  # many users watch the same skins
+    for entry in entries:
+        item_name = entry["item_name"]
+        if item_name not in items:
+            items[item_name] = find_item(item_name)
+        item = items[item_name]
+        if not item:
+            continue
+
+        current_price_rub = item["price"] * rate
+        for direction in ("below", "above"):
+            target = entry.get(f"target_{direction}_rub")
+            if target is None:
+                continue
+            if direction == "below":
+                triggered = current_price_rub <= float(target)
+            else:
+                triggered = current_price_rub >= float(target)
+            last_notified = entry.get(f"last_notified_{direction}_at")
+            if triggered:
+                if not _notified_recently(last_notified):
+                    due.append((entry, direction, current_price_rub, item.get("url", "")))
+            elif last_notified:
+                cleared.append((int(entry["id"]), direction))
+    return due, cleared
+
+
+@beartype
+async def check_list_alerts(rate: float, find_item: FindItem) -> None:
+    """Send Telegram alerts for favorite/wishlist thresholds with cooldown.
+
+    Evaluates all thresholds in memory, hands one batched message per group
+    of alerts to the Telegram outbox, then writes every cooldown change in a
+    single transaction.
+    """
+    if rate <= 0:
+        return
+
+    due, cleared = _evaluate_list_alerts(
+        await db_writer.run(db.get_all_list_items_with_targets), rate, find_item
+    )
+    notified: list[tuple[int, str]] = []
+    if due and push_events.has_subscribers():
+        push_events.publish("list_alerts", {
+            "alerts": [
+                {
+                    "user": entry["user_id"],
+                    "name": entry["item_name"],
+                    "list_type": entry["list_type"],
+                    "direction": direction,
+                    "price_rub": round(current_price_rub, 2),
+                }
+                for entry, direction, current_price_rub, _url in due
+            ],
+        })
+    if due:
+        messages = [
+            _format_list_alert_message(entry, direction, current_price_rub, url)
+            for entry, direction, current_price_rub, url in due
+        ]
+        groups = tg_outbox.group_messages(messages)
+        results = await asyncio.gather(
+            *(send_telegram_message("\n\n".join(messages[i] for i in group)) for group in groups)
+        )
+        for group, sent in zip(groups, results, strict=True):
+            if sent:
+                notified.extend((int(due[i][0]["id"]), due[i][1]) for i in group)
+
+    if notified or cleared:
+        await db_writer.run(
+            db.apply_list_alert_state,
+            notified,
+            cleared,
+            datetime.now(MSK).isoformat(timespec="seconds"),
+        )
+
+
+async def _run_list_alerts(rate: float, find_item: FindItem) -> None:
+    try:
+        await check_list_alerts(rate, find_item)
+    except (sqlite3.Error, KeyError, ValueError) as e:
+        logger.error("List alerts failed: %s", e)
+
+
+@beartype
+def start_list_alerts(rate: float, find_item: FindItem) -> None:
+    """Send list alerts in the background so a slow Telegram burst never delays collection."""
+    global _alert_task
+    if _alert_task is not None and not _alert_task.done():
+        logger.info("Previous list alerts still sending; skipping this round")
+        return
+    _alert_task = asyncio.create_task(_run_list_alerts(rate, find_item))
+
+
+def cancel() -> None:
+    """Stop an in-flight alert round (shutdown)."""
+    if _alert_task is not None:
+        _alert_task.cancel()
@@ -5,58 +5,96 @@ import json
 import logging
 import sqlite3
 import urllib.request
+from collections.abc import Iterator
 from datetime import datetime
 from pathlib import Path
+from typing import BinaryIO
 
+import http_cache
 import ijson
+import snapshot_stats
+import snapshot_update
 
 logger = logging.getLogger("sniper.listings_snapshot")
 
 LISSKINS_FULL_URL = "https://lis-skins.com/market_export_json/api_csgo_full.json"
 SNAPSHOT_DB_PATH = Path(__file__).parent / "data" / "listings_snapshot.db"
+FULL_EXPORT_CACHE_NAME = "lis_skins_full_export.json"
 USER_AGENT = "SteamSniper/1.0"
 
-
-def _coerce_num(value):
-    if value is None:
-        return None
-    try:
-        number = float(value)
-    except (TypeError, ValueError):
-        return value
-    return int(number) if number.is_integer() else number
-
-
-def _normalize_stickers(stickers: list[dict] | None) -> str:
-    if not stickers:
-        return "[]"
-    payload = []
-    for sticker in stickers:
-        payload.append(
-            {
-                "name": sticker.get("name"),
-                "image": sticker.get("image"),
-                "wear": _coerce_num(sticker.get("wear")),
-                "slot": _coerce_num(sticker.get("slot")),
-            }
-        )
-    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
-
-
-def _listing_row(item: dict) -> tuple:
-    return (
-        int(_coerce_num(item["id"])),
-        item["name"].lower(),
-        item["name"],
-        float(item["price"]),
-        _coerce_num(item.get("item_float")),
-        _coerce_num(item.get("item_paint_index")),
-        _coerce_num(item.get("item_paint_seed")),
-        _normalize_stickers(item.get("stickers")),
-        item.get("name_tag"),
-        item.get("unlock_at"),
-        item.get("item_link"),
-    )
+# 2: listing_attachments + has_stickers/has_keychains/sticker_count
+# 3: row_hash + name_changes for incremental updates
+# 4: name_stats aggregates
+SCHEMA_VERSION = "4"
+
+_SCHEMA_SQL = """
+    CREATE TABLE meta (
+        key   TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    CREATE TABLE listings (
+        id            INTEGER PRIMARY KEY,
+        name_lower    TEXT NOT NULL,
+        name          TEXT NOT NULL,
+        price         REAL NOT NULL,
+        float_value   REAL,
+        paint_index   INTEGER,
+        paint_seed    INTEGER,
+        name_tag      TEXT,
+        unlock_at     TEXT,
+        item_link     TEXT,
+        has_stickers  INTEGER NOT NULL,
+        has_keychains INTEGER NOT NULL,
+        sticker_count INTEGER NOT NULL,
+        row_hash      INTEGER NOT NULL
+    );
+    -- NUMERIC keeps whole wear/slot values as integers, like the export
+    CREATE TABLE listing_attachments (
+        listing_id INTEGER NOT NULL,
+        position   INTEGER NOT NULL,
+        kind       TEXT NOT NULL CHECK(kind IN ('sticker','keychain')),
+        name       TEXT,
+        image      TEXT,
+        wear       NUMERIC,
+        slot       NUMERIC,
+        PRIMARY KEY (listing_id, position)
+    ) WITHOUT ROWID;
+    -- Listings added/updated/removed per name by the latest incremental run
+    CREATE TABLE name_changes (
+        name_lower TEXT PRIMARY KEY,
+        added      INTEGER NOT NULL,
+        updated    INTEGER NOT NULL,
+        removed    INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    -- Per-name price/float aggregates, refreshed for changed names on every run
+    CREATE TABLE name_stats (
+        name_lower           TEXT PRIMARY KEY,
+        name                 TEXT NOT NULL,
+        listings             INTEGER NOT NULL,
+        min_price            REAL NOT NULL,
+        p10_price            REAL NOT NULL,
+        median_price         REAL NOT NULL,
+        p90_price            REAL NOT NULL,
+        cheapest_id          INTEGER NOT NULL,
+        discount_pct         REAL NOT NULL,  -- cheapest listing vs median
+        float_min            REAL,
+        float_max            REAL,
+        float_buckets        TEXT NOT NULL,  -- JSON list of snapshot_stats.FLOAT_BUCKETS counts
+        sticker_listings     INTEGER NOT NULL,
+        sticker_median_price REAL,
+        sticker_premium_pct  REAL            -- median with stickers vs without
+    ) WITHOUT ROWID;
+    CREATE INDEX idx_name_stats_discount ON name_stats(discount_pct);
+"""
+
+# Built after the bulk load. The flag index covers the filtered COUNT(*) and
+# the price-ordered page scan, so attachment filters never touch table rows.
+_INDEX_SQL = """
+    CREATE INDEX idx_listings_name_price ON listings(name_lower, price);
+    CREATE INDEX idx_listings_name_flags
+        ON listings(name_lower, has_stickers, has_keychains, price, float_value);
+    CREATE INDEX idx_listings_name_float ON listings(name_lower, float_value);
+"""
 
 
 def _open_readonly(path: Path = SNAPSHOT_DB_PATH) -> sqlite3.Connection:
@@ -93,11 +131,56 @@ def snapshot_status(path: Path = SNAPSHOT_DB_PATH) -> dict:
     }
 
 
+def _snapshot_rows(path: Path) -> int:
+    try:
+        with _open_readonly(path) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key='rows'").fetchone()
+    except sqlite3.Error:
+        return 0
+    return int(row["value"]) if row else 0
+
+
 def _normalize_filter_flag(value: str) -> str:
     normalized = str(value or "all").strip().lower()
     return normalized if normalized in {"all", "yes", "no"} else "all"
 
 
+def _flag_sql(flag: str, column: str) -> str:
+    if flag == "yes":
+        return f"{column} = 1"
+    if flag == "no":
+        return f"{column} = 0"
+    return ""
+
+
+def _is_legacy_snapshot(conn: sqlite3.Connection) -> bool:
+    """Snapshots built before SCHEMA_VERSION 2 only have the stickers_json blob."""
+    return "has_stickers" not in {row[1] for row in conn.execute("PRAGMA table_info(listings)")}
+
+
+def _load_attachments(conn: sqlite3.Connection, listing_ids: list[int]) -> dict[int, tuple[list[dict], list[dict]]]:
+    """Fetch attachments for one page of listings: {id: (stickers, keychains)}."""
+    by_listing: dict[int, tuple[list[dict], list[dict]]] = {}
+    if not listing_ids:
+        return by_listing
+    rows = conn.execute(
+        f"""
+        SELECT listing_id, kind, name, image, wear, slot
+        FROM listing_attachments
+        WHERE listing_id IN ({",".join("?" * len(listing_ids))})
+        ORDER BY listing_id, position
+        """,
+        listing_ids,
+    ).fetchall()
+    for row in rows:
+        stickers, keychains = by_listing.setdefault(row["listing_id"], ([], []))
+        target = keychains if row["kind"] == "keychain" else stickers
+        target.append(
+            {"name": row["name"], "image": row["image"], "wear": row["wear"], "slot": row["slot"]}
+        )
+    return by_listing
+
+
 def _attachments_sql(flag: str, attachment_path: str) -> tuple[str, list[str]]:
     if flag == "yes":
         return "stickers_json LIKE ?", [f"%{attachment_path}%"]
@@ -154,23 +237,28 @@ def get_item_listings(
         clauses.append("float_value IS NOT NULL AND float_value <= ?")
         params.append(float(float_max))
 
-    stickers_clause, stickers_params = _attachments_sql(has_stickers, "/econ/stickers/")
-    if stickers_clause:
-        clauses.append(stickers_clause)
-        params.extend(stickers_params)
-
-    keychains_clause, keychains_params = _attachments_sql(has_keychains, "/econ/keychains/")
-    if keychains_clause:
-        clauses.append(keychains_clause)
-        params.extend(keychains_params)
-
-    where_sql = " AND ".join(clauses)
-
     with _open_readonly(path) as conn:
+        legacy = _is_legacy_snapshot(conn)
+        if legacy:
+            for flag, attachment_path in (
+                (has_stickers, "/econ/stickers/"),
+                (has_keychains, "/econ/keychains/"),
+            ):
+                clause, clause_params = _attachments_sql(flag, attachment_path)
+                if clause:
+                    clauses.append(clause)
+                    params.extend(clause_params)
+        else:
+            for flag, column in ((has_stickers, "has_stickers"), (has_keychains, "has_keychains")):
+                clause = _flag_sql(flag, column)
+                if clause:
+                    clauses.append(clause)
+
+        where_sql = " AND ".join(clauses)
         rows = conn.execute(
             f"""
-            SELECT id, price, float_value, paint_index, paint_seed, stickers_json,
-                   name_tag, unlock_at, item_link
+            SELECT id, price, float_value, paint_index, paint_seed,
+                   name_tag, unlock_at, item_link{", stickers_json" if legacy else ""}
             FROM listings
             WHERE {where_sql}
             ORDER BY {order_sql}
@@ -182,11 +270,14 @@ def get_item_listings(
             f"SELECT COUNT(*) AS count FROM listings WHERE {where_sql}",
             params,
         ).fetchone()["count"]
+        attachments = {} if legacy else _load_attachments(conn, [row["id"] for row in rows])
 
     listings = []
     for row in rows:
-        attachments = json.loads(row["stickers_json"] or "[]")
-        stickers, keychains = _split_attachments(attachments)
+        if legacy:
+            stickers, keychains = _split_attachments(json.loads(row["stickers_json"] or "[]"))
+        else:
+            stickers, keychains = attachments.get(row["id"], ([], []))
         listings.append(
             {
                 "id": row["id"],
@@ -205,15 +296,57 @@ def get_item_listings(
     return listings, int(total), status["built_at"]
 
 
-def build_snapshot(
-    output_path: Path = SNAPSHOT_DB_PATH,
+def _open_export(source_url: str, cache_path: Path | None) -> tuple[BinaryIO, bool]:
+    """Open the full export for streaming. Returns (stream, changed_upstream)."""
+    if cache_path is None:
+        req = urllib.request.Request(source_url, headers={"User-Agent": USER_AGENT})
+        return urllib.request.urlopen(req, timeout=300), True
+    changed = http_cache.fetch_to_file(
+        source_url, cache_path, timeout=300, user_agent=USER_AGENT
+    )
+    return cache_path.open("rb"), changed
+
+
+def _iter_export(stream: BinaryIO) -> Iterator[dict]:
+    for item in ijson.items(stream, "items.item", use_float=True):
+        if item.get("name") and item.get("price") is not None and item.get("id") is not None:
+            yield item
+
+
+def _snapshot_schema(path: Path) -> str:
+    try:
+        with _open_readonly(path) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key='schema_version'").fetchone()
+    except sqlite3.Error:
+        return ""
+    return row["value"] if row else ""
+
+
+def _write_meta(
+    conn: sqlite3.Connection,
     *,
-    source_url: str = LISSKINS_FULL_URL,
-    batch_size: int = 2000,
-) -> dict:
-    """Download lis-skins full export and rebuild the snapshot DB atomically."""
-    output_path = Path(output_path)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+    source_url: str,
+    started_at: str,
+    rows: int,
+    mode: str,
+) -> str:
+    built_at = datetime.now().isoformat(timespec="seconds")
+    conn.executemany(
+        "INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)",
+        [
+            ("built_at", built_at),
+            ("source_url", source_url),
+            ("started_at", started_at),
+            ("rows", str(rows)),
+            ("schema_version", SCHEMA_VERSION),
+            ("mode", mode),
+        ],
+    )
+    return built_at
+
+
+def _rebuild_snapshot(output_path: Path, stream: BinaryIO, source_url: str, batch_size: int) -> dict:
+    """Build a fresh snapshot into a .tmp file and swap it in atomically."""
     tmp_path = output_path.with_suffix(output_path.suffix + ".tmp")
     if tmp_path.exists():
         tmp_path.unlink()
@@ -228,88 +361,213 @@ def build_snapshot(
             PRAGMA journal_mode=OFF;
             PRAGMA synchronous=OFF;
             PRAGMA temp_store=MEMORY;
-            CREATE TABLE meta (
-                key   TEXT PRIMARY KEY,
-                value TEXT NOT NULL
-            );
-            CREATE TABLE listings (
-                id            INTEGER PRIMARY KEY,
-                name_lower    TEXT NOT NULL,
-                name          TEXT NOT NULL,
-                price         REAL NOT NULL,
-                float_value   REAL,
-                paint_index   INTEGER,
-                paint_seed    INTEGER,
-                stickers_json TEXT NOT NULL,
-                name_tag      TEXT,
-                unlock_at     TEXT,
-                item_link     TEXT
-            );
             """
+            + _SCHEMA_SQL
         )
 
         batch: list[tuple] = []
-        req = urllib.request.Request(source_url, headers={"User-Agent": USER_AGENT})
-        with urllib.request.urlopen(req, timeout=300) as resp:
-            for item in ijson.items(resp, "items.item", use_float=True):
-                item_name = item.get("name")
-                price = item.get("price")
-                item_id = item.get("id")
-                if not item_name or price is None or item_id is None:
-                    continue
-                batch.append(_listing_row(item))
+        attachment_batch: list[tuple] = []
+        with stream:
+            for item in _iter_export(stream):
+                row, attachments = snapshot_update.listing_rows(item)
+                batch.append(row)
+                attachment_batch.extend(attachments)
                 total_rows += 1
                 if len(batch) >= batch_size:
-                    conn.executemany(
-                        """
-                        INSERT INTO listings(
-                            id, name_lower, name, price, float_value, paint_index,
-                            paint_seed, stickers_json, name_tag, unlock_at, item_link
-                        ) VALUES (?,?,?,?,?,?,?,?,?,?,?)
-                        """,
-                        batch,
-                    )
+                    conn.executemany(snapshot_update.INSERT_LISTING_SQL, batch)
+                    conn.executemany(snapshot_update.INSERT_ATTACHMENT_SQL, attachment_batch)
                     batch.clear()
+                    attachment_batch.clear()
 
         if batch:
-            conn.executemany(
-                """
-                INSERT INTO listings(
-                    id, name_lower, name, price, float_value, paint_index,
-                    paint_seed, stickers_json, name_tag, unlock_at, item_link
-                ) VALUES (?,?,?,?,?,?,?,?,?,?,?)
-                """,
-                batch,
-            )
+            conn.executemany(snapshot_update.INSERT_LISTING_SQL, batch)
+            conn.executemany(snapshot_update.INSERT_ATTACHMENT_SQL, attachment_batch)
 
+        conn.executescript(_INDEX_SQL)
+        snapshot_stats.refresh_name_stats(conn, changed_only=False)
+        built_at = _write_meta(
+            conn, source_url=source_url, started_at=started_at, rows=total_rows, mode="full"
+        )
+        conn.commit()
+        conn.execute("PRAGMA journal_mode=WAL")  # persists in the file for later in-place updates
+    except Exception:
+        conn.rollback()
+        stream.close()
+        raise
+    finally:
+        conn.close()
+
+    tmp_path.replace(output_path)
+    logger.info("Snapshot built: %s rows -> %s", total_rows, output_path)
+    return {
+        "rows": total_rows,
+        "built_at": built_at,
+        "path": str(output_path),
+        "size_bytes": output_path.stat().st_size,
+        "skipped": False,
+        "mode": "full",
+        "added": total_rows,
+        "updated": 0,
+        "removed": 0,
+    }
+
+
+def _update_snapshot(output_path: Path, stream: BinaryIO, source_url: str, batch_size: int) -> dict:
+    """Apply the export to an existing snapshot in place, in one transaction.
+
+    See snapshot_update.apply_export for what is written. The file is
+    switched to WAL (a persistent setting), so cache spills and the commit
+    never lock out the dashboard's read-only connections: they keep seeing
+    the previous state until the commit.
+    """
+    conn = sqlite3.connect(str(output_path), timeout=30.0)
+    started_at = datetime.now().isoformat(timespec="seconds")
+
+    try:
         conn.executescript(
             """
-            CREATE INDEX idx_listings_name_price ON listings(name_lower, price);
-            CREATE INDEX idx_listings_name ON listings(name_lower);
+            PRAGMA journal_mode=WAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-65536;
             """
         )
-        built_at = datetime.now().isoformat(timespec="seconds")
-        conn.executemany(
-            "INSERT INTO meta(key, value) VALUES (?, ?)",
-            [
-                ("built_at", built_at),
-                ("source_url", source_url),
-                ("started_at", started_at),
-                ("rows", str(total_rows)),
-            ],
+        with stream:
+            total_rows, counters = snapshot_update.apply_export(conn, _iter_export(stream), batch_size)
+        snapshot_stats.refresh_name_stats(conn, changed_only=True)
+        built_at = _write_meta(
+            conn, source_url=source_url, started_at=started_at, rows=total_rows, mode="incremental"
         )
         conn.commit()
+        conn.execute("PRAGMA optimize")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
     except Exception:
         conn.rollback()
         raise
     finally:
         conn.close()
 
-    tmp_path.replace(output_path)
-    logger.info("Snapshot built: %s rows -> %s", total_rows, output_path)
+    totals = [sum(counts[i] for counts in counters.values()) for i in range(3)]
+    logger.info(
+        "Snapshot updated: %s rows (+%d ~%d -%d) -> %s",
+        total_rows, *totals, output_path,
+    )
     return {
         "rows": total_rows,
         "built_at": built_at,
         "path": str(output_path),
         "size_bytes": output_path.stat().st_size,
+        "skipped": False,
+        "mode": "incremental",
+        "added": totals[0],
+        "updated": totals[1],
+        "removed": totals[2],
     }
+
+
+def get_item_stats(name: str, path: Path = SNAPSHOT_DB_PATH) -> dict | None:
+    """Precomputed price/float aggregates for one name, or None if unknown."""
+    if not path.exists():
+        return None
+    try:
+        with _open_readonly(path) as conn:
+            row = conn.execute(
+                f"SELECT {snapshot_stats.STATS_COLUMNS} FROM name_stats s WHERE s.name_lower = ?",
+                (name.lower(),),
+            ).fetchone()
+    except sqlite3.Error:  # snapshots older than SCHEMA_VERSION 4
+        return None
+    return snapshot_stats.stats_dict(row) if row else None
+
+
+def get_underpriced_listings(
+    limit: int = 50,
+    *,
+    min_discount_pct: float = 15.0,
+    min_listings: int = 5,
+    path: Path = SNAPSHOT_DB_PATH,
+) -> list[dict]:
+    """Cheapest listing per name, for names where it sits furthest below the median."""
+    if not path.exists():
+        return []
+    try:
+        with _open_readonly(path) as conn:
+            rows = conn.execute(
+                f"""
+                SELECT {snapshot_stats.STATS_COLUMNS}, l.float_value, l.paint_seed, l.item_link
+                FROM name_stats s JOIN listings l ON l.id = s.cheapest_id
+                WHERE s.discount_pct >= ? AND s.listings >= ?
+                ORDER BY s.discount_pct DESC
+                LIMIT ?
+                """,
+                (min_discount_pct, min_listings, limit),
+            ).fetchall()
+    except sqlite3.Error:
+        return []
+    return [snapshot_stats.stats_dict(row) for row in rows]
+
+
+def get_name_changes(path: Path = SNAPSHOT_DB_PATH) -> dict[str, dict[str, int]]:
+    """Per-name {added, updated, removed} counters from the latest incremental run."""
+    try:
+        with _open_readonly(path) as conn:
+            rows = conn.execute("SELECT name_lower, added, updated, removed FROM name_changes").fetchall()
+    except sqlite3.Error:
+        return {}
+    return {
+        row["name_lower"]: {"added": row["added"], "updated": row["updated"], "removed": row["removed"]}
+        for row in rows
+    }
+
+
+def build_snapshot(
+    output_path: Path = SNAPSHOT_DB_PATH,
+    *,
+    source_url: str = LISSKINS_FULL_URL,
+    batch_size: int = 2000,
+    conditional: bool = True,
+    force: bool = False,
+    incremental: bool = True,
+) -> dict:
+    """Download lis-skins full export and refresh the snapshot DB.
+
+    With conditional=True the export is cached next to the snapshot and
+    re-requested with ETag/Last-Modified validators; if upstream is unchanged
+    and a snapshot already exists, the refresh is skipped unless force=True.
+
+    With incremental=True an existing snapshot of the current schema is
+    updated in place (only changed rows are written); anything else — no
+    snapshot, an older schema, or a failed update — falls back to a full
+    rebuild swapped in atomically.
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    cache_path = output_path.with_name(FULL_EXPORT_CACHE_NAME) if conditional else None
+    stream, changed = _open_export(source_url, cache_path)
+    if not changed and output_path.exists() and not force:
+        stream.close()
+        status = snapshot_status(output_path)
+        logger.info("Snapshot export unchanged, keeping %s", output_path)
+        return {
+            "rows": _snapshot_rows(output_path),
+            "built_at": status["built_at"],
+            "path": str(output_path),
+            "size_bytes": status["size_bytes"],
+            "skipped": True,
+            "mode": "skipped",
+            "added": 0,
+            "updated": 0,
+            "removed": 0,
+        }
+
+    if incremental and output_path.exists() and _snapshot_schema(output_path) == SCHEMA_VERSION:
+        try:
+            return _update_snapshot(output_path, stream, source_url, batch_size)
+        except sqlite3.Error as e:
+            logger.warning("Incremental snapshot update failed (%s), rebuilding from scratch", e)
+            stream.close()
+            if cache_path is not None:
+                stream = cache_path.open("rb")
+            else:
+                stream, _ = _open_export(source_url, None)
+
+    return _rebuild_snapshot(output_path, stream, source_url, batch_size)
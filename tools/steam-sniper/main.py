@@ -8,11 +8,13 @@ Usage:
 """
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 import re
 import time
 import urllib.request
+from collections.abc import Mapping
 from datetime import datetime
 from pathlib import Path
 
@@ -29,6 +31,10 @@ from telegram.ext import (
 )
 
 import db
+import price_cache
+import price_feed
+import search_index
+import tg_outbox
 
 load_dotenv()
 
@@ -39,7 +45,7 @@ logging.basicConfig(
 logger = logging.getLogger("sniper")
 
 TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]
-LISSKINS_URL = "https://lis-skins.com/market_export_json/csgo.json"
+LISSKINS_URL = price_feed.LISSKINS_URL
 DATA_DIR = Path(__file__).parent / "data"
 DATA_DIR.mkdir(exist_ok=True)
 CHECK_INTERVAL_S = 2 * 60 * 60  # 2 hours
@@ -48,8 +54,7 @@ CBR_URL = "https://www.cbr-xml-daily.ru/daily_json.js"
 _usd_rub_rate: float = 0.0
 _usd_rub_updated: float = 0.0
 
-_prices_cache: tuple[float, dict[str, dict]] | None = None
-_CACHE_TTL = 240  # 4 minutes
+_search_index_cache: tuple[Mapping[str, dict], dict] | None = None
 
 
 def _get_usd_rub() -> float:
@@ -88,28 +93,24 @@ def _p(usd: float) -> str:
 # --- Price cache ---
 
 
-def _get_prices_cached() -> dict[str, dict]:
-    """Return cached prices if fresh (< 4 min), otherwise re-fetch."""
-    global _prices_cache
-    now = time.time()
-    if _prices_cache and (now - _prices_cache[0]) < _CACHE_TTL:
-        return _prices_cache[1]
-    prices = fetch_prices()
-    _prices_cache = (now, prices)
-    return prices
+def _get_prices_cached() -> Mapping[str, dict]:
+    """Return the catalog the dashboard collector publishes (see price_cache).
+
+    Falls back to fetching lis-skins ourselves when no collector is running.
+    """
+    return price_cache.read(fetch_prices)
 
 
 # --- Lis-Skins fetch ---
 
-def fetch_prices() -> dict[str, dict]:
-    """Fetch all CS2 items from lis-skins. Returns {name_lower: {name, price, url, count}}."""
-    req = urllib.request.Request(LISSKINS_URL, headers={"User-Agent": "SteamSniper/1.0"})
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        items = json.loads(resp.read().decode("utf-8"))
-    return {item["name"].lower(): item for item in items}
+def fetch_prices(previous: Mapping[str, dict] | None = None) -> tuple[Mapping[str, dict], dict]:
+    """Fetch all CS2 items from lis-skins, diffed against previous. Returns (prices, changes)."""
+    return price_feed.fetch(
+        previous, url=LISSKINS_URL, cache_path=DATA_DIR / "lis_skins_export_bot.json"
+    )
 
 
-def _build_url_index(prices: dict[str, dict]) -> dict[str, dict]:
+def _build_url_index(prices: Mapping[str, dict]) -> dict[str, dict]:
     """Build slug→item index from URLs for fast link lookup."""
     index = {}
     for item in prices.values():
@@ -125,19 +126,22 @@ def _build_url_index(prices: dict[str, dict]) -> dict[str, dict]:
 _LIS_SKINS_LINK_RE = re.compile(r"lis-skins\.com/(?:\w+/)?market/csgo/([^/?\s]+)")
 
 
-def find_item(prices: dict[str, dict], query: str) -> list[dict]:
+def _get_search_index(prices: Mapping[str, dict]) -> dict:
+    """Return the n-gram index for this prices dict, rebuilding on a new fetch."""
+    global _search_index_cache
+    if _search_index_cache is None or _search_index_cache[0] is not prices:
+        _search_index_cache = (prices, search_index.build_index(prices))
+    return _search_index_cache[1]
+
+
+def find_item(prices: Mapping[str, dict], query: str) -> list[dict]:
     """Fuzzy-ish search: find items containing all query words."""
-    words = query.lower().split()
-    results = []
-    for name_lower, item in prices.items():
-        if all(w in name_lower for w in words):
-            results.append(item)
-    return sorted(results, key=lambda x: x["price"])[:10]
+    return search_index.search(_get_search_index(prices), query, limit=10)
 
 
 # --- Alert check ---
 
-def check_alerts(prices: dict[str, dict]) -> list[str]:
+def check_alerts(prices: Mapping[str, dict]) -> list[str]:
     """Check watchlist against current prices, return alert messages."""
     wl = db.get_watchlist()
     alerts = []
@@ -213,13 +217,12 @@ async def periodic_check(context: ContextTypes.DEFAULT_TYPE) -> None:
         return
 
     header = f"🔔 Steam Sniper — {datetime.now().strftime('%d.%m %H:%M')}\n\n"
-    message = header + "\n\n".join(alerts)
-
-    for cid in chat_ids:
-        try:
-            await context.bot.send_message(chat_id=int(cid), text=message)
-        except Exception as e:
-            logger.error(f"Failed to send alert to {cid}: {e}")
+    groups = tg_outbox.group_messages(alerts, tg_outbox.MESSAGE_LIMIT - len(header))
+    results = await asyncio.gather(*(
+        tg_outbox.send(TOKEN, chat_ids, header + "\n\n".join(alerts[i] for i in group))
+        for group in groups
+    ))
+    logger.info(f"Sent {len(groups)} alert message(s), {sum(results)} deliveries")
 
 
 async def periodic_snapshot(context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -240,7 +243,7 @@ async def periodic_snapshot(context: ContextTypes.DEFAULT_TYPE) -> None:
     if snapshots:
         db.insert_price_snapshots(snapshots)
         logger.info(f"Snapshot: {len(snapshots)} prices recorded")
-    db.prune_old_history(days=90)
+    db.prune_old_history()
 
 
 # --- Bot commands ---
@@ -278,7 +281,7 @@ async def cmd_buy(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Fetch current price to record added_price (USD)
     added_price = 0.0
     try:
-        prices = fetch_prices()
+        prices = _get_prices_cached()
         item = prices.get(name.lower())
         if item:
             added_price = item["price"]
@@ -318,7 +321,7 @@ async def cmd_sell(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Fetch current price to record added_price (USD)
     added_price = 0.0
     try:
-        prices = fetch_prices()
+        prices = _get_prices_cached()
         item = prices.get(name.lower())
         if item:
             added_price = item["price"]
@@ -359,7 +362,7 @@ async def cmd_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     # Fetch current prices for delta
     try:
-        prices = fetch_prices()
+        prices = _get_prices_cached()
     except Exception:
         prices = {}
 
@@ -410,7 +413,7 @@ async def cmd_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
 
     await update.message.reply_text("🔍 Ищу...")
     try:
-        prices = fetch_prices()
+        prices = _get_prices_cached()
     except Exception as e:
         await update.message.reply_text(f"Ошибка: {e}")
         return
@@ -429,7 +432,7 @@ async def cmd_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
 async def cmd_check(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text("🔄 Проверяю цены...")
     try:
-        prices = fetch_prices()
+        prices = _get_prices_cached()
     except Exception as e:
         await update.message.reply_text(f"Ошибка загрузки: {e}")
         return
@@ -488,7 +491,7 @@ async def handle_link(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     await update.message.reply_text("🔍 Ищу предмет...")
 
     try:
-        prices = fetch_prices()
+        prices = _get_prices_cached()
     except Exception as e:
         await update.message.reply_text(f"Ошибка загрузки: {e}")
         return
@@ -588,6 +591,10 @@ async def handle_price_reply(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
 
 
+async def _close_outbox(_app: Application) -> None:
+    await tg_outbox.close()
+
+
 def main() -> None:
     # Initialize SQLite database
     db.init_db()
@@ -602,7 +609,7 @@ def main() -> None:
             # Rename to .bak to prevent re-migration
             json_path.rename(json_path.with_suffix(".json.bak"))
 
-    app = Application.builder().token(TOKEN).build()
+    app = Application.builder().token(TOKEN).post_shutdown(_close_outbox).build()
 
     app.add_handler(CommandHandler("start", cmd_start))
     app.add_handler(CommandHandler("buy", cmd_buy))
@@ -0,0 +1,85 @@
+"""Shared lis-skins price catalog for the dashboard and the Telegram bot.
+
+The dashboard collector is the single producer: after every fetch it
+publishes the change set into SQLite (``price_catalog`` in sniper.db) and
+the version counter moves whenever rows change. The bot reads that table
+instead of downloading the export itself and reloads only when the version
+moves, so both processes always agree on prices. If nobody has published
+for STALE_AFTER seconds (dashboard down), the reader fetches and publishes
+itself, so the bot keeps working standalone.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Callable, Mapping
+
+import db
+from beartype import beartype
+from price_catalog import PriceCatalog, item_record
+
+logger = logging.getLogger("sniper.price_cache")
+
+STALE_AFTER = 2 * 300 + 60  # two missed collector runs (COLLECT_INTERVAL=300) plus slack
+
+_published = False  # has this process replaced the table since it started?
+_loaded: tuple[int, Mapping[str, dict]] | None = None  # (version, catalog) last read
+
+
+@beartype
+def publish(prices: Mapping[str, dict], changes: dict) -> int:
+    """Write one collection into the shared table. Returns the catalog version.
+
+    The first publish of a process replaces the table outright (it may hold
+    rows from an older run); later ones apply only added/updated/removed.
+    A failed write re-arms the full replace, so a lost delta cannot leave
+    the shared table drifting from prices.
+    """
+    global _published, _loaded
+    if _published:
+        keys = [*changes["added"], *changes["updated"]]
+        removed = list(changes["removed"])
+    else:
+        keys = list(prices)
+        removed = []
+    upserts = [(key, *item_record(prices[key])) for key in keys if key in prices]
+    try:
+        version = db.publish_price_catalog(upserts, removed, replace=not _published)
+    except Exception:
+        _published = False
+        raise
+    _published = True
+    _loaded = (version, prices)
+    return version
+
+
+@beartype
+def read(
+    fetch: Callable[[Mapping[str, dict] | None], tuple[Mapping[str, dict], dict]],
+) -> Mapping[str, dict]:
+    """Return the shared catalog, reloading only when its version moved.
+
+    fetch(previous) -> (prices, changes) is the fallback used when no
+    producer is alive; its result is published for everyone else.
+    """
+    global _loaded
+    version, updated_at = db.get_price_catalog_state()
+    if version and time.time() - updated_at < STALE_AFTER:
+        if _loaded is None or _loaded[0] != version:
+            version, rows = db.load_price_catalog()
+            _loaded = (version, PriceCatalog.from_records(rows))
+            logger.info("Loaded shared price catalog v%d (%d items)", version, len(rows))
+        return _loaded[1]
+
+    logger.info("Shared price catalog is stale, fetching lis-skins directly")
+    prices, changes = fetch(_loaded[1] if _loaded else None)
+    publish(prices, changes)
+    return prices
+
+
+@beartype
+def reset() -> None:
+    """Forget per-process state (tests, DB_PATH switches)."""
+    global _published, _loaded
+    _published = False
+    _loaded = None
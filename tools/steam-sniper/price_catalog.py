@@ -0,0 +1,122 @@
+"""Columnar, read-only catalog of lis-skins prices.
+
+Holds the ~20k exported items as parallel columns instead of one dict per
+item: interned names, array-backed price/count columns, lis-skins URLs
+stored as slugs, and a name_lower → row index. It reads like the old
+``{name_lower: {name, price, url, count}}`` dict; ``catalog[key]`` builds a
+small item dict on demand, so callers that only look up a handful of items
+never pay for the rest.
+"""
+from __future__ import annotations
+
+import sys
+from array import array
+from collections.abc import Iterable, Iterator, Mapping
+
+from beartype import beartype
+
+URL_PREFIX = "https://lis-skins.com/market/csgo/"
+
+
+@beartype
+def item_record(item: Mapping) -> tuple[str, float, str, int]:
+    """Normalize an export item to the (name, price, url, count) the catalog keeps."""
+    return (
+        item["name"],
+        float(item["price"]),
+        item.get("url") or "",
+        int(item.get("count") or 0),
+    )
+
+
+class PriceCatalog(Mapping):
+    """name_lower → {name, price, url, count}, stored column-wise."""
+
+    __slots__ = ("_counts", "_names", "_prices", "_rows", "_urls")
+
+    @beartype
+    def __init__(self, items: Iterable[Mapping] = ()) -> None:
+        self._rows: dict[str, int] = {}
+        self._names: list[str] = []
+        self._prices = array("d")
+        self._counts = array("q")
+        self._urls: list[str] = []  # slug after URL_PREFIX, or the full URL
+        for item in items:
+            self.add(item)
+
+    @classmethod
+    @beartype
+    def from_records(cls, records: Iterable[tuple[str, float, str, int]]) -> PriceCatalog:
+        """Build from (name, price, url, count) tuples, e.g. rows of db.price_catalog."""
+        catalog = cls()
+        for record in records:
+            catalog.add_record(*record)
+        return catalog
+
+    @beartype
+    def add(self, item: Mapping) -> str:
+        """Insert or overwrite one export item. Returns its name_lower key."""
+        return self.add_record(*item_record(item))
+
+    @beartype
+    def add_record(self, name: str, price: float, url: str, count: int) -> str:
+        name = sys.intern(name)
+        key = sys.intern(name.lower())
+        url = url.removeprefix(URL_PREFIX)
+        row = self._rows.get(key)
+        if row is None:
+            self._rows[key] = len(self._names)
+            self._names.append(name)
+            self._prices.append(price)
+            self._counts.append(count)
+            self._urls.append(url)
+        else:
+            self._names[row] = name
+            self._prices[row] = price
+            self._counts[row] = count
+            self._urls[row] = url
+        return key
+
+    @beartype
+    def record(self, key: str) -> tuple[str, float, str, int] | None:
+        """Return (name, price, url, count) for key without building a dict."""
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        url = self._urls[row]
+        if url and "://" not in url:
+            url = URL_PREFIX + url
+        return self._names[row], self._prices[row], url, self._counts[row]
+
+    @beartype
+    def price(self, key: str) -> float | None:
+        """Price for key without building a dict."""
+        row = self._rows.get(key)
+        return None if row is None else self._prices[row]
+
+    def __getitem__(self, key: str) -> dict:
+        record = self.record(key)
+        if record is None:
+            raise KeyError(key)
+        name, price, url, count = record
+        return {"name": name, "price": price, "url": url, "count": count}
+
+    @beartype
+    def get(self, key: str, default: dict | None = None) -> dict | None:
+        record = self.record(key)
+        if record is None:
+            return default
+        name, price, url, count = record
+        return {"name": name, "price": price, "url": url, "count": count}
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __repr__(self) -> str:
+        return f"PriceCatalog({len(self)} items)"
@@ -0,0 +1,100 @@
+"""Streaming ingest of the lis-skins price export with per-item diffing.
+
+The export (~20k items) is parsed item by item with ijson instead of
+``json.loads`` on the whole body and packed straight into a columnar
+PriceCatalog, so no per-item dicts outlive the parse. Every ingest reports a
+change set against the previous catalog for downstream consumers:
+
+    {"added": [name_lower, ...], "removed": [...], "updated": [...],
+     "price": {name_lower: (old_usd, new_usd)},
+     "count": {name_lower: (old_count, new_count)}}
+"""
+from __future__ import annotations
+
+import urllib.request
+from collections.abc import Iterable, Iterator, Mapping
+from pathlib import Path
+from typing import BinaryIO
+
+import http_cache
+import ijson
+from beartype import beartype
+from price_catalog import PriceCatalog, item_record
+
+LISSKINS_URL = "https://lis-skins.com/market_export_json/csgo.json"
+USER_AGENT = "SteamSniper/1.0"
+
+
+def empty_changes() -> dict:
+    return {"added": [], "removed": [], "updated": [], "price": {}, "count": {}}
+
+
+def has_changes(changes: dict) -> bool:
+    return bool(changes["added"] or changes["removed"] or changes["updated"])
+
+
+def iter_items(stream: BinaryIO) -> Iterator[dict]:
+    """Yield items from a top-level JSON array without loading it whole."""
+    return ijson.items(stream, "item", use_float=True)
+
+
+@beartype
+def ingest(
+    items: Iterable[dict],
+    previous: Mapping[str, dict] | None = None,
+) -> tuple[Mapping[str, dict], dict]:
+    """Build a PriceCatalog from items, diffing against the previous map.
+
+    Returns the previous object itself when nothing changed, so callers
+    can skip rebuilding anything derived from it.
+    """
+    previous = previous or {}
+    prices = PriceCatalog()
+    changes = empty_changes()
+    for item in items:
+        name = item.get("name")
+        if not name or item.get("price") is None:
+            continue
+        key = name.lower()
+        old = previous.get(key)
+        if old is None:
+            if key not in prices:
+                changes["added"].append(key)
+        elif item_record(old) != item_record(item):
+            changes["updated"].append(key)
+            if old.get("price") != item["price"]:
+                changes["price"][key] = (old.get("price"), item["price"])
+            if old.get("count") != item.get("count"):
+                changes["count"][key] = (old.get("count"), item.get("count"))
+        prices.add(item)
+
+    if len(prices) != len(previous) or changes["added"]:
+        changes["removed"] = [key for key in previous if key not in prices]
+
+    if previous and not has_changes(changes):
+        return previous, changes
+    return prices, changes
+
+
+def fetch(
+    previous: Mapping[str, dict] | None = None,
+    *,
+    url: str = LISSKINS_URL,
+    timeout: int = 30,
+    cache_path: Path | None = None,
+) -> tuple[Mapping[str, dict], dict]:
+    """Stream the lis-skins export and diff it against the previous map.
+
+    With cache_path the download is conditional (see http_cache); when
+    upstream answers 304 the previous map is returned untouched.
+    """
+    if cache_path is None:
+        req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return ingest(iter_items(resp), previous)
+
+    changed = http_cache.fetch_to_file(url, cache_path, timeout=timeout, user_agent=USER_AGENT)
+    if not changed and previous:
+        return previous, empty_changes()
+    with cache_path.open("rb") as fh:
+        return ingest(iter_items(fh), previous)
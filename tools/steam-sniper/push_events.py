@@ -0,0 +1,111 @@
+"""Server-sent event channel behind /api/events.
+
+Every connected dashboard gets a bounded queue. publish() fans an event out
+to all of them; a client more than PUSH_QUEUE_SIZE events behind has its
+stream ended, and EventSource reconnects and reloads.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import TYPE_CHECKING
+
+import db
+from beartype import beartype
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator
+
+PUSH_HEARTBEAT = 25  # seconds between SSE keep-alive comments (proxies drop idle streams)
+PUSH_QUEUE_SIZE = 32  # events buffered per client before it is dropped as too slow
+
+_event_loop: asyncio.AbstractEventLoop | None = None  # the serving loop, for signal handlers
+_subscribers: set[asyncio.Queue] = set()  # one queue per connected /api/events client
+_last_alert_id: int | None = None  # newest alerts row already pushed; None = not baselined
+
+
+def bind_loop(loop: asyncio.AbstractEventLoop) -> None:
+    """Remember the serving loop so close_subscribers_on_exit() can reach it."""
+    global _event_loop
+    _event_loop = loop
+
+
+def has_subscribers() -> bool:
+    return bool(_subscribers)
+
+
+def subscribe() -> asyncio.Queue:
+    """Register a new client; its queue receives every event published from now on."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=PUSH_QUEUE_SIZE)
+    _subscribers.add(queue)
+    return queue
+
+
+async def stream(queue: asyncio.Queue, hello: dict) -> AsyncGenerator[str]:
+    """SSE body for one subscribed client: hello, then events and heartbeats until ended."""
+    try:
+        yield f"retry: 5000\nevent: hello\ndata: {json.dumps(hello)}\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), PUSH_HEARTBEAT)
+            except TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if message is None:
+                return
+            yield message
+    finally:
+        _subscribers.discard(queue)
+
+
+@beartype
+def publish(event: str, data: dict) -> None:
+    """Fan one SSE event out to every connected client."""
+    message = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+    for queue in list(_subscribers):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Too far behind: end its stream; EventSource reconnects and reloads.
+            _end_stream(queue)
+
+
+def _end_stream(queue: asyncio.Queue) -> None:
+    _subscribers.discard(queue)
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(None)
+
+
+def new_alerts() -> list[dict]:
+    """Alerts logged (by the bot) since the last push."""
+    global _last_alert_id
+    if _last_alert_id is None:
+        _last_alert_id = db.get_max_alert_id()
+        return []
+    alerts = db.get_alerts_after(_last_alert_id)
+    if alerts:
+        _last_alert_id = alerts[-1]["id"]
+    return alerts
+
+
+def reset_alerts() -> None:
+    """Nobody is listening: re-baseline on the next push instead of replaying a backlog."""
+    global _last_alert_id
+    _last_alert_id = None
+
+
+def close_subscribers() -> None:
+    """End every open event stream (shutdown)."""
+    for queue in list(_subscribers):
+        _end_stream(queue)
+
+
+def close_subscribers_on_exit() -> None:
+    """Signal-handler hook: end event streams before uvicorn waits for connections to drain.
+
+    Lifespan shutdown only runs after every connection has closed, and an
+    open /api/events stream never closes on its own.
+    """
+    if _event_loop is not None and not _event_loop.is_closed():
+        _event_loop.call_soon_threadsafe(close_subscribers)
@@ -0,0 +1,106 @@
+"""Conditional, gzip-aware cache for the dashboard's read-only JSON endpoints.
+
+The dashboard and the PWA poll /api/catalog, /api/watchlist, /api/stats,
+/api/history and /api/item, but their data only moves once per collection,
+snapshot rebuild or list/watchlist write. Each response is cached under
+(path, query params) together with the data version it was built from; while
+the version holds, the stored JSON bytes (and their gzip) are served as-is.
+The ETag is a hash of the body, so a client whose copy is still identical
+gets a 304 even after the version moved on.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import NamedTuple
+
+from beartype import beartype
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+MAX_ENTRIES = 512
+GZIP_MIN_BYTES = 1024  # below this gzip framing costs more than it saves
+GZIP_LEVEL = 6
+CACHE_CONTROL = "no-cache"  # clients may keep a copy but must revalidate via ETag
+
+
+class _Entry(NamedTuple):
+    version: Hashable
+    etag: str
+    body: bytes
+    gzipped: bytes | None
+
+
+_entries: OrderedDict[tuple, _Entry] = OrderedDict()
+_sources: tuple = ()  # in-memory objects the cached bodies were built from
+_lock = threading.Lock()
+
+
+def clear() -> None:
+    """Drop every cached response."""
+    global _sources
+    with _lock:
+        _entries.clear()
+        _sources = ()
+
+
+def _encode(payload: object) -> _Entry:
+    body = json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    gzipped = gzip.compress(body, GZIP_LEVEL) if len(body) >= GZIP_MIN_BYTES else None
+    return _Entry(None, etag, body, gzipped)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+@beartype
+def respond(
+    request: Request,
+    version: Hashable,
+    build: Callable[[], object],
+    sources: tuple = (),
+) -> Response:
+    """Serve build()'s JSON for this request, reusing the stored body while version holds.
+
+    sources are compared by identity: swapping any of them (a new price
+    catalog, a reloaded image cache) drops every cached response.
+    """
+    global _sources
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    with _lock:
+        if len(sources) != len(_sources) or any(a is not b for a, b in zip(sources, _sources)):
+            _entries.clear()
+            _sources = sources
+        entry = _entries.get(key)
+        if entry is not None and entry.version == version:
+            _entries.move_to_end(key)
+        else:
+            entry = None
+
+    if entry is None:
+        entry = _encode(build())._replace(version=version)
+        with _lock:
+            _entries[key] = entry
+            _entries.move_to_end(key)
+            while len(_entries) > MAX_ENTRIES:
+                _entries.popitem(last=False)
+
+    headers = {"ETag": entry.etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match", ""), entry.etag):
+        return Response(status_code=304, headers=headers)
+    if entry.gzipped is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(entry.gzipped, media_type="application/json", headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
@@ -27,17 +27,39 @@ def parse_args() -> argparse.Namespace:
         default=2000,
         help="SQLite insert batch size",
     )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Rebuild from scratch instead of updating the existing snapshot in place",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild even if the upstream export is unchanged (HTTP 304)",
+    )
     return parser.parse_args()
 
 
 def main() -> int:
     args = parse_args()
     started = time.perf_counter()
-    result = build_snapshot(args.output, batch_size=args.batch_size)
+    result = build_snapshot(
+        args.output,
+        batch_size=args.batch_size,
+        force=args.force,
+        incremental=not args.full,
+    )
     elapsed = time.perf_counter() - started
     size_mb = result["size_bytes"] / (1024 * 1024)
+    if result["skipped"]:
+        print(
+            f"snapshot unchanged upstream: {result['rows']} rows kept at "
+            f"{result['path']} ({size_mb:.1f} MB) in {elapsed:.1f}s"
+        )
+        return 0
     print(
-        f"snapshot ready: {result['rows']} rows -> {result['path']} "
+        f"snapshot ready ({result['mode']}): {result['rows']} rows "
+        f"(+{result['added']} ~{result['updated']} -{result['removed']}) -> {result['path']} "
         f"({size_mb:.1f} MB) in {elapsed:.1f}s"
     )
     return 0
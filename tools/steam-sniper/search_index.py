@@ -0,0 +1,98 @@
+"""In-memory n-gram index for English substring search over the lis-skins catalog.
+
+Answers the same question as ``all(word in name_lower for word in words)``
+without scanning every item: each query word is narrowed through its rarest
+bigram/trigram posting list, and only those candidates are verified.
+Rows are numbered in ascending price order, so posting lists (and therefore
+results) come out already ranked by price.
+"""
+from __future__ import annotations
+
+from array import array
+from collections.abc import Mapping
+
+from beartype import beartype
+
+_GRAM_SIZES = (2, 3)
+
+
+def _grams(text: str, size: int) -> set[str]:
+    return {
+        text[i : i + size]
+        for i in range(len(text) - size + 1)
+        if not any(ch.isspace() for ch in text[i : i + size])
+    }
+
+
+@beartype
+def build_index(prices: Mapping[str, dict]) -> dict:
+    """Build a search index from {name_lower: item}. O(N) — call once per fetch.
+
+    Only keys are stored; matching items are read back from prices on search.
+    """
+    keys = sorted(prices, key=lambda name_lower: prices[name_lower]["price"])
+    postings: dict[str, array] = {}
+    for row, name_lower in enumerate(keys):
+        for size in _GRAM_SIZES:
+            for gram in _grams(name_lower, size):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array("I")
+                posting.append(row)
+    return {"keys": keys, "source": prices, "postings": postings}
+
+
+def _word_gram(word: str, postings: dict[str, array]) -> array | None:
+    """Return the shortest posting list covering a word, or None if unindexed."""
+    size = min(len(word), _GRAM_SIZES[-1])
+    if size < _GRAM_SIZES[0]:
+        return None
+    best: array | None = None
+    for gram in _grams(word, size):
+        posting = postings.get(gram)
+        if posting is None:
+            return array("I")
+        if best is None or len(posting) < len(best):
+            best = posting
+    return best
+
+
+def _candidate_rows(index: dict, words: list[str]) -> range | array:
+    best: array | None = None
+    for word in words:
+        posting = _word_gram(word, index["postings"])
+        if posting is not None and (best is None or len(posting) < len(best)):
+            best = posting
+    if best is None:
+        return range(len(index["keys"]))
+    return best
+
+
+def _matching_rows(index: dict, query: str, limit: int | None) -> list[int]:
+    words = query.lower().split()
+    if not words or not index:
+        return []
+    keys = index["keys"]
+    rows: list[int] = []
+    for row in _candidate_rows(index, words):
+        name_lower = keys[row]
+        if all(word in name_lower for word in words):
+            rows.append(row)
+            if limit is not None and len(rows) >= limit:
+                break
+    return rows
+
+
+@beartype
+def search_keys(index: dict, query: str, limit: int | None = None) -> list[str]:
+    """Return name_lower keys containing every query word, sorted by price ASC."""
+    keys = index.get("keys", [])
+    return [keys[row] for row in _matching_rows(index, query, limit)]
+
+
+@beartype
+def search(index: dict, query: str, limit: int | None = None) -> list[dict]:
+    """Return catalog items containing every query word, sorted by price ASC."""
+    keys = index.get("keys", [])
+    source = index.get("source", {})
+    return [source[keys[row]] for row in _matching_rows(index, query, limit)]
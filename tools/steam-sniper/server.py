@@ -10,25 +10,37 @@ import json
 import logging
 import os
 import re
+import time
 import urllib.parse
 import urllib.request
+from collections.abc import Callable, Mapping
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 from typing import TYPE_CHECKING
 
 from beartype import beartype
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
 from build_image_cache import ensure_image_cache, fetch_bymykel_all, load_image_cache
 import db
+import db_writer
+import list_alerts
+import price_feed
+import push_events
+import response_cache
+import search_index
+import steam_market
+import tg_outbox
 from category import classify
 from listings_snapshot import get_item_listings as snapshot_get_item_listings
-from listings_snapshot import snapshot_status
+from listings_snapshot import get_item_stats as snapshot_get_item_stats
+from listings_snapshot import get_underpriced_listings as snapshot_get_underpriced
+from listings_snapshot import SNAPSHOT_DB_PATH, snapshot_status
 
 if TYPE_CHECKING:
     from collections.abc import AsyncGenerator
@@ -37,20 +49,24 @@ logger = logging.getLogger("sniper.server")
 
 # --- Constants ---
 
-LISSKINS_URL = "https://lis-skins.com/market_export_json/csgo.json"
+LISSKINS_URL = price_feed.LISSKINS_URL
+LISSKINS_CACHE_PATH = Path(__file__).parent / "data" / "lis_skins_export.json"
 CBR_URL = "https://www.cbr-xml-daily.ru/daily_json.js"
 COLLECT_INTERVAL = 300  # 5 minutes
-LIST_ALERT_COOLDOWN = timedelta(hours=6)
 MSK = timezone(timedelta(hours=3))
 
 # --- Module-level state ---
 
-_prices: dict[str, dict] = {}  # {name_lower: {name, price, url, count}}
+_prices: Mapping[str, dict] = {}  # PriceCatalog: {name_lower: {name, price, url, count}}
 _category_counts: dict[str, int] = {}  # {category: count} for sidebar
+_catalog_index: dict = {}  # presorted catalog buckets, rebuilt per collection
+_last_changes: dict = price_feed.empty_changes()  # delta from the latest collection
+_trend_cache: tuple[float, dict[str, dict]] | None = None  # (loaded_at, {name_lower: trend})
 _image_cache: dict[str, str] = {}  # {name_lower: image_url} from ByMykel API
 _item_meta: dict[str, dict[str, str]] = {}  # {name_lower: {rarity_name, rarity_label, rarity_color}}
 _usd_rub: float = 0.0
 _last_update: str = ""
+_generation = 0  # bumped after every completed collection; part of response cache versions
 _collector_task: asyncio.Task | None = None
 ITEM_META_CACHE_PATH = Path(__file__).parent / "data" / "item_meta_cache.json"
 
@@ -65,13 +81,9 @@ LIS_SKINS_RATE_MULTIPLIER = 1.0314
 # --- Sync helpers (run via asyncio.to_thread) ---
 
 
-def _fetch_lis_skins() -> list[dict]:
-    """Fetch full lis-skins catalog. Returns raw list."""
-    req = urllib.request.Request(
-        LISSKINS_URL, headers={"User-Agent": "SteamSniper/1.0"}
-    )
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+def _fetch_lis_skins(previous: Mapping[str, dict]) -> tuple[Mapping[str, dict], dict]:
+    """Stream the lis-skins catalog, diffed against the previous price map."""
+    return price_feed.fetch(previous, url=LISSKINS_URL, cache_path=LISSKINS_CACHE_PATH)
 
 
 _WEAR_RE = re.compile(
@@ -427,6 +439,14 @@ _DOPPLER_SUFFIX_RE = re.compile(
 
 
 def _get_item_image(name: str) -> str:
+    """Image URL for name, memoized on the catalog entry when name is listed."""
+    entry = _get_catalog_index()["entries"].get(name.lower())
+    if entry is not None:
+        return entry["image"]
+    return _resolve_item_image(name)
+
+
+def _resolve_item_image(name: str) -> str:
     """Lookup image from cache. Falls back through wear/state/doppler-phase variants."""
     key = name.lower()
     img = _image_cache.get(key)
@@ -498,15 +518,13 @@ def _fix_mojibake(text: str) -> str:
 
 def _match_catalog_name(query: str, requested_wear: str | None = None) -> str | None:
     """Return canonical lis-skins name for an unambiguous search query."""
-    words = query.lower().split()
-    if not words:
+    if not query.split():
         return None
 
     matches = [
         item["name"]
-        for name_lower, item in _prices.items()
-        if all(word in name_lower for word in words)
-        and _wear_matches_requested(item["name"], requested_wear)
+        for item in search_index.search(_get_catalog_index()["search"], query)
+        if _wear_matches_requested(item["name"], requested_wear)
     ]
     if len(matches) == 1:
         return matches[0]
@@ -561,18 +579,7 @@ def _lis_rate() -> float:
     return _usd_rub * LIS_SKINS_RATE_MULTIPLIER
 
 
-def _calc_trend(name_lower: str) -> dict:
-    """Calculate 2-week price trend. Returns {direction, pct}."""
-    history = db.get_price_history(name_lower, "30d")
-    if len(history) < 2:
-        return {"direction": "flat", "pct": 0.0}
-
-    # Compare last price vs price ~14 days ago (or earliest available)
-    latest = history[-1]["price_usd"]
-    # Find price closest to 14 days ago
-    mid_idx = max(0, len(history) // 2)
-    old = history[mid_idx]["price_usd"]
-
+def _trend_from_points(old: float, latest: float) -> dict:
     if old <= 0:
         return {"direction": "flat", "pct": 0.0}
 
@@ -586,6 +593,28 @@ def _calc_trend(name_lower: str) -> dict:
     return {"direction": direction, "pct": pct}
 
 
+def _refresh_trends() -> dict[str, dict]:
+    """Recompute 2-week trends for every tracked name in one SQL pass."""
+    global _trend_cache
+    # Compare last price vs price ~14 days ago (middle of the 30d window)
+    trends = {
+        name: _trend_from_points(old, latest)
+        for name, (old, latest) in db.get_price_trend_points(30).items()
+    }
+    _trend_cache = (time.time(), trends)
+    return trends
+
+
+def _calc_trend(name_lower: str) -> dict:
+    """Return 2-week price trend from the bulk cache. Returns {direction, pct}."""
+    cache = _trend_cache
+    if cache is None or time.time() - cache[0] >= COLLECT_INTERVAL:
+        trends = _refresh_trends()
+    else:
+        trends = cache[1]
+    return trends.get(name_lower) or {"direction": "flat", "pct": 0.0}
+
+
 # --- Collector ---
 
 
@@ -627,54 +656,93 @@ async def _load_item_meta_cache() -> None:
 
 
 async def _collect_once(send_list_alerts: bool = True) -> None:
-    """Fetch prices + rate, snapshot watched items, prune old history."""
-    global _prices, _category_counts, _image_cache, _usd_rub, _last_update
+    """Fetch → parse/diff → swap catalog → persist → alert.
+
+    Network and parsing run on worker threads, all SQLite work on the DB
+    writer thread; the event loop itself only swaps module-level references.
+    """
+    global _prices, _category_counts, _catalog_index, _last_changes
+    global _image_cache, _usd_rub, _last_update, _generation
 
     try:
-        items = await asyncio.to_thread(_fetch_lis_skins)
-        _prices = {item["name"].lower(): item for item in items}
+        prices, changes = await asyncio.to_thread(_fetch_lis_skins, _prices)
     except Exception as e:
         logger.error("Failed to fetch lis-skins: %s", e)
         return
 
-    # Rebuild category counts for catalog sidebar
-    counts: dict[str, int] = {}
-    for item in _prices.values():
-        cat = classify(item["name"])
-        counts[cat] = counts.get(cat, 0) + 1
-    _category_counts = counts
-
-
+    # Classify/sort and resolve images/rarity once per collection so catalog
+    # pages are bucket slices. An unchanged export returns the same dict, so
+    # the current index stays valid unless the image/meta caches were reloaded.
+    if not _catalog_index_is_current(_catalog_index, prices):
+        index = await asyncio.to_thread(_build_catalog_index, prices)
+        _prices = prices
+        _catalog_index = index
+        _category_counts = index["category_counts"]
+    _last_changes = changes
+
+    previous_rate = _usd_rub
     try:
         rate = await asyncio.to_thread(_fetch_usd_rub)
-        _usd_rub = rate
-        db.save_rate("USD", rate)
     except Exception as e:
         logger.warning("Failed to fetch USD/RUB: %s", e)
-        cached = db.get_cached_rate("USD")
-        if cached:
-            _usd_rub = cached
-
-    # Snapshot watched items
-    watched = db.get_watchlist_names()
-    snapshots = [
-        (name, _prices[name]["price"])
-        for name in watched
-        if name in _prices
-    ]
-    if snapshots:
-        db.insert_price_snapshots(snapshots)
+        rate = None
+    else:
+        _usd_rub = rate
+
+    cached_rate, snapshot_count = await db_writer.run(
+        db_writer.persist_collection, _prices, changes, rate, _refresh_trends
+    )
+    if cached_rate:
+        _usd_rub = cached_rate
 
     if send_list_alerts:
-        await _check_list_alerts()
+        list_alerts.start_list_alerts(_lis_rate(), _find_price_item)
 
-    db.prune_old_history(90)
     _last_update = datetime.now(MSK).isoformat(timespec="seconds")
+    _generation += 1
+    if push_events.has_subscribers():
+        push_events.publish("update", await db_writer.run(_push_delta, changes, previous_rate))
+    else:
+        push_events.reset_alerts()
     logger.info(
-        "Collected %d items, %d snapshots", len(_prices), len(snapshots)
+        "Collected %d items (+%d -%d ~%d), %d snapshots",
+        len(_prices),
+        len(changes["added"]),
+        len(changes["removed"]),
+        len(changes["updated"]),
+        snapshot_count,
     )
 
 
+# --- Push channel ---
+
+
+def _push_delta(changes: dict, previous_rate: float) -> dict:
+    """Compact post-collection delta: watched/listed price moves, new alerts, rate change."""
+    tracked = db.get_watchlist_names() | {name.lower() for name in db.get_all_list_names()}
+    rate = _lis_rate()
+    prices = []
+    for key in (*changes["added"], *changes["updated"]):
+        item = _prices.get(key) if key in tracked else None
+        if item:
+            prices.append({
+                "name": item["name"],
+                "price_usd": item["price"],
+                "price_rub": round(item["price"] * rate, 2),
+                "count": item.get("count", 0),
+            })
+    delta = {
+        "generation": _generation,
+        "updated_at": _last_update,
+        "prices": prices,
+        "removed": [key for key in changes["removed"] if key in tracked],
+        "alerts": push_events.new_alerts(),
+    }
+    if _usd_rub != previous_rate:
+        delta["usd_rub"] = round(rate, 2)
+    return delta
+
+
 async def _collector_loop() -> None:
     """Background loop: collect every COLLECT_INTERVAL seconds."""
     while True:
@@ -692,14 +760,20 @@ async def _collector_loop() -> None:
 async def lifespan(_app: FastAPI) -> AsyncGenerator[None]:
     """Startup: init db, first collect, start loops. Shutdown: cancel loops."""
     global _collector_task, _image_cache, _item_meta
+    push_events.bind_loop(asyncio.get_running_loop())
     db.init_db()
     await _load_image_cache()
     await _load_item_meta_cache()
     await _collect_once(send_list_alerts=False)
     _collector_task = asyncio.create_task(_collector_loop())
     yield
+    push_events.close_subscribers()
     if _collector_task:
         _collector_task.cancel()
+    list_alerts.cancel()
+    await tg_outbox.close()
+    db_writer.shutdown()
+    db.close_all_connections()
 
 
 # --- App ---
@@ -793,6 +867,13 @@ def _rarity_color(category: str | None) -> str:
 
 
 def _get_rarity_meta(name: str) -> dict[str, str | bool]:
+    entry = _get_catalog_index()["entries"].get(name.lower())
+    if entry is not None:
+        return entry["rarity"]
+    return _resolve_rarity_meta(name)
+
+
+def _resolve_rarity_meta(name: str) -> dict[str, str | bool]:
     meta = _get_item_meta(name)
     label = str(meta.get("rarity_label") or "").strip()
     color = str(meta.get("rarity_color") or "").strip() or "#b0c3d9"
@@ -804,25 +885,21 @@ def _get_rarity_meta(name: str) -> dict[str, str | bool]:
     }
 
 
+def _wear_family(name: str) -> dict[str, str]:
+    """Return {wear_code: name_lower} for every exterior of name's skin in the catalog."""
+    return _get_catalog_index()["families"].get(_base_item_key(name), {})
+
+
 def _build_wear_tiers(name: str, rate: float) -> list[dict]:
     current_wear = _wear_code_from_name(name)
     if not current_wear:
         return []
 
-    family = _base_item_key(name)
-    variants: dict[str, dict] = {}
-    for item in _prices.values():
-        item_name = item.get("name")
-        if not item_name or _base_item_key(item_name) != family:
-            continue
-        wear_code = _wear_code_from_name(item_name)
-        if not wear_code:
-            continue
-        variants[wear_code] = item
-
+    variants = _wear_family(name)
     tiers = []
     for wear_code in _WEAR_ORDER:
-        item = variants.get(wear_code)
+        key = variants.get(wear_code)
+        item = _prices.get(key) if key else None
         if not item:
             continue
         min_price_usd = item.get("price")
@@ -843,6 +920,28 @@ def _build_wear_tiers(name: str, rate: float) -> list[dict]:
     return tiers
 
 
+def _snapshot_version() -> tuple[int, int]:
+    """Cheap stamp of the listings snapshot file (rebuilds and incremental updates both touch it)."""
+    try:
+        st = os.stat(SNAPSHOT_DB_PATH)
+    except OSError:
+        return (0, 0)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _cached_json(request: Request, build: Callable[[], dict], snapshot: bool = False) -> Response:
+    """Serve a read-only endpoint through response_cache, versioned by collection and DB state."""
+    version = (
+        _generation,
+        db.data_version(),
+        _usd_rub,
+        _last_update,
+        _snapshot_version() if snapshot else None,
+    )
+    sources = (_prices, _image_cache, _item_meta, _trend_cache)
+    return response_cache.respond(request, version, build, sources)
+
+
 # --- Endpoints ---
 
 
@@ -855,8 +954,12 @@ def serve_dashboard() -> FileResponse:
 
 @app.get("/api/watchlist")
 @beartype
-def get_watchlist() -> dict:
+def get_watchlist(request: Request) -> Response:
     """Return watchlist with live prices and deltas (API-02)."""
+    return _cached_json(request, _watchlist_payload)
+
+
+def _watchlist_payload() -> dict:
     wl = db.get_watchlist()
     result: dict[str, list[dict] | float | int | str] = {
         "buy": [],
@@ -961,50 +1064,10 @@ def delete_from_watchlist(name: str) -> JSONResponse:
 
 # --- Russian search via Steam Market API ---
 
-_STEAM_SEARCH_URL = (
-    "https://steamcommunity.com/market/search/render/"
-    "?query={q}&appid=730&norender=1&count=50&l=russian"
-)
-_STEAM_IMG = "https://community.fastly.steamstatic.com/economy/image/"
-
 
 def _steam_search(q: str) -> list[dict]:
-    """Query Steam Market with pagination, return enriched results."""
-    from urllib.parse import quote
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36",
-        "Accept": "application/json",
-    }
-    results: list[dict] = []
-    # Steam returns ~10 per page despite count=50; paginate to cover all
-    for start in range(0, 100, 10):
-        url = _STEAM_SEARCH_URL.format(q=quote(q)) + f"&start={start}"
-        req = urllib.request.Request(url, headers=headers)
-        try:
-            with urllib.request.urlopen(req, timeout=8) as resp:
-                data = json.loads(resp.read().decode("utf-8"))
-            batch = data.get("results", [])
-            if not batch:
-                break
-            for r in batch:
-                ad = r.get("asset_description", {})
-                icon = ad.get("icon_url", "")
-                results.append({
-                    "hash_name": r.get("hash_name", ""),
-                    "name_ru": r.get("name", ""),
-                    "type_ru": ad.get("type", ""),
-                    "image": f"{_STEAM_IMG}{icon}/128fx128f" if icon else "",
-                    "name_color": ad.get("name_color", ""),
-                })
-            total = data.get("total_count", 0)
-            if start + len(batch) >= total:
-                break
-        except Exception as e:
-            logger.warning("Steam search page %d failed: %s", start, e)
-            break
-    return results
+    """Query Steam Market (cached, see steam_market), return enriched results."""
+    return steam_market.search(q)
 
 
 def _resolve_item_name(name: str) -> str:
@@ -1031,6 +1094,12 @@ def _resolve_item_name(name: str) -> str:
             return item["name"]
 
         if any("\u0400" <= c <= "\u04ff" for c in candidate):
+            # Exact localized name seen in an earlier Steam response — no network.
+            for steam_item in steam_market.lookup_localized(_normalize_lookup_text(candidate)):
+                lis_item = _prices.get(steam_item["hash_name"].lower())
+                if lis_item and _wear_matches_requested(lis_item["name"], requested_wear):
+                    return lis_item["name"]
+
             steam_results: list[dict] = []
             for query in _steam_search_queries_for_ru_name(candidate):
                 steam_results = _steam_search(query)
@@ -1084,153 +1153,6 @@ def _find_price_item(name: str) -> dict | None:
     return None
 
 
-def _parse_timestamp(value: str | None) -> datetime | None:
-    if not value:
-        return None
-    try:
-        parsed = datetime.fromisoformat(value)
-    except ValueError:
-        return None
-    if parsed.tzinfo is None:
-        return parsed.replace(tzinfo=MSK)
-    return parsed.astimezone(MSK)
-
-
-def _notified_recently(value: str | None) -> bool:
-    ts = _parse_timestamp(value)
-    if ts is None:
-        return False
-    return datetime.now(MSK) - ts < LIST_ALERT_COOLDOWN
-
-
-def _list_alert_chat_ids() -> list[str]:
-    raw = (
-        os.environ.get("LIST_ALERT_CHAT_IDS")
-        or os.environ.get("LESHA_TG_CHAT_ID")
-        or os.environ.get("ALERT_CHAT_IDS", "")
-    )
-    ids: list[str] = []
-    for part in raw.split(","):
-        cid = part.strip()
-        if cid and cid not in ids:
-            ids.append(cid)
-    return ids
-
-
-def _list_type_label(list_type: str) -> str:
-    return "Избранное" if list_type == "favorite" else "Хотелки"
-
-
-def _format_list_alert_message(
-    entry: dict,
-    direction: str,
-    current_price_rub: float,
-    url: str,
-) -> str:
-    target = entry["target_below_rub"] if direction == "below" else entry["target_above_rub"]
-    icon = "🔴" if direction == "below" else "🟢"
-    title = "Цена упала" if direction == "below" else "Цена выросла"
-    lines = [
-        f"{icon} {title}: {entry['item_name']}",
-        f"Сейчас: {round(current_price_rub):,} ₽".replace(",", " "),
-        f"Твой target: {round(float(target or 0)):,} ₽".replace(",", " "),
-        f"Список: {_list_type_label(entry['list_type'])}",
-    ]
-    if url:
-        lines.append(f"lis-skins: {url}")
-    return "\n".join(lines)
-
-
-def _send_telegram_message_sync(text: str, chat_ids: list[str] | None = None) -> int:
-    token = os.environ.get("TELEGRAM_BOT_TOKEN")
-    chat_ids = chat_ids or _list_alert_chat_ids()
-    if not token or not chat_ids:
-        return 0
-
-    sent = 0
-    api_url = f"https://api.telegram.org/bot{token}/sendMessage"
-    for chat_id in chat_ids:
-        payload = urllib.parse.urlencode({
-            "chat_id": chat_id,
-            "text": text,
-            "disable_web_page_preview": "true",
-        }).encode("utf-8")
-        req = urllib.request.Request(
-            api_url,
-            data=payload,
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        try:
-            with urllib.request.urlopen(req, timeout=10) as resp:
-                data = json.loads(resp.read().decode("utf-8"))
-            if data.get("ok"):
-                sent += 1
-            else:
-                logger.warning("Telegram send failed for %s: %s", chat_id, data)
-        except Exception as e:
-            logger.warning("Telegram send failed for %s: %s", chat_id, e)
-    return sent
-
-
-async def _send_telegram_message(text: str, chat_ids: list[str] | None = None) -> int:
-    return await asyncio.to_thread(_send_telegram_message_sync, text, chat_ids)
-
-
-async def _check_list_alerts() -> None:
-    """Send Telegram alerts for favorite/wishlist thresholds with cooldown."""
-    rate = _lis_rate()
-    if rate <= 0:
-        return
-
-    for entry in db.get_all_list_items_with_targets():
-        item = _find_price_item(entry["item_name"])
-        if not item:
-            continue
-
-        current_price_rub = item["price"] * rate
-        url = item.get("url", "")
-
-        below_target = entry.get("target_below_rub")
-        if below_target is not None:
-            if current_price_rub <= float(below_target):
-                if not _notified_recently(entry.get("last_notified_below_at")):
-                    message = _format_list_alert_message(
-                        entry,
-                        "below",
-                        current_price_rub,
-                        url,
-                    )
-                    sent = await _send_telegram_message(message)
-                    if sent:
-                        db.mark_list_item_notified(
-                            int(entry["id"]),
-                            "below",
-                            datetime.now(MSK).isoformat(timespec="seconds"),
-                        )
-            elif entry.get("last_notified_below_at"):
-                db.clear_list_item_notified(int(entry["id"]), "below")
-
-        above_target = entry.get("target_above_rub")
-        if above_target is not None:
-            if current_price_rub >= float(above_target):
-                if not _notified_recently(entry.get("last_notified_above_at")):
-                    message = _format_list_alert_message(
-                        entry,
-                        "above",
-                        current_price_rub,
-                        url,
-                    )
-                    sent = await _send_telegram_message(message)
-                    if sent:
-                        db.mark_list_item_notified(
-                            int(entry["id"]),
-                            "above",
-                            datetime.now(MSK).isoformat(timespec="seconds"),
-                        )
-            elif entry.get("last_notified_above_at"):
-                db.clear_list_item_notified(int(entry["id"]), "above")
-
-
 @app.get("/api/search")
 @beartype
 def search_items(q: str = Query(min_length=2)) -> dict:
@@ -1265,14 +1187,9 @@ def search_items(q: str = Query(min_length=2)) -> dict:
                 "on_lis_skins": lis_item is not None,
             })
     else:
-        # English — direct match in lis-skins cache
-        words = q.lower().split()
-        matches = []
-        for name_lower, item in _prices.items():
-            if all(w in name_lower for w in words):
-                matches.append(item)
-        matches.sort(key=lambda x: x["price"])
-        for item in matches[:24]:
+        # English — n-gram index over lis-skins cache, already price-ranked
+        matches = search_index.search(_get_catalog_index()["search"], q, limit=24)
+        for item in matches:
             out.append({
                 "name": item["name"],
                 "name_ru": "",
@@ -1291,11 +1208,138 @@ def search_items(q: str = Query(min_length=2)) -> dict:
 
 # Valid sort options for catalog
 _CATALOG_SORTS = {"name_asc", "name_desc", "price_asc", "price_desc", "count_desc"}
+_CATALOG_SORT_KEYS: dict[str, tuple] = {
+    "name_asc": (lambda x: x["name_lower"], False),
+    "name_desc": (lambda x: x["name_lower"], True),
+    "price_asc": (lambda x: x["price_usd"], False),
+    "price_desc": (lambda x: x["price_usd"], True),
+    "count_desc": (lambda x: x["count"], True),
+}
+_CATALOG_STATES = ("all", "normal", "stattrak", "souvenir")
+_CATALOG_ENTRY_FIELDS = ("name", "category", "model", "price_usd", "count", "url", "image", "available")
+
+
+def _catalog_states(name: str) -> list[str]:
+    """Return every state filter (besides 'all') the item passes."""
+    is_stattrak = "StatTrak\u2122" in name
+    is_souvenir = name.startswith("Souvenir ") or " Souvenir " in name
+    states: list[str] = []
+    if is_stattrak:
+        states.append("stattrak")
+    if is_souvenir:
+        states.append("souvenir")
+    if not states:
+        states.append("normal")
+    return states
+
+
+def _build_catalog_index(prices: Mapping[str, dict]) -> dict:
+    """Classify every catalog item once and presort it into filter buckets.
+
+    Buckets are keyed by (category, state, model_lower) where "" means "any",
+    and each bucket holds one list per _CATALOG_SORTS key, in the same order
+    a full stable sort of the filtered catalog would produce.
+    """
+    entries: list[dict] = []
+    category_counts: dict[str, int] = {}
+    families: dict[tuple[str, str], dict[str, str]] = {}
+    for name_lower, item in prices.items():
+        name = item["name"]
+        wear_code = _wear_code_from_name(name)
+        if wear_code:
+            families.setdefault(_base_item_key(name), {})[wear_code] = name_lower
+        cat = classify(name)
+        category_counts[cat] = category_counts.get(cat, 0) + 1
+        count = item.get("count", 0)
+        model = _weapon_model(name) if cat in _MODEL_CATEGORIES else ""
+        entries.append(
+            {
+                "name": name,
+                "name_lower": name_lower,
+                "category": cat,
+                "model": model,
+                "model_lower": model.lower(),
+                "states": _catalog_states(name),
+                "price_usd": item["price"],
+                "count": count,
+                "url": item.get("url", ""),
+                "image": _resolve_item_image(name),
+                "rarity": _resolve_rarity_meta(name),
+                "available": count > 0,
+            }
+        )
+
+    buckets: dict[tuple[str, str, str], dict[str, list[dict]]] = {}
+    for sort_key, (key_fn, reverse) in _CATALOG_SORT_KEYS.items():
+        for entry in sorted(entries, key=key_fn, reverse=reverse):
+            models = (entry["model_lower"], "") if entry["model_lower"] else ("",)
+            for cat in (entry["category"], ""):
+                for state in (*entry["states"], "all"):
+                    for model in models:
+                        bucket = buckets.setdefault((cat, state, model), {})
+                        bucket.setdefault(sort_key, []).append(entry)
+
+    model_counts: dict[tuple[str, str], list[dict[str, int | str]]] = {}
+    for (cat, state, model), bucket in buckets.items():
+        if model or cat not in _MODEL_CATEGORIES:
+            continue
+        model_counts[(cat, state)] = _count_models(bucket["name_asc"])
+
+    return {
+        "source": prices,
+        "size": len(prices),
+        "image_source": _image_cache,
+        "meta_source": _item_meta,
+        "entries": {entry["name_lower"]: entry for entry in entries},
+        "buckets": buckets,
+        "model_counts": model_counts,
+        "category_counts": category_counts,
+        "families": families,
+        "search": search_index.build_index(prices),
+    }
+
+
+def _count_models(entries: list[dict]) -> list[dict[str, int | str]]:
+    model_counts: dict[str, int] = {}
+    for entry in entries:
+        model_name = entry["model"]
+        if not model_name:
+            continue
+        model_counts[model_name] = model_counts.get(model_name, 0) + 1
+    return [
+        {"name": model_name, "count": count}
+        for model_name, count in sorted(
+            model_counts.items(),
+            key=lambda pair: (-pair[1], pair[0].lower()),
+        )
+    ]
+
+
+def _catalog_index_is_current(index: dict, prices: Mapping[str, dict]) -> bool:
+    """True while index was built from prices and the current image/rarity caches."""
+    return (
+        index.get("source") is prices
+        and index.get("size") == len(prices)
+        and index.get("image_source") is _image_cache
+        and index.get("meta_source") is _item_meta
+    )
+
+
+def _get_catalog_index() -> dict:
+    """Return the catalog index, rebuilding it if _prices or the image/meta caches were swapped."""
+    global _catalog_index, _category_counts
+    index = _catalog_index
+    if not _catalog_index_is_current(index, _prices):
+        index = _build_catalog_index(_prices)
+        _catalog_index = index
+        _category_counts = index["category_counts"]
+    return index
 
 
 @app.get("/api/catalog")
 @beartype
 def get_catalog(
+    request: Request,
     limit: int = Query(default=50, ge=1, le=200),
     offset: int = Query(default=0, ge=0),
     category: str | None = Query(default=None),
@@ -1303,48 +1347,33 @@ def get_catalog(
     sort: str = Query(default="name_asc"),
     model: str | None = Query(default=None),
     q: str | None = Query(default=None),
-) -> dict:
+) -> Response:
     """Browse full catalog with pagination, filtering, sorting, and search."""
-    rate = _lis_rate()
-
-    if state not in ("all", "normal", "stattrak", "souvenir"):
-        state = "all"
+    return _cached_json(
+        request, lambda: _catalog_payload(limit, offset, category, state, sort, model, q)
+    )
 
-    # Build enriched list from in-memory prices
-    items: list[dict] = []
-    for item in _prices.values():
-        cat = classify(item["name"])
 
-        # Category filter
-        if category and cat != category:
-            continue
+def _catalog_payload(
+    limit: int,
+    offset: int,
+    category: str | None,
+    state: str,
+    sort: str,
+    model: str | None,
+    q: str | None,
+) -> dict:
+    rate = _lis_rate()
+    index = _get_catalog_index()
 
-        # State filter (StatTrak / Souvenir / normal)
-        name = item["name"]
-        is_stattrak = "StatTrak\u2122" in name
-        is_souvenir = name.startswith("Souvenir ") or " Souvenir " in name
-        if state == "stattrak" and not is_stattrak:
-            continue
-        if state == "souvenir" and not is_souvenir:
-            continue
-        if state == "normal" and (is_stattrak or is_souvenir):
-            continue
+    if state not in _CATALOG_STATES:
+        state = "all"
+    if sort not in _CATALOG_SORTS:
+        sort = "name_asc"
 
-        item_dict = {
-            "name": item["name"],
-            "category": cat,
-            "model": _weapon_model(item["name"]) if cat in _MODEL_CATEGORIES else "",
-            "price_usd": item["price"],
-            "price_rub": round(item["price"] * rate, 2),
-            "count": item.get("count", 0),
-            "url": item.get("url", ""),
-            "image": _get_item_image(item["name"]),
-            "available": item.get("count", 0) > 0,
-        }
-        # Add trend for case items (used by cases tab)
-        if cat == "case":
-            item_dict["trend"] = _calc_trend(item["name"].lower())
-        items.append(item_dict)
+    cat_key = category or ""
+    bucket = index["buckets"].get((cat_key, state, ""), {})
+    items: list[dict] = bucket.get(sort, [])
 
     # Search filter
     if q:
@@ -1353,62 +1382,40 @@ def get_catalog(
             # Translate Russian terms to English, then search locally
             en_query = _translate_ru_to_en(q.lower())
             if en_query:
-                words = en_query.lower().split()
-                items = [
-                    it for it in items
-                    if all(w in it["name"].lower() for w in words)
-                ]
+                en_names = set(search_index.search_keys(index["search"], en_query))
             else:
                 # No translation found — fallback to Steam Market API
                 steam_results = _steam_search(q)
                 en_names = {sr["hash_name"].lower() for sr in steam_results}
-                items = [it for it in items if it["name"].lower() in en_names]
         else:
-            # English — direct substring match
-            words = q.lower().split()
-            items = [
-                it for it in items
-                if all(w in it["name"].lower() for w in words)
-            ]
+            # English — n-gram index lookup
+            en_names = set(search_index.search_keys(index["search"], q))
+        items = [it for it in items if it["name_lower"] in en_names]
 
     models: list[dict[str, int | str]] = []
     if category in _MODEL_CATEGORIES:
-        model_counts: dict[str, int] = {}
-        for item in items:
-            model_name = item.get("model") or ""
-            if not model_name:
-                continue
-            model_counts[model_name] = model_counts.get(model_name, 0) + 1
-        models = [
-            {"name": model_name, "count": count}
-            for model_name, count in sorted(
-                model_counts.items(),
-                key=lambda pair: (-pair[1], pair[0].lower()),
-            )
-        ]
+        if q:
+            models = _count_models(items)
+        else:
+            models = index["model_counts"].get((cat_key, state), [])
 
     if model:
-        items = [
-            item for item in items
-            if (item.get("model") or "").lower() == model.lower()
-        ]
-
-    # Sort
-    if sort not in _CATALOG_SORTS:
-        sort = "name_asc"
-
-    sort_keys: dict[str, tuple] = {
-        "name_asc": (lambda x: x["name"].lower(), False),
-        "name_desc": (lambda x: x["name"].lower(), True),
-        "price_asc": (lambda x: x["price_usd"], False),
-        "price_desc": (lambda x: x["price_usd"], True),
-        "count_desc": (lambda x: x["count"], True),
-    }
-    key_fn, reverse = sort_keys[sort]
-    items.sort(key=key_fn, reverse=reverse)
+        if q:
+            model_lower = model.lower()
+            items = [item for item in items if item["model_lower"] == model_lower]
+        else:
+            bucket = index["buckets"].get((cat_key, state, model.lower()), {})
+            items = bucket.get(sort, [])
 
     total = len(items)
-    page = items[offset : offset + limit]
+    page: list[dict] = []
+    for entry in items[offset : offset + limit]:
+        item_dict = {field: entry[field] for field in _CATALOG_ENTRY_FIELDS}
+        item_dict["price_rub"] = round(entry["price_usd"] * rate, 2)
+        # Add trend for case items (used by cases tab)
+        if entry["category"] == "case":
+            item_dict["trend"] = _calc_trend(entry["name_lower"])
+        page.append(item_dict)
 
     return {
         "items": page,
@@ -1423,6 +1430,7 @@ def get_catalog(
 @app.get("/api/item/{name}")
 @beartype
 def get_item_detail(
+    request: Request,
     name: str,
     limit: int = Query(default=40, ge=1, le=100),
     sort: str = Query(default="price_asc"),
@@ -1430,8 +1438,26 @@ def get_item_detail(
     float_max: float | None = Query(default=None, ge=0.0, le=1.0),
     has_stickers: str = Query(default="all"),
     has_keychains: str = Query(default="all"),
-) -> dict:
+) -> Response:
     """Return detailed listings for a single skin from the local snapshot DB."""
+    return _cached_json(
+        request,
+        lambda: _item_detail_payload(
+            name, limit, sort, float_min, float_max, has_stickers, has_keychains
+        ),
+        snapshot=True,
+    )
+
+
+def _item_detail_payload(
+    name: str,
+    limit: int,
+    sort: str,
+    float_min: float | None,
+    float_max: float | None,
+    has_stickers: str,
+    has_keychains: str,
+) -> dict:
     rate = _lis_rate()
     key = name.lower()
     summary_src = _prices.get(key, {})
@@ -1500,12 +1526,72 @@ def get_item_detail(
     }
 
 
+_STATS_PRICE_FIELDS = ("min_price", "p10_price", "median_price", "p90_price", "sticker_median_price")
+
+
+def _stats_with_rub(stats: dict, rate: float) -> dict:
+    for field in _STATS_PRICE_FIELDS:
+        value = stats.get(field)
+        stats[f"{field}_rub"] = round(value * rate, 2) if value is not None else None
+    return stats
+
+
+@app.get("/api/item/{name}/stats")
+@beartype
+def get_item_stats(name: str) -> dict:
+    """Price percentiles, float distribution and sticker premium from the snapshot."""
+    summary_name = _prices.get(name.lower(), {}).get("name", name)
+    stats = snapshot_get_item_stats(summary_name)
+    snap = snapshot_status()
+    return {
+        "name": summary_name,
+        "stats": _stats_with_rub(stats, _lis_rate()) if stats else None,
+        "snapshot_available": snap["available"],
+        "snapshot_built_at": snap["built_at"],
+    }
+
+
+@app.get("/api/underpriced")
+@beartype
+def get_underpriced(
+    limit: int = Query(default=50, ge=1, le=200),
+    min_discount: float = Query(default=15.0, ge=0.0, le=100.0),
+    min_listings: int = Query(default=5, ge=2),
+) -> dict:
+    """Cheapest listing per skin where it undercuts that skin's median the most."""
+    rate = _lis_rate()
+    items = []
+    for row in snapshot_get_underpriced(
+        limit, min_discount_pct=min_discount, min_listings=min_listings
+    ):
+        lis_item = _prices.get(row["name"].lower(), {})
+        items.append({
+            "name": row["name"],
+            "listing_id": row["cheapest_id"],
+            "float": row["float_value"],
+            "paint_seed": row["paint_seed"],
+            "item_link": row["item_link"],
+            "discount_pct": row["discount_pct"],
+            "listings": row["listings"],
+            "price_usd": row["min_price"],
+            "price_rub": round(row["min_price"] * rate, 2),
+            "median_usd": row["median_price"],
+            "median_rub": round(row["median_price"] * rate, 2),
+            "image": _get_item_image(row["name"]),
+            "category": classify(row["name"]),
+            "url": lis_item.get("url", ""),
+        })
+    snap = snapshot_status()
+    return {"items": items, "snapshot_built_at": snap["built_at"]}
+
+
 @app.get("/api/history/{name}")
 @beartype
-def get_history(name: str, tf: str = "7d") -> dict:
-    """Return price history for charting (API-06)."""
-    points = db.get_price_history(name, tf)
-    return {"name": name, "tf": tf, "points": points}
+def get_history(request: Request, name: str, tf: str = "7d") -> Response:
+    """Return price history for charting (API-06), from the matching rollup tier."""
+    return _cached_json(
+        request, lambda: {"name": name, "tf": tf, "points": db.get_chart_history(name, tf)}
+    )
 
 
 @app.get("/api/debug")
@@ -1522,9 +1608,15 @@ def debug_info() -> dict:
 
 @app.get("/api/stats")
 @beartype
-def get_stats() -> dict:
+def get_stats(request: Request) -> Response:
     """Return portfolio stats (API-07)."""
-    prices_map = {name: item["price"] for name, item in _prices.items()}
+    return _cached_json(request, _stats_payload)
+
+
+def _stats_payload() -> dict:
+    prices_map = {
+        name: _prices[name]["price"] for name in db.get_watchlist_names() if name in _prices
+    }
     stats = db.get_portfolio_stats(prices_map, rate=_lis_rate())
     stats["usd_rub"] = round(_lis_rate(), 2)
     stats["total_lis_skins"] = len(_prices)
@@ -1540,6 +1632,18 @@ def get_alerts(limit: int = Query(default=20, le=100)) -> dict:
     return {"alerts": alerts}
 
 
+@app.get("/api/events")
+@beartype
+async def stream_events() -> StreamingResponse:
+    """Server-sent events: an ``update`` delta after every collection, ``list_alerts`` as they fire."""
+    queue = push_events.subscribe()
+    return StreamingResponse(
+        push_events.stream(queue, {"generation": _generation, "updated_at": _last_update}),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # --- Personal Lists (favorites / wishlist) ---
 
 
@@ -1657,4 +1761,12 @@ def get_list_items_endpoint(user: str = Query(...), type: str | None = Query(def
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("server:app", host="0.0.0.0", port=8100, reload=False)
+    class _Server(uvicorn.Server):
+        def handle_exit(self, sig: int, frame: object) -> None:
+            push_events.close_subscribers_on_exit()
+            super().handle_exit(sig, frame)
+
+    config = uvicorn.Config(
+        "server:app", host="0.0.0.0", port=8100, reload=False, timeout_graceful_shutdown=10
+    )
+    _Server(config).run()
@@ -0,0 +1,108 @@
+"""Per-name price/float aggregates (name_stats) of the item-detail snapshot.
+
+Computed while the snapshot is built or updated, so item pages and the
+underpriced feed read one row per name instead of scanning its listings.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import sqlite3
+
+from beartype import beartype
+
+FLOAT_BUCKETS = 10  # equal-width bins between a name's lowest and highest float
+
+# name_stats columns as served to the API, for queries aliasing name_stats as s
+STATS_COLUMNS = """
+    s.name, s.listings, s.min_price, s.p10_price, s.median_price, s.p90_price,
+    s.cheapest_id, s.discount_pct, s.float_min, s.float_max, s.float_buckets,
+    s.sticker_listings, s.sticker_median_price, s.sticker_premium_pct
+"""
+
+_INSERT_NAME_STATS_SQL = f"INSERT INTO name_stats VALUES ({','.join('?' * 15)})"
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    """Linear-interpolated percentile of an ascending, non-empty list."""
+    pos = (len(sorted_values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def _name_stats_row(name_lower: str, rows: list[tuple]) -> tuple:
+    """Aggregate one name's (name, id, price, float_value, has_stickers) rows, price-sorted."""
+    prices = [row[2] for row in rows]
+    median = _percentile(prices, 0.5)
+    discount = round((median - prices[0]) / median * 100, 1) if median > 0 else 0.0
+
+    floats = sorted(row[3] for row in rows if row[3] is not None)
+    buckets = [0] * FLOAT_BUCKETS
+    float_min = float_max = None
+    if floats:
+        float_min, float_max = floats[0], floats[-1]
+        width = (float_max - float_min) / FLOAT_BUCKETS or 1.0
+        for value in floats:
+            buckets[min(int((value - float_min) / width), FLOAT_BUCKETS - 1)] += 1
+
+    sticker_prices = [row[2] for row in rows if row[4]]
+    plain_prices = [row[2] for row in rows if not row[4]]
+    sticker_median = _percentile(sticker_prices, 0.5) if sticker_prices else None
+    premium = None
+    if sticker_median is not None and plain_prices:
+        plain_median = _percentile(plain_prices, 0.5)
+        if plain_median > 0:
+            premium = round((sticker_median / plain_median - 1) * 100, 1)
+
+    return (
+        name_lower,
+        rows[0][0],
+        len(prices),
+        prices[0],
+        _percentile(prices, 0.1),
+        median,
+        _percentile(prices, 0.9),
+        rows[0][1],
+        discount,
+        float_min,
+        float_max,
+        json.dumps(buckets),
+        len(sticker_prices),
+        sticker_median,
+        premium,
+    )
+
+
+@beartype
+def refresh_name_stats(conn: sqlite3.Connection, *, changed_only: bool) -> int:
+    """Recompute name_stats for every name, or only names listed in name_changes."""
+    where = "WHERE name_lower IN (SELECT name_lower FROM name_changes)" if changed_only else ""
+    conn.execute(f"DELETE FROM name_stats {where}")
+    cursor = conn.execute(
+        f"""
+        SELECT name_lower, name, id, price, float_value, has_stickers
+        FROM listings {where}
+        ORDER BY name_lower, price, id
+        """
+    )
+    refreshed = 0
+    batch: list[tuple] = []
+    for name_lower, group in itertools.groupby(cursor, key=lambda row: row[0]):
+        batch.append(_name_stats_row(name_lower, [row[1:] for row in group]))
+        if len(batch) >= 1000:
+            conn.executemany(_INSERT_NAME_STATS_SQL, batch)
+            refreshed += len(batch)
+            batch.clear()
+    if batch:
+        conn.executemany(_INSERT_NAME_STATS_SQL, batch)
+        refreshed += len(batch)
+    return refreshed
+
+
+@beartype
+def stats_dict(row: sqlite3.Row) -> dict:
+    """API shape of a row selected with STATS_COLUMNS."""
+    stats = dict(row)
+    stats["float_buckets"] = json.loads(stats["float_buckets"])
+    return stats
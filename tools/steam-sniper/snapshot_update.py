@@ -0,0 +1,152 @@
+"""Listing rows for the item-detail snapshot and incremental updates of it.
+
+Export items are normalized into a listings row plus listing_attachments
+rows. Each listings row ends with row_hash, a fingerprint of everything
+else, so an incremental run rewrites only the listings whose hash changed
+and deletes the ids that vanished from the export.
+"""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+from collections.abc import Iterable
+
+from beartype import beartype
+
+INSERT_LISTING_SQL = """
+    INSERT INTO listings(
+        id, name_lower, name, price, float_value, paint_index, paint_seed,
+        name_tag, unlock_at, item_link, has_stickers, has_keychains, sticker_count, row_hash
+    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+"""
+
+INSERT_ATTACHMENT_SQL = """
+    INSERT INTO listing_attachments(listing_id, position, kind, name, image, wear, slot)
+    VALUES (?,?,?,?,?,?,?)
+"""
+
+_UPSERT_LISTING_SQL = INSERT_LISTING_SQL.replace("INSERT INTO", "INSERT OR REPLACE INTO", 1)
+
+
+def _coerce_num(value):
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return value
+    return int(number) if number.is_integer() else number
+
+
+def _attachment_kind(image: str) -> str:
+    return "keychain" if "/econ/keychains/" in image else "sticker"
+
+
+def _row_hash(row: tuple, attachments: list[tuple]) -> int:
+    digest = hashlib.blake2b(repr((row, attachments)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+@beartype
+def listing_rows(item: dict) -> tuple[tuple, list[tuple]]:
+    """Return (listings row, listing_attachments rows) for one export item."""
+    listing_id = int(_coerce_num(item["id"]))
+    attachments: list[tuple] = []
+    has_stickers = has_keychains = False
+    sticker_count = 0
+    for position, sticker in enumerate(item.get("stickers") or []):
+        image = str(sticker.get("image") or "")
+        kind = _attachment_kind(image)
+        sticker_count += kind == "sticker"
+        has_stickers = has_stickers or "/econ/stickers/" in image
+        has_keychains = has_keychains or "/econ/keychains/" in image
+        attachments.append(
+            (
+                listing_id,
+                position,
+                kind,
+                sticker.get("name"),
+                sticker.get("image"),
+                _coerce_num(sticker.get("wear")),
+                _coerce_num(sticker.get("slot")),
+            )
+        )
+    row = (
+        listing_id,
+        item["name"].lower(),
+        item["name"],
+        float(item["price"]),
+        _coerce_num(item.get("item_float")),
+        _coerce_num(item.get("item_paint_index")),
+        _coerce_num(item.get("item_paint_seed")),
+        item.get("name_tag"),
+        item.get("unlock_at"),
+        item.get("item_link"),
+        int(has_stickers),
+        int(has_keychains),
+        sticker_count,
+    )
+    return (*row, _row_hash(row, attachments)), attachments
+
+
+def _apply_batch(
+    conn: sqlite3.Connection,
+    batch: list[tuple[tuple, list[tuple]]],
+    counters: dict[str, list[int]],
+) -> None:
+    """Upsert the listings of one batch whose row_hash differs from the stored one."""
+    ids = [row[0] for row, _ in batch]
+    existing = dict(
+        conn.execute(
+            f"SELECT id, row_hash FROM listings WHERE id IN ({','.join('?' * len(ids))})",
+            ids,
+        )
+    )
+    conn.executemany("INSERT OR IGNORE INTO seen(id) VALUES (?)", [(i,) for i in ids])
+    changed = [(row, attachments) for row, attachments in batch if existing.get(row[0]) != row[-1]]
+    if not changed:
+        return
+    for row, _ in changed:
+        counters.setdefault(row[1], [0, 0, 0])[0 if row[0] not in existing else 1] += 1
+    conn.executemany(
+        "DELETE FROM listing_attachments WHERE listing_id=?",
+        [(row[0],) for row, _ in changed if row[0] in existing],
+    )
+    conn.executemany(_UPSERT_LISTING_SQL, [row for row, _ in changed])
+    conn.executemany(INSERT_ATTACHMENT_SQL, [a for _, attachments in changed for a in attachments])
+
+
+@beartype
+def apply_export(conn: sqlite3.Connection, items: Iterable[dict], batch_size: int) -> tuple[int, dict[str, list[int]]]:
+    """Apply export items to an open snapshot without committing.
+
+    Unchanged listings (same row_hash) are not rewritten, vanished ids are
+    deleted and name_changes is replaced with this run's per-name counters.
+    Returns (listings in the export, {name_lower: [added, updated, removed]}).
+    """
+    counters: dict[str, list[int]] = {}
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen (id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.seen")
+    batch: list[tuple[tuple, list[tuple]]] = []
+    for item in items:
+        batch.append(listing_rows(item))
+        if len(batch) >= batch_size:
+            _apply_batch(conn, batch, counters)
+            batch.clear()
+    if batch:
+        _apply_batch(conn, batch, counters)
+
+    vanished = "SELECT id FROM listings WHERE id NOT IN (SELECT id FROM temp.seen)"
+    for name_lower, count in conn.execute(
+        f"SELECT name_lower, COUNT(*) FROM listings WHERE id IN ({vanished}) GROUP BY name_lower"
+    ).fetchall():
+        counters.setdefault(name_lower, [0, 0, 0])[2] += count
+    conn.execute(f"DELETE FROM listing_attachments WHERE listing_id IN ({vanished})")
+    conn.execute("DELETE FROM listings WHERE id NOT IN (SELECT id FROM temp.seen)")
+
+    conn.execute("DELETE FROM name_changes")
+    conn.executemany(
+        "INSERT INTO name_changes(name_lower, added, updated, removed) VALUES (?,?,?,?)",
+        [(name_lower, *counts) for name_lower, counts in counters.items()],
+    )
+    return conn.execute("SELECT COUNT(*) FROM temp.seen").fetchone()[0], counters
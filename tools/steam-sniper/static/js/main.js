@@ -31,10 +31,32 @@ async function init() {
   // Initialize router (after data loaded, so panels have content)
   initRouter();
 
-  // Auto-refresh every 5 minutes
-  setInterval(() => {
-    Promise.all([loadStats(), loadWatchlist(), loadAlerts(), loadUserLists()]);
-  }, 300000);
+  // Live updates: the server pushes a delta after every collection
+  // (/api/events); fall back to polling every 5 minutes without SSE.
+  const refreshAll = () => Promise.all([loadStats(), loadWatchlist(), loadAlerts(), loadUserLists()]);
+  if (window.EventSource) {
+    const source = new EventSource('/api/events');
+    let generation = null;
+    source.addEventListener('hello', (e) => {
+      // Reconnected after a restart or a missed push: catch up once.
+      const hello = JSON.parse(e.data);
+      if (generation !== null && hello.generation !== generation) refreshAll();
+      generation = hello.generation;
+    });
+    source.addEventListener('update', (e) => {
+      const delta = JSON.parse(e.data);
+      generation = delta.generation;
+      const jobs = [loadStats()];
+      if (delta.prices.length || delta.removed.length || delta.usd_rub !== undefined) {
+        jobs.push(loadWatchlist(), loadUserLists());
+      }
+      if (delta.alerts.length) jobs.push(loadAlerts());
+      Promise.all(jobs);
+    });
+    source.addEventListener('list_alerts', () => loadUserLists());
+  } else {
+    setInterval(refreshAll, 300000);
+  }
 
   // Cross-module event wiring
   events.on('watchlist:changed', async () => {
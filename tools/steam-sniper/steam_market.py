@@ -0,0 +1,189 @@
+"""Cached Russian search over the Steam Market (RU localized name → hash_name).
+
+Steam returns ~10 results per page, so one query used to mean up to ten
+sequential HTTPS round-trips. Here the first page tells us total_count and
+the rest are fetched concurrently. Every response is persisted (db
+``steam_names`` / ``steam_queries``), and lookups go through three layers
+before touching the network:
+
+1. in-process LRU of recent queries (QUERY_TTL);
+2. the stored result list for the same normalized query;
+3. a broader stored query that was fetched completely, filtered locally —
+   e.g. "калашников редлайн" is answered from a complete "калашников".
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+from beartype import beartype
+
+logger = logging.getLogger("sniper.steam_market")
+
+SEARCH_URL = (
+    "https://steamcommunity.com/market/search/render/"
+    "?query={q}&appid=730&norender=1&count=50&l=russian"
+)
+IMAGE_URL = "https://community.fastly.steamstatic.com/economy/image/"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+    "Accept": "application/json",
+}
+PAGE_SIZE = 10  # Steam returns ~10 per page despite count=50
+MAX_RESULTS = 100
+PAGE_WORKERS = 4  # Steam rate-limits aggressively; keep the fan-out small
+PAGE_TIMEOUT = 8
+QUERY_TTL = 24 * 60 * 60  # localized names are stable; listings come from lis-skins
+LRU_SIZE = 256
+
+_lru: OrderedDict[str, list[dict]] = OrderedDict()
+_lru_expires: dict[str, float] = {}
+_lru_lock = threading.Lock()
+
+
+def normalize_query(q: str) -> str:
+    return db.normalize_ru_name(q)
+
+
+def _lru_get(key: str, now: float) -> list[dict] | None:
+    with _lru_lock:
+        results = _lru.get(key)
+        if results is None:
+            return None
+        if _lru_expires[key] < now:
+            del _lru[key], _lru_expires[key]
+            return None
+        _lru.move_to_end(key)
+        return results
+
+
+def _lru_put(key: str, results: list[dict], now: float) -> None:
+    with _lru_lock:
+        _lru[key] = results
+        _lru_expires[key] = now + QUERY_TTL
+        _lru.move_to_end(key)
+        while len(_lru) > LRU_SIZE:
+            old, _ = _lru.popitem(last=False)
+            del _lru_expires[old]
+
+
+def clear_cache() -> None:
+    """Drop the in-process LRU (the SQLite map is kept)."""
+    with _lru_lock:
+        _lru.clear()
+        _lru_expires.clear()
+
+
+def _fetch_page(q: str, start: int) -> dict:
+    url = SEARCH_URL.format(q=urllib.parse.quote(q)) + f"&start={start}"
+    req = urllib.request.Request(url, headers=HEADERS)
+    with urllib.request.urlopen(req, timeout=PAGE_TIMEOUT) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def _parse_results(data: dict) -> list[dict]:
+    results: list[dict] = []
+    for r in data.get("results", []):
+        ad = r.get("asset_description", {})
+        icon = ad.get("icon_url", "")
+        results.append({
+            "hash_name": r.get("hash_name", ""),
+            "name_ru": r.get("name", ""),
+            "type_ru": ad.get("type", ""),
+            "image": f"{IMAGE_URL}{icon}/128fx128f" if icon else "",
+            "name_color": ad.get("name_color", ""),
+        })
+    return results
+
+
+def _fetch_page_safe(q: str, start: int) -> dict | None:
+    try:
+        page = _fetch_page(q, start)
+    except (OSError, ValueError) as e:  # URLError/HTTPError/timeouts, bad JSON
+        logger.warning("Steam search page %d failed: %s", start, e)
+        return None
+    if not isinstance(page, dict):  # Steam answers a bare "null" when throttling
+        logger.warning("Steam search page %d returned %r", start, page)
+        return None
+    return page
+
+
+def _fetch_all(q: str) -> tuple[list[dict], bool]:
+    """Fetch every result page for q. Returns (results, complete)."""
+    first = _fetch_page_safe(q, 0)
+    if first is None:
+        return [], False
+    pages = [first]
+    total = int(first.get("total_count") or 0)
+    starts = range(PAGE_SIZE, min(total, MAX_RESULTS), PAGE_SIZE) if first.get("results") else ()
+    if starts:
+        with ThreadPoolExecutor(max_workers=min(PAGE_WORKERS, len(starts))) as pool:
+            pages.extend(pool.map(lambda start: _fetch_page_safe(q, start), starts))
+
+    results: list[dict] = []
+    seen: set[str] = set()
+    for page in pages:
+        for item in _parse_results(page or {}):
+            if item["hash_name"] not in seen:
+                seen.add(item["hash_name"])
+                results.append(item)
+    complete = None not in pages and total <= MAX_RESULTS
+    return results, complete
+
+
+def _from_broader_query(key: str) -> list[dict] | None:
+    """Answer key from a completely fetched query every match of key must also match."""
+    words = key.split()
+    best: str | None = None
+    for query in db.get_complete_steam_queries(QUERY_TTL):
+        if query == key or len(query) >= len(key):
+            continue
+        if all(any(part in word for word in words) for part in query.split()) and (
+            best is None or len(query) > len(best)
+        ):
+            best = query
+    if best is None:
+        return None
+    stored = db.get_steam_search(best, QUERY_TTL) or []
+    matches = [
+        item for item in stored
+        if all(word in db.normalize_ru_name(item["name_ru"]) for word in words)
+    ]
+    # The substring filter only approximates Steam's matching; an empty
+    # answer is more likely a miss than a fact, so let the caller fetch.
+    return matches or None
+
+
+@beartype
+def search(q: str) -> list[dict]:
+    """Return Steam Market results for q ({hash_name, name_ru, type_ru, image, name_color})."""
+    key = normalize_query(q)
+    if not key:
+        return []
+    now = time.time()
+    results = _lru_get(key, now)
+    if results is None:
+        results = db.get_steam_search(key, QUERY_TTL)
+        if results is None:
+            results = _from_broader_query(key)
+        if results is None:
+            results, complete = _fetch_all(q.strip())
+            if not results and not complete:
+                return []  # network failure: don't cache, retry next time
+            db.save_steam_search(key, results, complete)
+            db.prune_steam_queries(QUERY_TTL)
+        _lru_put(key, results, now)
+    return list(results)
+
+
+@beartype
+def lookup_localized(name_ru: str) -> list[dict]:
+    """Items whose stored RU name equals name_ru exactly — no network."""
+    return db.get_steam_names_by_ru(name_ru)
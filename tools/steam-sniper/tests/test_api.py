@@ -78,6 +78,33 @@ def test_get_price_history_timeframe(tmp_db: Path) -> None:
     assert len(result_all) == 2
 
 
+def test_get_price_trend_points_matches_history(tmp_db: Path) -> None:
+    """Bulk trend points pick the same mid/latest rows as per-name history."""
+    import db
+
+    db.init_db()
+    conn = sqlite3.connect(str(tmp_db))
+    for days_ago, price in ((20, 10.0), (12, 11.0), (6, 12.0), (1, 15.0), (40, 99.0)):
+        conn.execute(
+            "INSERT INTO price_history(name_lower, price_usd, ts) "
+            "VALUES (?, ?, datetime('now', ?))",
+            ("case a", price, f"-{days_ago} days"),
+        )
+    conn.execute(
+        "INSERT INTO price_history(name_lower, price_usd, ts) VALUES (?, ?, datetime('now'))",
+        ("lonely item", 3.0),
+    )
+    conn.commit()
+    conn.close()
+
+    points = db.get_price_trend_points(30)
+    history = db.get_price_history("case a", "30d")
+    assert points == {
+        "case a": (history[len(history) // 2]["price_usd"], history[-1]["price_usd"]),
+    }
+    assert points["case a"] == (12.0, 15.0)
+
+
 def test_get_portfolio_stats(tmp_db: Path) -> None:
     """Insert 2 items, pass prices dict, verify totals."""
     import db
@@ -233,6 +260,10 @@ def client(tmp_db: Path):
     }
     server._usd_rub = 83.0
     server._last_update = "2026-04-12T18:00:00"
+    server._trend_cache = None
+    import response_cache
+
+    response_cache.clear()
 
     # Disable lifespan (no real collector)
     async def noop(*_args, **_kwargs):
@@ -386,6 +417,190 @@ def test_catalog_supports_model_filter(client) -> None:
     assert filtered["items"][0]["name"] == "Glock-18 | Vogue (Field-Tested)"
 
 
+def test_catalog_index_sorts_and_filters_state(client) -> None:
+    """GET /api/catalog should serve presorted buckets per category/state."""
+    import server
+
+    server._prices["stattrak\u2122 awp | asiimov (field-tested)"] = {
+        "name": "StatTrak\u2122 AWP | Asiimov (Field-Tested)",
+        "price": 60.0,
+        "url": "",
+        "count": 0,
+    }
+
+    resp = client.get("/api/catalog?category=rifle&sort=price_desc")
+    data = resp.json()
+    prices = [item["price_usd"] for item in data["items"]]
+    assert prices == sorted(prices, reverse=True)
+    assert data["total"] == 6
+    assert data["categories"]["rifle"] == 6
+
+    resp2 = client.get("/api/catalog?category=rifle&state=stattrak")
+    stattrak = resp2.json()
+    assert stattrak["total"] == 1
+    assert stattrak["items"][0]["available"] is False
+
+    resp3 = client.get("/api/catalog?category=rifle&state=normal&sort=count_desc&limit=2&offset=1")
+    page = resp3.json()
+    assert page["total"] == 5
+    assert [item["count"] for item in page["items"]] == [17, 12]
+
+
+def test_catalog_index_rebuilds_when_prices_swapped(client) -> None:
+    """Replacing _prices wholesale must invalidate the catalog index."""
+    import server
+
+    assert client.get("/api/catalog").json()["total"] == 8
+    server._prices = {
+        "kilowatt case": {
+            "name": "Kilowatt Case",
+            "price": 0.8,
+            "url": "",
+            "count": 3,
+        },
+    }
+    data = client.get("/api/catalog").json()
+    assert data["total"] == 1
+    assert data["items"][0]["price_usd"] == 0.8
+
+
+def test_wear_family_index_keeps_stattrak_separate() -> None:
+    import server
+
+    index = server._build_catalog_index({
+        "ak-47 | redline (field-tested)": {"name": "AK-47 | Redline (Field-Tested)", "price": 9.0, "count": 1},
+        "ak-47 | redline (minimal wear)": {"name": "AK-47 | Redline (Minimal Wear)", "price": 14.0, "count": 1},
+        "stattrak™ ak-47 | redline (field-tested)": {
+            "name": "StatTrak™ AK-47 | Redline (Field-Tested)", "price": 20.0, "count": 1,
+        },
+        "kilowatt case": {"name": "Kilowatt Case", "price": 0.8, "count": 3},
+    })
+    families = index["families"]
+    assert families[server._base_item_key("AK-47 | Redline (Well-Worn)")] == {
+        "FT": "ak-47 | redline (field-tested)",
+        "MW": "ak-47 | redline (minimal wear)",
+    }
+    assert families[server._base_item_key("StatTrak™ AK-47 | Redline (Field-Tested)")] == {
+        "FT": "stattrak™ ak-47 | redline (field-tested)",
+    }
+    assert len(families) == 2
+
+
+def test_image_and_rarity_resolved_once_per_index(client, monkeypatch) -> None:
+    import server
+
+    calls: list[str] = []
+    resolve = server._resolve_item_image
+    monkeypatch.setattr(server, "_resolve_item_image", lambda name: calls.append(name) or resolve(name))
+
+    server._get_catalog_index()
+    built = len(calls)
+    assert built == len(server._prices)
+    assert server._get_item_image("AWP | Asiimov (Field-Tested)") == "https://images.example/asiimov.png"
+    assert server._get_rarity_meta("AWP | Asiimov (Field-Tested)")["label"] == "Тайное"
+    client.get("/api/catalog")
+    assert len(calls) == built
+
+    server._image_cache = {"awp | asiimov": "https://images.example/asiimov-v2.png"}
+    assert server._get_item_image("AWP | Asiimov (Field-Tested)") == "https://images.example/asiimov-v2.png"
+    assert len(calls) == 2 * built
+
+
+def test_read_endpoints_revalidate_with_etag_and_gzip(client) -> None:
+    resp = client.get("/api/catalog?limit=200")
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.json()["total"] == 8
+    etag = resp.headers["etag"]
+
+    again = client.get("/api/catalog?limit=200", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    watchlist = client.get("/api/watchlist")
+    assert watchlist.json()["buy"] == []
+    stale = client.get("/api/watchlist", headers={"If-None-Match": watchlist.headers["etag"]})
+    assert stale.status_code == 304
+
+    client.post("/api/watchlist", json={"name": "Kilowatt Case", "type": "buy", "target_rub": 50.0})
+    fresh = client.get("/api/watchlist", headers={"If-None-Match": watchlist.headers["etag"]})
+    assert fresh.status_code == 200
+    assert [item["name"] for item in fresh.json()["buy"]] == ["Kilowatt Case"]
+
+
+def test_push_delta_and_slow_subscribers(client, monkeypatch) -> None:
+    import db
+    import price_feed
+    import push_events
+    import server
+
+    monkeypatch.setattr(push_events, "_subscribers", set())
+    monkeypatch.setattr(push_events, "_last_alert_id", None)
+    client.post("/api/watchlist", json={"name": "Kilowatt Case", "type": "buy", "target_rub": 60.0})
+    db.add_list_item("user-1", "Glock-18 | Vogue (Field-Tested)", "favorite")
+    assert push_events.new_alerts() == []  # first call only baselines
+    db.log_alert("Kilowatt Case", "buy", 0.78, 60.0, "hit")
+
+    changes = price_feed.empty_changes()
+    changes["updated"] = [
+        "kilowatt case",
+        "glock-18 | vogue (field-tested)",
+        "awp | asiimov (field-tested)",  # not tracked by anyone
+    ]
+    changes["removed"] = ["tec-9 | remote control (field-tested)"]
+    delta = server._push_delta(changes, previous_rate=80.0)
+    assert [item["name"] for item in delta["prices"]] == [
+        "Kilowatt Case",
+        "Glock-18 | Vogue (Field-Tested)",
+    ]
+    assert delta["removed"] == []
+    assert [alert["message"] for alert in delta["alerts"]] == ["hit"]
+    assert delta["usd_rub"] == round(server._lis_rate(), 2)
+    assert server._push_delta(price_feed.empty_changes(), server._usd_rub)["alerts"] == []
+
+    queue = asyncio.Queue(maxsize=1)
+    push_events._subscribers.add(queue)
+    push_events.publish("update", delta)
+    assert queue.get_nowait().startswith("event: update\ndata: {")
+    push_events.publish("update", delta)
+    push_events.publish("update", delta)  # queue full: the stream is ended
+    assert queue.get_nowait() is None
+    assert queue not in push_events._subscribers
+
+
+def test_exit_signal_ends_event_streams(monkeypatch) -> None:
+    import push_events
+
+    async def scenario() -> object:
+        monkeypatch.setattr(push_events, "_event_loop", asyncio.get_running_loop())
+        queue = push_events.subscribe()
+        push_events.close_subscribers_on_exit()
+        return await asyncio.wait_for(queue.get(), 1)
+
+    monkeypatch.setattr(push_events, "_subscribers", set())
+    assert asyncio.run(scenario()) is None
+    assert push_events._subscribers == set()
+
+
+def test_event_stream_sends_hello_events_and_unsubscribes(monkeypatch) -> None:
+    import push_events
+
+    async def scenario() -> list[str]:
+        stream = push_events.stream(push_events.subscribe(), {"generation": 1})
+        chunks = [await anext(stream)]
+        push_events.publish("update", {"generation": 2})
+        chunks.append(await anext(stream))
+        push_events.close_subscribers()
+        return chunks + [chunk async for chunk in stream]
+
+    monkeypatch.setattr(push_events, "_subscribers", set())
+    assert asyncio.run(scenario()) == [
+        'retry: 5000\nevent: hello\ndata: {"generation": 1}\n\n',
+        'event: update\ndata: {"generation":2}\n\n',
+    ]
+    assert push_events._subscribers == set()
+
+
 def test_history_empty(client) -> None:
     """GET /api/history/someitem returns empty points list."""
     resp = client.get("/api/history/nonexistent?tf=7d")
@@ -395,6 +610,53 @@ def test_history_empty(client) -> None:
     assert data["tf"] == "7d"
 
 
+def test_item_stats_and_underpriced_from_snapshot(client, monkeypatch, tmp_path) -> None:
+    """Snapshot aggregates are exposed per item and as a catalog-wide deal list."""
+    import json
+
+    import listings_snapshot
+    import server
+
+    items = [
+        {"id": i, "name": "AWP | Asiimov (Field-Tested)", "price": price, "item_float": 0.2 + i / 100}
+        for i, price in enumerate([14.0, 25.0, 25.5, 26.0, 27.0, 40.0], start=1)
+    ]
+    items[1]["stickers"] = [{"name": "Crown", "image": "https://x/econ/stickers/crown.png"}]
+    export = tmp_path / "export.json"
+    export.write_text(json.dumps({"items": items}), encoding="utf-8")
+    path = tmp_path / "listings_snapshot.db"
+    listings_snapshot.build_snapshot(path, source_url=export.as_uri(), conditional=False)
+    monkeypatch.setattr(server, "snapshot_get_item_stats", lambda name: listings_snapshot.get_item_stats(name, path))
+    monkeypatch.setattr(
+        server,
+        "snapshot_get_underpriced",
+        lambda limit, **kwargs: listings_snapshot.get_underpriced_listings(limit, path=path, **kwargs),
+    )
+
+    resp = client.get("/api/item/awp%20%7C%20asiimov%20%28field-tested%29/stats")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["name"] == "AWP | Asiimov (Field-Tested)"
+    stats = data["stats"]
+    assert stats["listings"] == 6
+    assert stats["min_price"] == 14.0
+    assert stats["median_price"] == 25.75
+    assert stats["median_price_rub"] == round(25.75 * server._lis_rate(), 2)
+    assert sum(stats["float_buckets"]) == 6
+    assert stats["sticker_listings"] == 1
+    assert stats["sticker_premium_pct"] == round((25.0 / 26.0 - 1) * 100, 1)
+
+    resp = client.get("/api/underpriced?min_discount=50")
+    assert resp.json()["items"] == []
+    resp = client.get("/api/underpriced?min_discount=40")
+    [deal] = resp.json()["items"]
+    assert deal["listing_id"] == 1
+    assert deal["discount_pct"] == round((25.75 - 14.0) / 25.75 * 100, 1)
+    assert deal["float"] == pytest.approx(0.21)
+
+    assert client.get("/api/item/unknown/stats").json()["stats"] is None
+
+
 def test_item_detail_uses_streamed_listing_data(client, monkeypatch) -> None:
     """GET /api/item should format snapshot listing data into UI payload."""
     import server
@@ -438,6 +700,23 @@ def test_item_detail_uses_streamed_listing_data(client, monkeypatch) -> None:
     assert data["listings"][0]["item_link"] == "steam://inspect/123"
 
 
+def test_watchlist_trend_served_from_bulk_cache(client) -> None:
+    """Trends come from one bulk query, refreshed once the cache expires."""
+    import db
+    import server
+
+    client.post("/api/watchlist", json={"name": "Kilowatt Case", "type": "buy", "target_rub": 60.0})
+    assert client.get("/api/watchlist").json()["buy"][0]["trend"]["direction"] == "flat"
+
+    db.insert_price_snapshots([("kilowatt case", 1.0), ("kilowatt case", 1.0), ("kilowatt case", 1.5)])
+    # Still served from the cache until the collector refreshes it
+    assert client.get("/api/watchlist").json()["buy"][0]["trend"]["direction"] == "flat"
+
+    server._refresh_trends()
+    trend = client.get("/api/watchlist").json()["buy"][0]["trend"]
+    assert trend == {"direction": "up", "pct": 50.0}
+
+
 def test_stats_empty(client) -> None:
     """GET /api/stats with empty watchlist returns zeros."""
     resp = client.get("/api/stats")
@@ -808,6 +1087,7 @@ def test_get_list_repairs_mojibake_name(client, monkeypatch, tmp_db: Path) -> No
 def test_check_list_alerts_respects_cooldown(tmp_db: Path, monkeypatch: pytest.MonkeyPatch) -> None:
     """Server-side list alerts should send once and then respect cooldown."""
     import db
+    import list_alerts
     import server
 
     db.init_db()
@@ -831,11 +1111,100 @@ def test_check_list_alerts_respects_cooldown(tmp_db: Path, monkeypatch: pytest.M
 
     monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "token")
     monkeypatch.setenv("LESHA_TG_CHAT_ID", "461494896")
-    monkeypatch.setattr(server, "_send_telegram_message", fake_send)
+    monkeypatch.setattr(list_alerts, "send_telegram_message", fake_send)
 
-    asyncio.run(server._check_list_alerts())
+    asyncio.run(list_alerts.check_list_alerts(server._lis_rate(), server._find_price_item))
     assert len(sent_messages) == 1
     assert "Kilowatt Case" in sent_messages[0]
 
-    asyncio.run(server._check_list_alerts())
+    asyncio.run(list_alerts.check_list_alerts(server._lis_rate(), server._find_price_item))
     assert len(sent_messages) == 1
+
+
+def test_check_list_alerts_batches_sends_and_state(tmp_db: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """All due alerts go out in one message; cooldowns set/cleared in one pass."""
+    import db
+    import list_alerts
+    import server
+
+    db.init_db()
+    server._prices = {
+        "kilowatt case": {"name": "Kilowatt Case", "price": 0.78, "url": "u1", "count": 1500},
+        "awp | asiimov (field-tested)": {
+            "name": "AWP | Asiimov (Field-Tested)", "price": 25.5, "url": "u2", "count": 42,
+        },
+    }
+    server._usd_rub = 83.0
+    for user in ("lesha", "nick"):
+        db.add_list_item(user, "Kilowatt Case", "favorite")
+        db.set_list_item_targets(user, "Kilowatt Case", "favorite", 100.0, None)
+    db.add_list_item("lesha", "AWP | Asiimov (Field-Tested)", "wishlist")
+    db.set_list_item_targets("lesha", "AWP | Asiimov (Field-Tested)", "wishlist", None, 10.0)
+    db.add_list_item("nick", "AWP | Asiimov (Field-Tested)", "favorite")
+    db.set_list_item_targets("nick", "AWP | Asiimov (Field-Tested)", "favorite", 100.0, None)
+    left_zone_id = int(db.get_list_items("nick", "favorite")[0]["id"])
+    db.mark_list_item_notified(left_zone_id, "below", "2020-01-01T00:00:00+03:00")
+
+    sent_messages: list[str] = []
+
+    async def fake_send(text: str, chat_ids=None):
+        sent_messages.append(text)
+        return 1
+
+    monkeypatch.setattr(list_alerts, "send_telegram_message", fake_send)
+    asyncio.run(list_alerts.check_list_alerts(server._lis_rate(), server._find_price_item))
+
+    assert len(sent_messages) == 1
+    assert sent_messages[0].count("Kilowatt Case") == 2
+    assert "AWP | Asiimov" in sent_messages[0]
+    kilowatt = [row for row in db.get_all_list_items_with_targets() if row["item_name"] == "Kilowatt Case"]
+    assert all(row["last_notified_below_at"] for row in kilowatt)
+    left_zone = next(row for row in db.get_list_items("nick", "favorite") if row["id"] == left_zone_id)
+    assert left_zone["last_notified_below_at"] is None
+
+
+def test_collect_once_persists_on_db_writer_thread(tmp_db: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """The loop only swaps the catalog; every SQLite write runs on the writer thread."""
+    import threading
+
+    import db
+    import db_writer
+    import price_cache
+    import price_feed
+    import push_events
+    import server
+
+    db.init_db()
+    db.upsert_item("Kilowatt Case", "buy", 60.0, 0.7, "2026-04-12T18:00:00")
+    prices = {"kilowatt case": {"name": "Kilowatt Case", "price": 0.78, "url": "", "count": 1500}}
+    changes = price_feed.empty_changes()
+    changes["added"] = ["kilowatt case"]
+    for attr in (
+        "_prices", "_catalog_index", "_category_counts", "_last_changes",
+        "_usd_rub", "_last_update", "_generation", "_trend_cache",
+    ):
+        monkeypatch.setattr(server, attr, getattr(server, attr))
+    monkeypatch.setattr(push_events, "_last_alert_id", push_events._last_alert_id)
+    monkeypatch.setattr(server, "_prices", {})
+    monkeypatch.setattr(server, "_fetch_lis_skins", lambda previous: (prices, changes))
+    monkeypatch.setattr(server, "_fetch_usd_rub", lambda: 80.0)
+
+    writer_threads: list[str] = []
+    insert = db.insert_price_snapshots
+    monkeypatch.setattr(
+        db,
+        "insert_price_snapshots",
+        lambda snapshots: writer_threads.append(threading.current_thread().name) or insert(snapshots),
+    )
+
+    try:
+        asyncio.run(server._collect_once(send_list_alerts=False))
+    finally:
+        db_writer.shutdown()
+        price_cache.reset()
+
+    assert server._prices is prices
+    assert server._usd_rub == 80.0
+    assert writer_threads and writer_threads[0].startswith("sniper-db-writer")
+    assert db.get_cached_rate("USD") == 80.0
+    assert db.load_price_catalog()[1] == [("Kilowatt Case", 0.78, "", 1500)]
@@ -108,11 +108,11 @@ def test_migration(tmp_db: Path, tmp_path: Path) -> None:
     conn.close()
 
     # AK-47: target=15.0 (< 100) -> 15.0 * 85.0 = 1275.0 RUB
-    ak_row = [r for r in rows if r["name_lower"] == "ak-47 | redline"][0]
+    ak_row = next(r for r in rows if r["name_lower"] == "ak-47 | redline")
     assert ak_row["target_rub"] == 15.0 * 85.0
 
     # XM1014: target=1500.0 (> 100) -> stored as-is (already RUB)
-    xm_row = [r for r in rows if r["name_lower"] == "xm1014 | tranquility"][0]
+    xm_row = next(r for r in rows if r["name_lower"] == "xm1014 | tranquility")
     assert xm_row["target_rub"] == 1500.0
 
     # Idempotency: running again should NOT duplicate rows
@@ -336,3 +336,148 @@ def test_get_list_items_all(tmp_db: Path) -> None:
 
     all_items = db.get_list_items("lesha")
     assert len(all_items) == 3
+
+
+def test_connections_pooled_per_thread(tmp_db: Path) -> None:
+    """Connections are reused within a thread and separate across threads."""
+    import threading
+
+    import db
+
+    db.init_db()
+    with db.get_conn() as first, db.get_conn() as nested:
+        assert first is nested
+    with db.get_read_conn() as reader:
+        assert reader is not first
+
+    other: list[object] = []
+    thread = threading.Thread(target=lambda: other.append(db._thread_conn(readonly=False)))
+    thread.start()
+    thread.join()
+    assert other[0] is not first
+
+
+def test_exited_threads_release_their_connections(tmp_db: Path) -> None:
+    """Short-lived worker threads do not leave connections in the pool."""
+    import sqlite3
+    import threading
+
+    import db
+    import pytest
+
+    db.init_db()
+    baseline = len(db._pool)
+    opened: list[object] = []
+
+    def work() -> None:
+        with db.get_read_conn() as conn:
+            conn.execute("SELECT 1").fetchone()
+            opened.append(conn)
+
+    for _ in range(50):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+    assert len(opened) == 50
+    assert len(db._pool) == baseline
+    with pytest.raises(sqlite3.ProgrammingError):
+        opened[0].execute("SELECT 1")
+
+
+def test_read_conn_is_query_only(tmp_db: Path) -> None:
+    """The read pool rejects writes, but sees rows committed by the writer."""
+    import sqlite3
+
+    import db
+    import pytest
+
+    db.init_db()
+    db.save_rate("USD", 90.0)
+    assert db.get_cached_rate("USD") == 90.0
+    with db.get_read_conn() as conn, pytest.raises(sqlite3.OperationalError):
+        conn.execute("DELETE FROM exchange_rates")
+    db.save_rate("USD", 91.0)
+    assert db.get_cached_rate("USD") == 91.0
+
+
+def test_close_all_connections_resets_thread_cache(tmp_db: Path) -> None:
+    """After close_all_connections() the next call opens a fresh connection."""
+    import db
+
+    db.init_db()
+    with db.get_conn() as before:
+        pass
+    db.close_all_connections()
+    with db.get_conn() as after:
+        assert after is not before
+    assert db.get_watchlist() == {"buy": [], "sell": []}
+
+
+def test_price_snapshots_roll_up_into_ohlc(tmp_db: Path) -> None:
+    """insert_price_snapshots keeps hourly/daily OHLC in step with raw rows."""
+    import db
+
+    db.init_db()
+    db.insert_price_snapshots([("item a", 10.0)])
+    db.insert_price_snapshots([("item a", 14.0)])
+    db.insert_price_snapshots([("item a", 8.0)])
+    db.insert_price_snapshots([("item a", 11.0)])
+
+    for tf in ("7d", "all"):
+        points = db.get_chart_history("item a", tf)
+        assert len(points) == 1
+        point = points[0]
+        assert (point["open"], point["high"], point["low"], point["price_usd"]) == (10.0, 14.0, 8.0, 11.0)
+    assert len(db.get_chart_history("item a", "24h")) == 4
+
+
+def test_init_backfills_rollups_from_raw_history(tmp_db: Path) -> None:
+    """Existing raw rows are folded into rollups the first time init_db runs."""
+    import sqlite3
+
+    import db
+
+    db.init_db()
+    conn = sqlite3.connect(str(tmp_db))
+    conn.execute("DROP TABLE price_history_daily")
+    conn.executemany(
+        "INSERT INTO price_history(name_lower, price_usd, ts) VALUES (?, ?, ?)",
+        [
+            ("item a", 5.0, "2026-03-01 10:00:00"),
+            ("item a", 7.0, "2026-03-01 18:00:00"),
+            ("item a", 6.0, "2026-03-02 09:00:00"),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    db.init_db()
+    points = db.get_chart_history("item a", "all")
+    assert [(p["ts"], p["open"], p["price_usd"]) for p in points] == [
+        ("2026-03-01 00:00:00", 5.0, 7.0),
+        ("2026-03-02 00:00:00", 6.0, 6.0),
+    ]
+
+
+def test_pruning_keeps_daily_rollups(tmp_db: Path, monkeypatch) -> None:
+    """Raw pruning runs in batches and never touches the daily tier."""
+    import sqlite3
+
+    import db
+
+    monkeypatch.setattr(db, "PRUNE_BATCH_SIZE", 2)
+    db.init_db()
+    conn = sqlite3.connect(str(tmp_db))
+    conn.executemany(
+        "INSERT INTO price_history(name_lower, price_usd, ts) VALUES (?, ?, datetime('now', '-60 days'))",
+        [("old item", float(i)) for i in range(5)],
+    )
+    conn.execute(
+        "INSERT INTO price_history_daily(name_lower, bucket, open, high, low, close) "
+        "VALUES ('old item', date('now', '-60 days') || ' 00:00:00', 1, 1, 1, 1)"
+    )
+    conn.commit()
+    conn.close()
+
+    assert db.prune_old_history() == 5
+    assert len(db.get_chart_history("old item", "all")) == 1
@@ -0,0 +1,65 @@
+"""Tests for conditional, compressed export downloads."""
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import urllib.error
+from email.message import Message
+from pathlib import Path
+
+import http_cache
+import pytest
+
+
+class _FakeResponse(io.BytesIO):
+    def __init__(self, body: bytes, headers: dict[str, str]) -> None:
+        super().__init__(body)
+        self.status = 200
+        self.headers = Message()
+        for key, value in headers.items():
+            self.headers[key] = value
+
+
+def test_fetch_to_file_decompresses_and_revalidates(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    body_path = tmp_path / "export.json"
+    payload = json.dumps([{"name": "Kilowatt Case", "price": 0.78}]).encode("utf-8")
+    seen_headers: list[dict[str, str]] = []
+
+    def fake_urlopen(req, timeout):
+        seen_headers.append(dict(req.header_items()))
+        if len(seen_headers) == 1:
+            return _FakeResponse(gzip.compress(payload), {
+                "Content-Encoding": "gzip",
+                "ETag": '"v1"',
+                "Last-Modified": "Sat, 18 Apr 2026 10:00:00 GMT",
+            })
+        raise urllib.error.HTTPError(req.full_url, 304, "Not Modified", Message(), None)
+
+    monkeypatch.setattr(http_cache.urllib.request, "urlopen", fake_urlopen)
+
+    assert http_cache.fetch_to_file("https://example/export.json", body_path) is True
+    assert body_path.read_bytes() == payload
+    assert "gzip" in seen_headers[0]["Accept-encoding"]
+    assert "If-none-match" not in seen_headers[0]
+
+    assert http_cache.fetch_to_file("https://example/export.json", body_path) is False
+    assert seen_headers[1]["If-none-match"] == '"v1"'
+    assert seen_headers[1]["If-modified-since"] == "Sat, 18 Apr 2026 10:00:00 GMT"
+    assert body_path.read_bytes() == payload
+
+
+def test_fetch_to_file_ignores_validators_without_body(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    body_path = tmp_path / "export.json"
+    http_cache.meta_path(body_path).write_text(json.dumps({"etag": '"stale"'}), encoding="utf-8")
+    seen_headers: list[dict[str, str]] = []
+
+    def fake_urlopen(req, timeout):
+        seen_headers.append(dict(req.header_items()))
+        return _FakeResponse(b"[]", {})
+
+    monkeypatch.setattr(http_cache.urllib.request, "urlopen", fake_urlopen)
+
+    assert http_cache.fetch_to_file("https://example/export.json", body_path) is True
+    assert "If-none-match" not in seen_headers[0]
+    assert body_path.read_bytes() == b"[]"
@@ -101,3 +101,149 @@ def test_get_item_listings_supports_filters(tmp_path: Path) -> None:
 
     assert total == 1
     assert len(listings) == 1
+
+
+def test_build_snapshot_skips_when_export_unchanged(tmp_path: Path, monkeypatch) -> None:
+    import listings_snapshot
+
+    path = tmp_path / "listings_snapshot.db"
+    _seed_snapshot(path)
+    (tmp_path / listings_snapshot.FULL_EXPORT_CACHE_NAME).write_text('{"items": []}', encoding="utf-8")
+    monkeypatch.setattr(listings_snapshot.http_cache, "fetch_to_file", lambda *_args, **_kwargs: False)
+
+    result = listings_snapshot.build_snapshot(path)
+
+    assert result["skipped"] is True
+    assert result["built_at"] == "2026-04-17T12:00:00"
+    _, total, _ = get_item_listings("AWP | Asiimov (Field-Tested)", limit=5, path=path)
+    assert total == 1
+
+
+def _write_export(path: Path, items: list[dict] | None = None) -> str:
+    import json
+
+    if items is not None:
+        path.write_text(json.dumps({"items": items}), encoding="utf-8")
+        return path.as_uri()
+    sticker = "https://cdn.steamstatic.com/apps/730/icons/econ/stickers/crown.png"
+    keychain = "https://cdn.steamstatic.com/apps/730/icons/econ/keychains/lil_monster.png"
+    items = [
+        {"id": 1, "name": "AWP | Asiimov (Field-Tested)", "price": 25.0, "item_float": 0.31,
+         "stickers": [{"name": "Crown", "image": sticker, "wear": 0.02, "slot": 0},
+                      {"name": "Lil' Monster", "image": keychain, "wear": 0, "slot": None}]},
+        {"id": 2, "name": "AWP | Asiimov (Field-Tested)", "price": 24.0, "item_float": 0.25,
+         "stickers": [{"name": "Crown", "image": sticker, "wear": 0, "slot": 1}]},
+        {"id": 3, "name": "AWP | Asiimov (Field-Tested)", "price": 23.0, "item_float": 0.2},
+        {"id": 4, "name": "Kilowatt Case", "price": 0.8},
+    ]
+    path.write_text(json.dumps({"items": items}), encoding="utf-8")
+    return path.as_uri()
+
+
+def test_build_snapshot_normalizes_attachments(tmp_path: Path) -> None:
+    import listings_snapshot
+
+    path = tmp_path / "listings_snapshot.db"
+    url = _write_export(tmp_path / "export.json")
+    result = listings_snapshot.build_snapshot(path, source_url=url, conditional=False)
+    assert result["rows"] == 4
+
+    name = "AWP | Asiimov (Field-Tested)"
+    listings, total, _ = get_item_listings(name, limit=20, path=path)
+    assert total == 3
+    assert [lst["id"] for lst in listings] == [3, 2, 1]
+    assert listings[0]["stickers"] == [] and listings[0]["keychains"] == []
+    assert listings[2]["stickers"] == [
+        {"name": "Crown", "image": listings[2]["stickers"][0]["image"], "wear": 0.02, "slot": 0}
+    ]
+    assert listings[2]["keychains"][0]["name"] == "Lil' Monster"
+    assert listings[2]["keychains"][0]["wear"] == 0 and listings[2]["keychains"][0]["slot"] is None
+
+    _, total, _ = get_item_listings(name, limit=20, has_stickers="yes", path=path)
+    assert total == 2
+    listings, total, _ = get_item_listings(name, limit=20, has_stickers="yes", has_keychains="no", path=path)
+    assert total == 1 and listings[0]["id"] == 2
+    _, total, _ = get_item_listings(name, limit=20, has_stickers="no", path=path)
+    assert total == 1
+
+    conn = sqlite3.connect(path)
+    plan = " ".join(
+        row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM listings"
+            " WHERE name_lower = ? AND has_stickers = 1 AND has_keychains = 0",
+            (name.lower(),),
+        )
+    )
+    conn.close()
+    assert "COVERING INDEX idx_listings_name_flags" in plan
+
+
+def test_build_snapshot_updates_incrementally(tmp_path: Path) -> None:
+    import json
+
+    import listings_snapshot
+
+    path = tmp_path / "listings_snapshot.db"
+    export = tmp_path / "export.json"
+    url = _write_export(export)
+    assert listings_snapshot.build_snapshot(path, source_url=url, conditional=False)["mode"] == "full"
+
+    items = json.loads(export.read_text(encoding="utf-8"))["items"]
+    items[0]["stickers"] = []  # id 1 loses its attachments
+    items = [item for item in items if item["id"] != 3]
+    items.append({"id": 5, "name": "Kilowatt Case", "price": 0.75})
+    result = listings_snapshot.build_snapshot(
+        path, source_url=_write_export(export, items), conditional=False
+    )
+
+    assert result["mode"] == "incremental"
+    assert (result["rows"], result["added"], result["updated"], result["removed"]) == (4, 1, 1, 1)
+    assert listings_snapshot.get_name_changes(path) == {
+        "awp | asiimov (field-tested)": {"added": 0, "updated": 1, "removed": 1},
+        "kilowatt case": {"added": 1, "updated": 0, "removed": 0},
+    }
+    listings, total, _ = get_item_listings("AWP | Asiimov (Field-Tested)", limit=20, path=path)
+    assert total == 2
+    assert [(lst["id"], lst["stickers"]) for lst in listings][-1] == (1, [])
+    _, total, _ = get_item_listings("AWP | Asiimov (Field-Tested)", limit=20, has_stickers="yes", path=path)
+    assert total == 1
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM listing_attachments").fetchone()[0] == 1
+    conn.close()
+    stats = listings_snapshot.get_item_stats("AWP | Asiimov (Field-Tested)", path)
+    assert (stats["listings"], stats["min_price"], stats["median_price"]) == (2, 24.0, 24.5)
+    assert listings_snapshot.get_item_stats("kilowatt case", path)["listings"] == 2
+
+    result = listings_snapshot.build_snapshot(path, source_url=url, conditional=False, incremental=False)
+    assert result["mode"] == "full" and result["rows"] == 4
+
+
+def test_snapshot_update_does_not_block_readers(tmp_path: Path) -> None:
+    import listings_snapshot
+
+    path = tmp_path / "listings_snapshot.db"
+    url = _write_export(tmp_path / "export.json")
+    listings_snapshot.build_snapshot(path, source_url=url, conditional=False)
+
+    writer = sqlite3.connect(path)
+    assert writer.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("DELETE FROM listings")
+    try:
+        _, total, _ = get_item_listings("AWP | Asiimov (Field-Tested)", limit=20, path=path)
+        assert total == 3
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+def test_build_snapshot_rebuilds_legacy_schema(tmp_path: Path) -> None:
+    import listings_snapshot
+
+    path = tmp_path / "listings_snapshot.db"
+    _seed_snapshot(path)
+    url = _write_export(tmp_path / "export.json")
+    result = listings_snapshot.build_snapshot(path, source_url=url, conditional=False)
+    assert result["mode"] == "full"
+    listings, total, _ = get_item_listings("AWP | Asiimov (Field-Tested)", limit=20, path=path)
+    assert total == 3 and 7 not in {lst["id"] for lst in listings}
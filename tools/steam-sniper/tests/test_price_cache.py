@@ -0,0 +1,92 @@
+"""Tests for the shared price catalog between dashboard and bot."""
+from __future__ import annotations
+
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import db
+import price_cache
+import price_feed
+import pytest
+
+
+@pytest.fixture
+def shared(tmp_db: Path) -> Iterator[None]:
+    db.init_db()
+    price_cache.reset()
+    yield
+    price_cache.reset()
+
+
+def _no_fetch(_previous):
+    raise AssertionError("reader must not fetch while a producer is publishing")
+
+
+def test_reader_follows_published_versions(shared: None) -> None:
+    prices, changes = price_feed.ingest([
+        {"name": "Kilowatt Case", "price": 0.78, "url": "u1", "count": 1500},
+        {"name": "AWP | Asiimov (Field-Tested)", "price": 25.5, "url": "u2", "count": 42},
+    ])
+    assert price_cache.publish(prices, changes) == 1
+
+    price_cache.reset()  # the bot is another process
+    catalog = price_cache.read(_no_fetch)
+    assert dict(catalog) == dict(prices)
+    assert price_cache.read(_no_fetch) is catalog
+
+    # Producer (another process again) applies a diff; unchanged exports keep the version.
+    price_cache._published = True
+    updated, changes = price_feed.ingest(
+        [{"name": "Kilowatt Case", "price": 0.8, "url": "u1", "count": 1400}], prices
+    )
+    assert price_cache.publish(updated, changes) == 2
+    assert price_cache.publish(updated, price_feed.empty_changes()) == 2
+
+    price_cache._loaded = (1, catalog)
+    reloaded = price_cache.read(_no_fetch)
+    assert dict(reloaded) == {"kilowatt case": updated["kilowatt case"]}
+
+
+def test_reader_fetches_itself_when_producer_is_stale(shared: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    fetched: list[object] = []
+
+    def fetch(previous):
+        fetched.append(previous)
+        return price_feed.ingest([{"name": "Kilowatt Case", "price": 0.78, "count": 1}], previous)
+
+    prices = price_cache.read(fetch)
+    assert fetched == [None] and "kilowatt case" in prices
+    assert db.get_price_catalog_state()[0] == 1
+
+    assert price_cache.read(fetch) is prices  # fresh again: no second fetch
+    later = time.time() + price_cache.STALE_AFTER + 1
+    monkeypatch.setattr(price_cache.time, "time", lambda: later)
+    price_cache.read(fetch)
+    assert len(fetched) == 2 and fetched[1] is prices
+
+
+def test_failed_publish_falls_back_to_full_replace(shared: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    prices, changes = price_feed.ingest([{"name": "Kilowatt Case", "price": 0.78, "url": "u1", "count": 1}])
+    price_cache.publish(prices, changes)
+    prices, changes = price_feed.ingest(
+        [
+            {"name": "Kilowatt Case", "price": 0.78, "url": "u1", "count": 1},
+            {"name": "Revolution Case", "price": 0.5, "url": "u2", "count": 1},
+        ],
+        prices,
+    )
+    real_publish = db.publish_price_catalog
+
+    def broken(*_args, **_kwargs) -> int:
+        raise OSError("disk full")
+
+    monkeypatch.setattr(db, "publish_price_catalog", broken)
+    with pytest.raises(OSError):
+        price_cache.publish(prices, changes)
+    monkeypatch.setattr(db, "publish_price_catalog", real_publish)
+
+    # The lost delta (Revolution Case) is recovered by a full replace on the next run.
+    price_cache.publish(prices, {"added": [], "updated": [], "removed": []})
+    price_cache.reset()
+    assert set(price_cache.read(_no_fetch)) == {"kilowatt case", "revolution case"}
@@ -0,0 +1,80 @@
+"""Tests for streaming lis-skins ingest and change sets."""
+from __future__ import annotations
+
+import io
+import json
+
+import price_feed
+from price_catalog import PriceCatalog
+
+
+def _stream(items: list[dict]) -> io.BytesIO:
+    return io.BytesIO(json.dumps(items).encode("utf-8"))
+
+
+def test_ingest_streams_items_into_price_map() -> None:
+    raw = [
+        {"name": "Kilowatt Case", "price": 0.78, "url": "u1", "count": 1500},
+        {"name": "AWP | Asiimov (Field-Tested)", "price": 25.5, "url": "u2", "count": 42},
+        {"name": "", "price": 1.0},
+    ]
+    prices, changes = price_feed.ingest(price_feed.iter_items(_stream(raw)))
+
+    assert set(prices) == {"kilowatt case", "awp | asiimov (field-tested)"}
+    assert prices["kilowatt case"]["price"] == 0.78
+    assert sorted(changes["added"]) == sorted(prices)
+    assert changes["removed"] == []
+
+
+def test_ingest_diffs_against_previous_snapshot() -> None:
+    previous, _ = price_feed.ingest([
+        {"name": "A", "price": 1.0, "url": "", "count": 1},
+        {"name": "B", "price": 2.0, "url": "", "count": 2},
+        {"name": "C", "price": 3.0, "url": "", "count": 3},
+    ])
+    prices, changes = price_feed.ingest(
+        [
+            {"name": "A", "price": 1.0, "url": "", "count": 1},
+            {"name": "B", "price": 2.5, "url": "", "count": 5},
+            {"name": "D", "price": 4.0, "url": "", "count": 1},
+        ],
+        previous,
+    )
+
+    assert isinstance(prices, PriceCatalog)
+    assert prices["a"] == previous["a"]
+    assert changes["added"] == ["d"]
+    assert changes["removed"] == ["c"]
+    assert changes["updated"] == ["b"]
+    assert changes["price"] == {"b": (2.0, 2.5)}
+    assert changes["count"] == {"b": (2, 5)}
+
+
+def test_ingest_returns_previous_when_unchanged() -> None:
+    previous, _ = price_feed.ingest([{"name": "A", "price": 1.0, "count": 1}])
+    prices, changes = price_feed.ingest([{"name": "A", "price": 1.0, "count": 1}], previous)
+
+    assert prices is previous
+    assert not price_feed.has_changes(changes)
+
+
+def test_price_catalog_reads_like_a_dict() -> None:
+    catalog = PriceCatalog([
+        {"name": "Kilowatt Case", "price": 0.78, "url": "https://lis-skins.com/market/csgo/kilowatt-case/", "count": 1500},
+        {"name": "AWP | Asiimov (Field-Tested)", "price": 25.5, "url": "https://other.example/asiimov"},
+        {"name": "Kilowatt Case", "price": 0.8, "url": "https://lis-skins.com/market/csgo/kilowatt-case/", "count": 1400},
+    ])
+
+    assert len(catalog) == 2
+    assert list(catalog) == ["kilowatt case", "awp | asiimov (field-tested)"]
+    assert catalog["kilowatt case"] == {
+        "name": "Kilowatt Case",
+        "price": 0.8,
+        "url": "https://lis-skins.com/market/csgo/kilowatt-case/",
+        "count": 1400,
+    }
+    assert catalog.get("awp | asiimov (field-tested)")["url"] == "https://other.example/asiimov"
+    assert catalog.get("awp | asiimov (field-tested)")["count"] == 0
+    assert "missing" not in catalog and catalog.get("missing") is None
+    assert catalog.price("kilowatt case") == 0.8
+    assert dict(catalog) == {key: catalog[key] for key in catalog}
@@ -0,0 +1,37 @@
+"""Tests for the n-gram catalog search index."""
+from __future__ import annotations
+
+import search_index
+
+PRICES = {
+    "ak-47 | redline (field-tested)": {"name": "AK-47 | Redline (Field-Tested)", "price": 12.0},
+    "ak-47 | redline (minimal wear)": {"name": "AK-47 | Redline (Minimal Wear)", "price": 30.0},
+    "awp | asiimov (field-tested)": {"name": "AWP | Asiimov (Field-Tested)", "price": 25.5},
+    "kilowatt case": {"name": "Kilowatt Case", "price": 0.78},
+    "sticker | crown (foil)": {"name": "Sticker | Crown (Foil)", "price": 900.0},
+}
+
+
+def _naive(query: str) -> list[str]:
+    words = query.lower().split()
+    matches = [item for name, item in PRICES.items() if all(w in name for w in words)]
+    return [item["name"] for item in sorted(matches, key=lambda x: x["price"])]
+
+
+def test_search_matches_linear_scan() -> None:
+    index = search_index.build_index(PRICES)
+    for query in ("redline", "ak red", "-47", "field", "a", "ak", "case", "nothing here", "ed (f"):
+        assert [item["name"] for item in search_index.search(index, query)] == _naive(query)
+
+
+def test_search_ranks_by_price_and_limits() -> None:
+    index = search_index.build_index(PRICES)
+    results = search_index.search(index, "e", limit=2)
+    assert [item["price"] for item in results] == [0.78, 12.0]
+
+
+def test_search_keys_and_empty_inputs() -> None:
+    index = search_index.build_index(PRICES)
+    assert search_index.search_keys(index, "asiimov") == ["awp | asiimov (field-tested)"]
+    assert search_index.search(index, "   ") == []
+    assert search_index.search({}, "awp") == []
@@ -0,0 +1,30 @@
+"""Tests for the per-name snapshot aggregates."""
+from __future__ import annotations
+
+import sqlite3
+
+import listings_snapshot
+import snapshot_stats
+import snapshot_update
+
+
+def test_refresh_name_stats_aggregates_prices_floats_and_stickers() -> None:
+    sticker = {"name": "Crown", "image": "https://cdn/econ/stickers/crown.png"}
+    items = [
+        {"id": i, "name": "Kilowatt Case", "price": price, "item_float": flt, "stickers": [sticker] if i > 3 else []}
+        for i, (price, flt) in enumerate([(1.0, 0.0), (2.0, 0.5), (3.0, 1.0), (4.0, None), (6.0, None)], start=1)
+    ]
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.executescript(listings_snapshot._SCHEMA_SQL)
+    snapshot_update.apply_export(conn, items, batch_size=100)
+
+    assert snapshot_stats.refresh_name_stats(conn, changed_only=False) == 1
+    stats = snapshot_stats.stats_dict(
+        conn.execute(f"SELECT {snapshot_stats.STATS_COLUMNS} FROM name_stats s").fetchone()
+    )
+    assert (stats["listings"], stats["min_price"], stats["median_price"], stats["cheapest_id"]) == (5, 1.0, 3.0, 1)
+    assert stats["discount_pct"] == 66.7
+    assert (stats["float_min"], stats["float_max"]) == (0.0, 1.0)
+    assert sum(stats["float_buckets"]) == 3 and stats["float_buckets"][0] == 1 and stats["float_buckets"][-1] == 1
+    assert (stats["sticker_listings"], stats["sticker_median_price"], stats["sticker_premium_pct"]) == (2, 5.0, 150.0)
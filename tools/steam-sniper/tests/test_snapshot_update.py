@@ -0,0 +1,45 @@
+"""Tests for snapshot listing rows and the incremental apply."""
+from __future__ import annotations
+
+import sqlite3
+
+import listings_snapshot
+import snapshot_update
+
+STICKER = "https://cdn.steamstatic.com/apps/730/icons/econ/stickers/crown.png"
+KEYCHAIN = "https://cdn.steamstatic.com/apps/730/icons/econ/keychains/lil_monster.png"
+
+
+def _item(listing_id: int, price: float, stickers: list[dict] | None = None) -> dict:
+    return {"id": listing_id, "name": "AWP | Asiimov (Field-Tested)", "price": price, "stickers": stickers}
+
+
+def test_listing_rows_normalizes_attachments() -> None:
+    row, attachments = snapshot_update.listing_rows(
+        _item(7, 25.0, [{"name": "Crown", "image": STICKER, "wear": "0.0", "slot": 1},
+                        {"name": "Monster", "image": KEYCHAIN, "wear": 0.5}])
+    )
+    assert row[:4] == (7, "awp | asiimov (field-tested)", "AWP | Asiimov (Field-Tested)", 25.0)
+    assert row[10:13] == (1, 1, 1)  # has_stickers, has_keychains, sticker_count
+    assert [a[2:] for a in attachments] == [
+        ("sticker", "Crown", STICKER, 0, 1),
+        ("keychain", "Monster", KEYCHAIN, 0.5, None),
+    ]
+    assert snapshot_update.listing_rows(_item(7, 25.0))[0][-1] != row[-1]
+    assert snapshot_update.listing_rows(_item(7, 25.0))[0][-1] == snapshot_update.listing_rows(_item(7, 25.0))[0][-1]
+
+
+def test_apply_export_counts_changes_per_name() -> None:
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(listings_snapshot._SCHEMA_SQL)
+    assert snapshot_update.apply_export(conn, [_item(1, 10.0), _item(2, 11.0)], batch_size=1) == (
+        2, {"awp | asiimov (field-tested)": [2, 0, 0]},
+    )
+
+    total, counters = snapshot_update.apply_export(
+        conn, [_item(1, 10.0), _item(3, 12.0, [{"name": "Crown", "image": STICKER}])], batch_size=10
+    )
+    assert (total, counters) == (2, {"awp | asiimov (field-tested)": [1, 0, 1]})
+    assert [row[0] for row in conn.execute("SELECT id FROM listings ORDER BY id")] == [1, 3]
+    assert conn.execute("SELECT listing_id, kind FROM listing_attachments").fetchall() == [(3, "sticker")]
+    assert conn.execute("SELECT added, updated, removed FROM name_changes").fetchall() == [(1, 0, 1)]
@@ -0,0 +1,104 @@
+"""Tests for the cached Steam Market RU search."""
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+
+import db
+import pytest
+import steam_market
+
+
+def _page(names: list[tuple[str, str]], total: int) -> dict:
+    return {
+        "total_count": total,
+        "results": [
+            {"hash_name": en, "name": ru, "asset_description": {"type": "Винтовка", "icon_url": "x"}}
+            for en, ru in names
+        ],
+    }
+
+
+@pytest.fixture
+def steam(tmp_db: Path, monkeypatch: pytest.MonkeyPatch) -> list[tuple[str, int]]:
+    """Fake Steam with 25 rifles; returns the list of (query, start) requests made."""
+    db.init_db()
+    steam_market.clear_cache()
+    catalog = [(f"AK-47 | Skin {i}", f"AK-47 | Скин {i}") for i in range(24)]
+    catalog.append(("AK-47 | Redline (Field-Tested)", "AK-47 | Красная линия (После полевых)"))
+    calls: list[tuple[str, int]] = []
+    lock = threading.Lock()
+
+    def fake_fetch_page(q: str, start: int) -> dict:
+        with lock:
+            calls.append((q, start))
+        words = q.lower().split()
+        matches = [pair for pair in catalog if all(w in pair[1].lower() for w in words)]
+        return _page(matches[start : start + steam_market.PAGE_SIZE], len(matches))
+
+    monkeypatch.setattr(steam_market, "_fetch_page", fake_fetch_page)
+    yield calls
+    steam_market.clear_cache()
+
+
+def test_search_fetches_all_pages_and_persists(steam: list[tuple[str, int]]) -> None:
+    results = steam_market.search("AK-47")
+    assert len(results) == 25
+    assert sorted(start for _, start in steam) == [0, 10, 20]
+    assert results[0]["image"].startswith(steam_market.IMAGE_URL)
+
+    # Repeat query: served from the LRU, then from SQLite after the LRU is dropped.
+    assert steam_market.search("  ak-47 ") == results
+    steam_market.clear_cache()
+    assert [r["hash_name"] for r in steam_market.search("AK-47")] == [r["hash_name"] for r in results]
+    assert len(steam) == 3
+
+
+def test_narrower_query_is_answered_from_complete_broader_one(steam: list[tuple[str, int]]) -> None:
+    steam_market.search("AK-47")
+    steam.clear()
+    results = steam_market.search("ak-47 красная")
+    assert [r["hash_name"] for r in results] == ["AK-47 | Redline (Field-Tested)"]
+    assert steam == []
+
+    # No local match under the broader query: ask Steam instead of caching [].
+    assert steam_market.search("ak-47 вулкан") == []
+    assert steam == [("ak-47 вулкан", 0)]
+
+
+def test_stale_steam_queries_are_pruned(steam: list[tuple[str, int]], monkeypatch: pytest.MonkeyPatch) -> None:
+    steam_market.search("AK-47")
+    later = steam_market.time.time() + steam_market.QUERY_TTL + 1
+    monkeypatch.setattr(db.time, "time", lambda: later)
+    steam_market.clear_cache()
+    steam_market.search("красная")
+    with db.get_read_conn() as conn:
+        queries = [row[0] for row in conn.execute("SELECT query FROM steam_queries")]
+    assert queries == ["красная"]
+
+
+def test_localized_lookup_and_failed_fetch(steam: list[tuple[str, int]], monkeypatch: pytest.MonkeyPatch) -> None:
+    steam_market.search("красная линия")
+    found = steam_market.lookup_localized("ak-47 |  КРАСНАЯ линия (после полевых)")
+    assert [r["hash_name"] for r in found] == ["AK-47 | Redline (Field-Tested)"]
+
+    def broken(q: str, start: int) -> dict:
+        raise OSError("steam down")
+
+    monkeypatch.setattr(steam_market, "_fetch_page", broken)
+    assert steam_market.search("нож") == []
+    assert db.get_steam_search("нож", steam_market.QUERY_TTL) is None
+
+
+def test_throttled_page_is_a_miss_but_bugs_propagate(
+    steam: list[tuple[str, int]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(steam_market, "_fetch_page", lambda q, start: None)
+    assert steam_market.search("нож") == []
+
+    def buggy(q: str, start: int) -> dict:
+        raise KeyError("total_count")
+
+    monkeypatch.setattr(steam_market, "_fetch_page", buggy)
+    with pytest.raises(KeyError):
+        steam_market.search("пистолет")
@@ -0,0 +1,159 @@
+"""Tests for the shared Telegram outbound queue."""
+from __future__ import annotations
+
+import asyncio
+import urllib.parse
+
+import httpx
+import pytest
+import tg_outbox
+
+
+@pytest.fixture
+def outbox(monkeypatch: pytest.MonkeyPatch) -> tuple[list[dict], list[httpx.Response]]:
+    """Route the outbox through a mock transport.
+
+    Returns (posted payloads, queued replies); once replies run out every
+    request is answered with ok=true.
+    """
+    posted: list[dict] = []
+    replies: list[httpx.Response] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        posted.append(dict(urllib.parse.parse_qsl(request.content.decode())))
+        if replies:
+            return replies.pop(0)
+        return httpx.Response(200, json={"ok": True})
+
+    monkeypatch.setattr(tg_outbox, "_transport", httpx.MockTransport(handler))
+    monkeypatch.setattr(tg_outbox, "CHAT_INTERVAL", 0.0)
+    monkeypatch.setattr(tg_outbox, "_loop", None)
+    return posted, replies
+
+
+def test_group_messages_respects_telegram_limit() -> None:
+    groups = tg_outbox.group_messages(["a" * 10, "b" * 10, "c" * 10], limit=22)
+    assert groups == [[0, 1], [2]]
+
+
+def test_burst_is_coalesced_per_chat(outbox: tuple[list[dict], list[httpx.Response]]) -> None:
+    posted, _replies = outbox
+
+    async def scenario() -> list[int]:
+        try:
+            return await asyncio.gather(
+                tg_outbox.send("tok", ["1", "2"], "first"),
+                tg_outbox.send("tok", ["1"], "second"),
+            )
+        finally:
+            await tg_outbox.close()
+
+    assert asyncio.run(scenario()) == [2, 1]
+    by_chat = {payload["chat_id"]: payload["text"] for payload in posted}
+    assert len(posted) == 2
+    assert by_chat == {"1": "first\n\nsecond", "2": "first"}
+
+
+def test_retry_after_is_honoured(outbox: tuple[list[dict], list[httpx.Response]]) -> None:
+    posted, replies = outbox
+    replies.append(
+        httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0}})
+    )
+
+    async def scenario() -> int:
+        try:
+            return await tg_outbox.send("tok", ["1"], "alert")
+        finally:
+            await tg_outbox.close()
+
+    assert asyncio.run(scenario()) == 1
+    assert [payload["text"] for payload in posted] == ["alert", "alert"]
+
+
+def test_rejected_send_reports_failure(outbox: tuple[list[dict], list[httpx.Response]]) -> None:
+    posted, replies = outbox
+    replies.append(
+        httpx.Response(400, json={"ok": False, "description": "chat not found"})
+    )
+
+    async def scenario() -> int:
+        try:
+            return await tg_outbox.send("tok", ["1"], "alert")
+        finally:
+            await tg_outbox.close()
+
+    assert asyncio.run(scenario()) == 0
+    assert len(posted) == 1
+
+
+def test_last_failed_attempt_skips_backoff(
+    outbox: tuple[list[dict], list[httpx.Response]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    posted, replies = outbox
+    replies.extend([httpx.Response(502), httpx.Response(502)])
+    monkeypatch.setattr(tg_outbox, "MAX_ATTEMPTS", 2)
+    real_sleep = asyncio.sleep
+    backoffs: list[float] = []
+
+    async def fake_sleep(delay: float) -> None:
+        if delay >= 1:
+            backoffs.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+
+    async def scenario() -> int:
+        try:
+            return await tg_outbox.send("tok", ["1"], "alert")
+        finally:
+            await tg_outbox.close()
+
+    assert asyncio.run(scenario()) == 0
+    assert len(posted) == 2
+    assert backoffs == [2]
+
+
+def test_malformed_replies_do_not_stall_the_worker(
+    outbox: tuple[list[dict], list[httpx.Response]],
+) -> None:
+    posted, replies = outbox
+    replies.extend([
+        httpx.Response(429, json={"ok": False, "parameters": {"retry_after": "soon"}}),
+        httpx.Response(200, json=["not", "a", "dict"]),
+    ])
+
+    async def scenario() -> list[int]:
+        try:
+            first = await tg_outbox.send("tok", ["1"], "alert")
+            return [first, await tg_outbox.send("tok", ["1"], "next")]
+        finally:
+            await tg_outbox.close()
+
+    assert asyncio.run(asyncio.wait_for(scenario(), timeout=5)) == [0, 1]
+    assert [payload["text"] for payload in posted] == ["alert", "alert", "next"]
+
+
+def test_crashed_delivery_fails_its_batch_and_keeps_worker(
+    outbox: tuple[list[dict], list[httpx.Response]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    posted, _replies = outbox
+    real_post = tg_outbox._post
+    calls: list[str] = []
+
+    async def flaky_post(key: tuple[str, str], text: str) -> bool:
+        calls.append(text)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return await real_post(key, text)
+
+    monkeypatch.setattr(tg_outbox, "_post", flaky_post)
+
+    async def scenario() -> list[int]:
+        try:
+            first = await tg_outbox.send("tok", ["1"], "alert")
+            return [first, await tg_outbox.send("tok", ["1"], "next")]
+        finally:
+            await tg_outbox.close()
+
+    assert asyncio.run(asyncio.wait_for(scenario(), timeout=5)) == [0, 1]
+    assert [payload["text"] for payload in posted] == ["next"]
@@ -0,0 +1,217 @@
+"""Shared async outbound queue for Telegram Bot API messages.
+
+Every sendMessage from the dashboard server and the bot goes through one
+queue and one pooled httpx client. A single worker drains bursts, coalesces
+texts queued for the same chat into as few messages as fit MESSAGE_LIMIT,
+spaces sends per chat and per bot to stay under Telegram's flood limits, and
+honours ``retry_after`` on 429 instead of failing the alert.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+
+import httpx
+from beartype import beartype
+
+logger = logging.getLogger("sniper.tg_outbox")
+
+API_URL = "https://api.telegram.org/bot{token}/sendMessage"
+MESSAGE_LIMIT = 4000  # Bot API hard limit is 4096 chars
+GLOBAL_PER_SECOND = 25  # Telegram allows ~30 msg/s per bot
+CHAT_INTERVAL = 1.0  # ~1 msg/s per chat
+COALESCE_WINDOW = 0.05  # after the first queued text, wait this long for the rest of a burst
+MAX_ATTEMPTS = 4
+REQUEST_TIMEOUT = 10.0
+
+# --- Module-level state (bound to the event loop that started the worker) ---
+
+_loop: asyncio.AbstractEventLoop | None = None
+_queue: asyncio.Queue | None = None
+_worker: asyncio.Task | None = None
+_client: httpx.AsyncClient | None = None
+_transport: httpx.AsyncBaseTransport | None = None  # tests swap in httpx.MockTransport
+_global_lock: asyncio.Lock | None = None
+_sent_at: deque[float] = deque()  # monotonic send times within the last second
+_chat_next_at: dict[tuple[str, str], float] = {}  # (token, chat_id) -> earliest next send
+_paused_until: float = 0.0  # set from retry_after on 429
+
+
+def group_messages(messages: list[str], limit: int = MESSAGE_LIMIT) -> list[list[int]]:
+    """Pack message indexes into groups whose joined text fits one Telegram message."""
+    groups: list[list[int]] = []
+    size = 0
+    for i, message in enumerate(messages):
+        extra = len(message) + (2 if groups and groups[-1] else 0)
+        if not groups or size + extra > limit:
+            groups.append([i])
+            size = len(message)
+        else:
+            groups[-1].append(i)
+            size += extra
+    return groups
+
+
+def _ensure_worker() -> None:
+    """Start (or restart on a new event loop) the queue worker and HTTP pool."""
+    global _loop, _queue, _worker, _client, _global_lock, _paused_until
+    loop = asyncio.get_running_loop()
+    if _loop is loop and _worker is not None and not _worker.done():
+        return
+    if _loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT,
+            transport=_transport,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+        )
+        _queue = asyncio.Queue()
+        _global_lock = asyncio.Lock()
+        _sent_at.clear()
+        _chat_next_at.clear()
+        _paused_until = 0.0
+        _loop = loop
+    _worker = loop.create_task(_run())
+
+
+@beartype
+async def send(token: str, chat_ids: list[str], text: str) -> int:
+    """Queue text for every chat and wait for delivery. Returns chats reached."""
+    if not token or not chat_ids:
+        return 0
+    _ensure_worker()
+    loop = asyncio.get_running_loop()
+    futures: list[asyncio.Future] = []
+    for chat_id in chat_ids:
+        future = loop.create_future()
+        _queue.put_nowait((token, str(chat_id), text, future))
+        futures.append(future)
+    return sum(await asyncio.gather(*futures))
+
+
+async def close() -> None:
+    """Stop the worker, fail anything still queued, release pooled connections."""
+    global _loop, _queue, _worker, _client, _global_lock
+    if _loop is not asyncio.get_running_loop():
+        _loop = _queue = _worker = _client = _global_lock = None
+        return
+    if _worker is not None:
+        _worker.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _worker
+    while _queue is not None and not _queue.empty():
+        future = _queue.get_nowait()[3]
+        if not future.done():
+            future.set_result(False)
+    if _client is not None:
+        await _client.aclose()
+    _loop = _queue = _worker = _client = _global_lock = None
+
+
+async def _run() -> None:
+    while True:
+        batch = [await _queue.get()]
+        await asyncio.sleep(COALESCE_WINDOW)
+        while not _queue.empty():
+            batch.append(_queue.get_nowait())
+
+        by_chat: dict[tuple[str, str], list[tuple[str, asyncio.Future]]] = {}
+        for token, chat_id, text, future in batch:
+            by_chat.setdefault((token, chat_id), []).append((text, future))
+        try:
+            results = await asyncio.gather(
+                *(_deliver(key, pending) for key, pending in by_chat.items()),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error("Telegram delivery crashed", exc_info=result)
+        finally:
+            # A crashed or cancelled delivery must not leave send() waiting forever.
+            for *_, future in batch:
+                if not future.done():
+                    future.set_result(False)
+
+
+async def _deliver(key: tuple[str, str], pending: list[tuple[str, asyncio.Future]]) -> None:
+    texts = [text for text, _ in pending]
+    for group in group_messages(texts):
+        try:
+            ok = await _post(key, "\n\n".join(texts[i] for i in group))
+        except httpx.HTTPError as e:
+            logger.warning("Telegram send failed for %s: %s", key[1], e)
+            ok = False
+        for i in group:
+            future = pending[i][1]
+            if not future.done():
+                future.set_result(ok)
+
+
+async def _wait_turn(key: tuple[str, str]) -> None:
+    """Sleep until both the per-chat and the per-bot rate limits allow a send."""
+    delay = _chat_next_at.get(key, 0.0) - time.monotonic()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    async with _global_lock:
+        while True:
+            now = time.monotonic()
+            while _sent_at and now - _sent_at[0] >= 1.0:
+                _sent_at.popleft()
+            wait = _paused_until - now
+            if len(_sent_at) >= GLOBAL_PER_SECOND:
+                wait = max(wait, _sent_at[0] + 1.0 - now)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        _sent_at.append(now)
+    _chat_next_at[key] = now + CHAT_INTERVAL
+
+
+def _retry_after(data: dict) -> float:
+    """Seconds from a 429 reply's parameters.retry_after; 1s if missing or malformed."""
+    parameters = data.get("parameters")
+    if not isinstance(parameters, dict):
+        return 1.0
+    try:
+        return max(0.0, float(parameters.get("retry_after", 1)))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+async def _post(key: tuple[str, str], text: str) -> bool:
+    global _paused_until
+    token, chat_id = key
+    payload = {"chat_id": chat_id, "text": text, "disable_web_page_preview": "true"}
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        await _wait_turn(key)
+        try:
+            resp = await _client.post(API_URL.format(token=token), data=payload)
+        except httpx.TransportError as e:
+            logger.warning("Telegram send to %s failed (attempt %d): %s", chat_id, attempt, e)
+            if attempt < MAX_ATTEMPTS:
+                await asyncio.sleep(min(2 ** attempt, 30))
+            continue
+        try:
+            data = resp.json()
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+
+        if resp.status_code == 429:
+            retry_after = _retry_after(data)
+            _paused_until = max(_paused_until, time.monotonic() + retry_after)
+            logger.warning("Telegram flood limit for %s, retrying in %.0fs", chat_id, retry_after)
+            continue
+        if resp.status_code >= 500:
+            if attempt < MAX_ATTEMPTS:
+                await asyncio.sleep(min(2 ** attempt, 30))
+            continue
+        if data.get("ok"):
+            return True
+        logger.warning("Telegram send failed for %s: %s", chat_id, data or resp.status_code)
+        return False
+    logger.warning("Telegram send to %s gave up after %d attempts", chat_id, MAX_ATTEMPTS)
+    return False
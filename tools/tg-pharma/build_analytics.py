@@ -276,6 +276,8 @@ DROP TABLE IF EXISTS meta;
 DROP TABLE IF EXISTS catalog_products;
 DROP TABLE IF EXISTS catalog_aliases;
 DROP TABLE IF EXISTS purchase_lines;
+DROP TABLE IF EXISTS catalog_products_fts;
+DROP TABLE IF EXISTS purchase_lines_fts;
 
 CREATE TABLE meta (
     key TEXT PRIMARY KEY,
@@ -331,11 +333,23 @@ CREATE INDEX idx_purchase_lines_search ON purchase_lines(search_text);
 CREATE INDEX idx_purchase_lines_date ON purchase_lines(nakl_date);
 CREATE INDEX idx_purchase_lines_key ON purchase_lines(product_key);
 CREATE INDEX idx_purchase_lines_ean ON purchase_lines(canonical_ean);
+
+CREATE VIRTUAL TABLE catalog_products_fts USING fts5(search_text, content='', tokenize='trigram');
+CREATE VIRTUAL TABLE purchase_lines_fts USING fts5(search_text, content='', tokenize='trigram');
 """
     )
     conn.commit()
 
 
+@beartype
+def populate_fts(conn: sqlite3.Connection) -> None:
+    """Fill the contentless trigram indexes, keyed by the base tables' rowids."""
+    conn.execute("INSERT INTO catalog_products_fts (rowid, search_text) SELECT rowid, search_text FROM catalog_products")
+    conn.execute("INSERT INTO purchase_lines_fts (rowid, search_text) SELECT id, search_text FROM purchase_lines")
+    conn.execute("INSERT INTO catalog_products_fts (catalog_products_fts) VALUES ('optimize')")
+    conn.execute("INSERT INTO purchase_lines_fts (purchase_lines_fts) VALUES ('optimize')")
+
+
 @beartype
 def build_analytics_db(sklit_root: Path, out_path: Path) -> dict[str, Any]:
     names_by_id, makers_by_ids = load_name_refs(sklit_root)
@@ -390,6 +404,7 @@ VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
 """,
             purchase_rows,
         )
+        populate_fts(conn)
         meta = {
             "sklit_root": str(sklit_root),
             "catalog_products": conn.execute("SELECT COUNT(*) FROM catalog_products").fetchone()[0],
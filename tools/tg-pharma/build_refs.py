@@ -150,6 +150,7 @@ DROP TABLE IF EXISTS product_names;
 DROP TABLE IF EXISTS product_makers;
 DROP TABLE IF EXISTS product_aliases;
 DROP TABLE IF EXISTS ean_history;
+DROP TABLE IF EXISTS product_aliases_fts;
 
 CREATE TABLE meta (
     key TEXT PRIMARY KEY,
@@ -194,6 +195,8 @@ CREATE INDEX idx_product_aliases_id_name ON product_aliases(id_name);
 CREATE INDEX idx_product_aliases_name_maker ON product_aliases(search_name, search_maker);
 CREATE INDEX idx_ean_history_ean ON ean_history(ean);
 CREATE INDEX idx_ean_history_id_tov ON ean_history(id_tov);
+
+CREATE VIRTUAL TABLE product_aliases_fts USING fts5(search_text, content='', tokenize='trigram');
 """
     )
 
@@ -251,6 +254,13 @@ INSERT INTO product_aliases (
             for row in alias_rows
         ],
     )
+    conn.execute(
+        """
+INSERT INTO product_aliases_fts (rowid, search_text)
+SELECT rowid, search_name || ' ' || search_maker FROM product_aliases
+""".strip()
+    )
+    conn.execute("INSERT INTO product_aliases_fts (product_aliases_fts) VALUES ('optimize')")
     if ean_history_rows:
         conn.executemany(
             "INSERT INTO ean_history (ean, id_tov, seen_date, source) VALUES (?, ?, ?, ?)",
@@ -258,7 +268,7 @@ INSERT INTO product_aliases (
         )
 
     meta = {
-        "schema_version": "1",
+        "schema_version": "2",
         "sklit_root": str(sklit_root),
         "names_count": str(len(names_by_id)),
         "makers_count": str(len(makers_by_ids)),
@@ -4,86 +4,24 @@ import base64
 import json
 import re
 import sqlite3
+import threading
+import time
+from collections.abc import Callable
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
+import history_worker
 import paramiko
 from beartype import beartype
+from query_text import (
+    build_query_variants,
+    build_variant_tokens,
+    normalize_search_text,
+)
 
 ALLOWED_PERIODS = {"last_month", "this_month", "last_90_days", "last_180_days", "all_time"}
-SOFT_QUERY_FILLERS = (
-    "давай",
-    "ещё",
-    "еще",
-    "разок",
-    "снова",
-    "слушай",
-    "возьми",
-    "потом",
-    "ка",
-    "тест",
-    "очередной",
-    "очередная",
-    "очередное",
-    "очередную",
-    "тоже",
-)
-SPECIAL_TOKEN_ALIASES: dict[str, tuple[str, ...]] = {
-    "македонский": ("македония",),
-    "македонского": ("македония",),
-    "македонскому": ("македония",),
-    "македонским": ("македония",),
-    "македонская": ("македония",),
-    "македонскую": ("македония",),
-    "венгерский": ("венгрия",),
-    "венгерского": ("венгрия",),
-    "венгерскому": ("венгрия",),
-    "хорватский": ("хорватия",),
-    "хорватского": ("хорватия",),
-    "хорватскому": ("хорватия",),
-    "активированный": ("актив",),
-    "активированного": ("актив",),
-    "активированному": ("актив",),
-    "активированным": ("актив",),
-    "активированная": ("актив",),
-    "активированную": ("актив",),
-    "угля": ("уголь",),
-    "азитромицинов": ("азитромицин",),
-    "азитромицинам": ("азитромицин",),
-    "азитромицинах": ("азитромицин",),
-}
-
-
-SPOKEN_NUMERIC_ALIASES: dict[str, tuple[str, ...]] = {
-    "пятисотый": ("500", "0.5"),
-    "пятисотого": ("500", "0.5"),
-    "пятисотому": ("500", "0.5"),
-    "пятисотым": ("500", "0.5"),
-    "пятисотая": ("500", "0.5"),
-    "пятисотую": ("500", "0.5"),
-    "пятисотые": ("500", "0.5"),
-    "пятисотых": ("500", "0.5"),
-    "пятисотыми": ("500", "0.5"),
-    "двухсотпятидесятый": ("250", "0.25"),
-    "двухсотпятидесятого": ("250", "0.25"),
-    "двухсотпятидесятому": ("250", "0.25"),
-    "двухсотпятидесятым": ("250", "0.25"),
-    "стопятидесятый": ("150", "0.15"),
-    "стопятидесятого": ("150", "0.15"),
-    "стодвадцатипятый": ("125", "0.125"),
-    "стодвадцатипятого": ("125", "0.125"),
-    "восьмисотсемьдесятпятый": ("875", "0.875"),
-    "восьмисотсемьдесятпятого": ("875", "0.875"),
-    "тысячный": ("1000", "1.0"),
-    "тысячного": ("1000", "1.0"),
-    "сотый": ("100",),
-    "сотого": ("100",),
-    "пятидесятый": ("50",),
-    "пятидесятого": ("50",),
-    "десятый": ("10",),
-    "десятого": ("10",),
-}
+FTS_MIN_TOKEN_CHARS = 3  # the FTS5 trigram tokenizer cannot match shorter terms
 
 
 @beartype
@@ -146,155 +84,6 @@ def normalize_period(period: str) -> str:
     return "last_month"
 
 
-@beartype
-def normalize_search_text(text: str) -> str:
-    lowered = text.casefold()
-    lowered = lowered.replace("ё", "е")
-    lowered = lowered.replace("№", " ")
-    lowered = lowered.replace(",", " ")
-    lowered = lowered.replace(".", " ")
-    lowered = lowered.replace("/", " ")
-    lowered = lowered.replace("\\", " ")
-    lowered = lowered.replace("-", " ")
-    lowered = re.sub(r"\s+", " ", lowered)
-    return lowered.strip()
-
-
-@beartype
-def build_query_variants(query: str) -> list[str]:
-    cleaned = " ".join(query.strip().split())
-    if not cleaned:
-        return []
-
-    variants: list[str] = [cleaned]
-
-    def push(value: str) -> None:
-        normalized = " ".join(value.strip().split())
-        if normalized and normalized not in variants:
-            variants.append(normalized)
-
-    def strip_soft_modifiers(value: str) -> str:
-        normalized = f" {value.strip()} "
-        normalized = re.sub(r"\bне\s+форте\b", " ", normalized, flags=re.IGNORECASE)
-        normalized = re.sub(r"\bименно\b", " ", normalized, flags=re.IGNORECASE)
-        normalized = re.sub(
-            r"\bобычн(?:ый|ого|ому|ым|ом|ая|ую|ой|ое|ые|ых|ыми)?\b",
-            " ",
-            normalized,
-            flags=re.IGNORECASE,
-        )
-        normalized = re.sub(r"\b(его|её|ее)\b", " ", normalized, flags=re.IGNORECASE)
-        normalized = re.sub(
-            rf"\b({'|'.join(re.escape(item) for item in SOFT_QUERY_FILLERS)})\b",
-            " ",
-            normalized,
-            flags=re.IGNORECASE,
-        )
-        normalized = re.sub(r"\s+", " ", normalized)
-        return normalized.strip()
-
-    def token_fallbacks(token: str) -> list[str]:
-        token = token.strip().strip(" ,.;:!?")
-        if len(token) < 4:
-            return []
-        options: set[str] = set(SPECIAL_TOKEN_ALIASES.get(token.lower(), ()))
-        options.update(SPOKEN_NUMERIC_ALIASES.get(token.lower(), ()))
-        endings = {
-            "ов": "",
-            "ев": "",
-            "ах": "",
-            "ях": "",
-            "ых": "ый",
-            "их": "ий",
-            "ого": "ый",
-            "ому": "ый",
-            "ыми": "ый",
-            "ими": "ий",
-            "а": "",
-            "я": "",
-            "у": "а",
-            "ю": "я",
-            "ы": "а",
-            "и": "а",
-            "ой": "а",
-            "ей": "я",
-        }
-        for old, new in endings.items():
-            if token.endswith(old) and len(token) - len(old) >= 3:
-                options.add(token[: -len(old)] + new)
-        return [item for item in options if item != token]
-
-    push(cleaned[:1].upper() + cleaned[1:])
-    stripped = strip_soft_modifiers(cleaned)
-    if stripped and stripped != cleaned:
-        push(stripped)
-        push(stripped[:1].upper() + stripped[1:])
-
-    base_tokens = cleaned.split()
-    for idx, token in enumerate(base_tokens):
-        for alt in token_fallbacks(token):
-            mutated = list(base_tokens)
-            mutated[idx] = alt
-            push(" ".join(mutated))
-
-    replacements = {
-        " 125 ": [" 0.125 ", " 0,125 "],
-        " 250 ": [" 0.25 ", " 0,25 "],
-        " 500 ": [" 0.5 ", " 0,5 "],
-        " 750 ": [" 0.75 ", " 0,75 "],
-        " 875 ": [" 0.875 ", " 0,875 "],
-        " 1000 ": [" 1.0 ", " 1,0 "],
-    }
-    padded = f" {cleaned} "
-    for needle, options in replacements.items():
-        if needle in padded:
-            for option in options:
-                push(padded.replace(needle, option).strip())
-
-    for variant in list(variants):
-        push(variant.replace(" 0.5", ",0.5"))
-        push(variant.replace(" 0,5", ",0.5"))
-        push(variant.replace(" 0.25", ",0.25"))
-        push(variant.replace(" 0,25", ",0.25"))
-
-    for variant in list(variants):
-        stripped_variant = strip_soft_modifiers(variant)
-        if stripped_variant and stripped_variant != variant:
-            push(stripped_variant)
-            push(stripped_variant[:1].upper() + stripped_variant[1:])
-
-    for variant in list(variants):
-        tokens = variant.split()
-        for idx, token in enumerate(tokens):
-            for alt in token_fallbacks(token):
-                mutated = list(tokens)
-                mutated[idx] = alt
-                push(" ".join(mutated))
-
-    for variant in list(variants):
-        if variant:
-            push(variant[:1].upper() + variant[1:])
-
-    return variants
-
-
-@beartype
-def build_variant_tokens(query: str) -> list[list[str]]:
-    variants = build_query_variants(query)
-    token_groups: list[list[str]] = []
-    stop_tokens = {"в", "во", "и", "с", "со", "на", "по", "для", "из", "к", "у", "о", "об", "от", "до"}
-    for variant in variants:
-        prepared = normalize_search_text(variant).replace("mg", " ")
-        tokens = [
-            token.strip()
-            for token in prepared.split()
-            if token.strip() and len(token.strip()) > 1 and token.strip() not in stop_tokens
-        ]
-        if tokens and tokens not in token_groups:
-            token_groups.append(tokens)
-    return token_groups
-
-
 @beartype
 def build_like_clause(column: str, query: str) -> tuple[str, list[str]]:
     token_groups = build_variant_tokens(query)
@@ -309,6 +98,48 @@ def build_like_clause(column: str, query: str) -> tuple[str, list[str]]:
     return (" OR ".join(clauses) if clauses else "1=0"), args
 
 
+@beartype
+def build_fts_match(query: str) -> str:
+    """FTS5 trigram MATCH expression over the variant groups of build_like_clause.
+
+    Returns "" when some group has no token long enough for a trigram lookup;
+    the caller then has to scan with LIKE alone.
+    """
+    groups: list[str] = []
+    for tokens in build_variant_tokens(query):
+        terms = [normalize_search_text(token) for token in tokens]
+        terms = [term for term in terms if len(term) >= FTS_MIN_TOKEN_CHARS]
+        if not terms:
+            return ""
+        group = " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        if group not in groups:
+            groups.append(group)
+    return " OR ".join(f"({group})" for group in groups)
+
+
+@beartype
+def build_search_source(conn: sqlite3.Connection, table: str, column: str, fts_table: str, query: str) -> tuple[str, str, list[str], str]:
+    """FROM source, WHERE clause, args and rank expression for a product text search.
+
+    When the trigram index exists, the source is joined to its MATCH hits so the
+    LIKE clause only re-checks those candidates, and the rank expression is the
+    bm25 rank (lower is better). Without the index this is the plain LIKE scan.
+    """
+    where_sql, args = build_like_clause(column, query)
+    match = build_fts_match(query)
+    has_fts = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (fts_table,),
+    ).fetchone()
+    if not match or not has_fts:
+        return table, where_sql, args, "NULL"
+    source = (
+        f"{table} JOIN (SELECT rowid AS fts_rowid, rank AS match_rank FROM {fts_table} "
+        f"WHERE {fts_table} MATCH ?) AS fts ON fts.fts_rowid = {table}.rowid"
+    )
+    return source, where_sql, [match, *args], "fts.match_rank"
+
+
 @beartype
 def period_sql_clause(column: str, period: str) -> str:
     normalized = normalize_period(period)
@@ -361,9 +192,12 @@ class LocalAnalyticsClient:
         cleaned = " ".join(query.strip().split())
         if not cleaned:
             return []
-        where_sql, args = build_like_clause("search_text", cleaned)
         query_like = f"%{normalize_search_text(cleaned)}%"
-        sql = f"""
+        with self._connect() as conn:
+            source, where_sql, args, rank_sql = build_search_source(
+                conn, "catalog_products", "search_text", "catalog_products_fts", cleaned
+            )
+            sql = f"""
 SELECT
     canonical_ean AS ean,
     name,
@@ -371,16 +205,16 @@ SELECT
     id_name,
     offer_count,
     best_priority
-FROM catalog_products
+FROM {source}
 WHERE {where_sql}
 ORDER BY
     CASE WHEN search_text LIKE ? THEN 1 ELSE 0 END DESC,
+    {rank_sql} ASC,
     offer_count DESC,
     best_priority ASC,
     name ASC
 LIMIT ?
 """.strip()
-        with self._connect() as conn:
             rows = conn.execute(sql, [*args, query_like, int(limit)]).fetchall()
         return [
             CatalogProduct(
@@ -402,13 +236,16 @@ LIMIT ?
         cleaned = " ".join(query.strip().split())
         if not cleaned:
             return []
-        where_sql, args = build_like_clause("search_text", cleaned)
         period_clause = period_sql_clause("nakl_date", period)
-        sql = f"""
+        with self._connect() as conn:
+            source, where_sql, args, _rank_sql = build_search_source(
+                conn, "purchase_lines", "search_text", "purchase_lines_fts", cleaned
+            )
+            sql = f"""
 WITH filtered AS (
     SELECT product_key, canonical_ean AS ean, canonical_name AS name, canonical_maker AS maker,
            supplier, nakl_date, qty, search_text
-    FROM purchase_lines
+    FROM {source}
     WHERE ({where_sql})
     {period_clause}
 ),
@@ -444,7 +281,6 @@ LEFT JOIN ranked_suppliers r ON r.product_key = p.product_key AND r.rn = 1
 ORDER BY p.qty_sum DESC, p.purchase_count DESC, p.last_date DESC
 LIMIT ?
 """.strip()
-        with self._connect() as conn:
             rows = conn.execute(sql, [*args, int(limit)]).fetchall()
         return [
             HistoryProductSummary(
@@ -468,22 +304,24 @@ LIMIT ?
         cleaned = " ".join(query.strip().split())
         if not cleaned:
             return []
-        where_sql, args = build_like_clause("search_text", cleaned)
         period_clause = period_sql_clause("nakl_date", period)
-        sql = f"""
+        with self._connect() as conn:
+            source, where_sql, args, _rank_sql = build_search_source(
+                conn, "purchase_lines", "search_text", "purchase_lines_fts", cleaned
+            )
+            sql = f"""
 SELECT
     COALESCE(supplier, '') AS supplier,
     COALESCE(SUM(qty), 0) AS qty_sum,
     COUNT(*) AS purchase_count,
     COALESCE(MAX(nakl_date), '') AS last_date
-FROM purchase_lines
+FROM {source}
 WHERE ({where_sql})
 {period_clause}
 GROUP BY supplier
 ORDER BY qty_sum DESC, purchase_count DESC, supplier ASC
 LIMIT ?
 """.strip()
-        with self._connect() as conn:
             rows = conn.execute(sql, [*args, int(limit)]).fetchall()
         return [
             SupplierBreakdown(
@@ -649,21 +487,23 @@ ORDER BY source ASC, canonical_name ASC, canonical_maker ASC
         cleaned = " ".join(query.strip().split())
         if not cleaned:
             return []
-        where_sql, args = build_like_clause("(search_name || ' ' || search_maker)", cleaned)
-        sql = f"""
+        with self._connect() as conn:
+            source, where_sql, args, rank_sql = build_search_source(
+                conn, "product_aliases", "(search_name || ' ' || search_maker)", "product_aliases_fts", cleaned
+            )
+            sql = f"""
 SELECT
     MIN(ean) AS ean,
     canonical_name AS name,
     COALESCE(canonical_maker, '') AS maker,
     id_name,
     COUNT(DISTINCT ean) AS alias_count
-FROM product_aliases
+FROM {source}
 WHERE {where_sql}
 GROUP BY canonical_name, canonical_maker, id_name
-ORDER BY alias_count DESC, canonical_name ASC
+ORDER BY alias_count DESC, MIN({rank_sql}) ASC, canonical_name ASC
 LIMIT ?
 """.strip()
-        with self._connect() as conn:
             rows = conn.execute(sql, [*args, int(limit)]).fetchall()
         return [
             CatalogProduct(
@@ -735,6 +575,333 @@ LIMIT ?
         return summaries
 
 
+# The resident worker (history_worker.py) is sent inline over SSH, so the VPS
+# only needs python3. exec runs it as __main__ to start its request loop.
+_REMOTE_WORKER_COMMAND = (
+    "python3 -u -c \"import base64; exec(base64.b64decode('"
+    + base64.b64encode(Path(__file__).with_name("history_worker.py").read_bytes()).decode("ascii")
+    + "'), {'__name__': '__main__'})\""
+)
+_REPLICA_OPS = {"purchase_summary", "supplier_breakdown"}
+
+
+class RemoteWorkerError(RuntimeError):
+    """The resident worker answered, but the query itself failed."""
+
+
+class _RemoteWorker:
+    """One SSH connection running the resident query worker on a persistent channel."""
+
+    def __init__(self, host: str, username: str, password: str, timeout: float, keepalive: int) -> None:
+        self.client = paramiko.SSHClient()
+        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.client.connect(hostname=host, username=username, password=password, timeout=timeout)
+        try:
+            transport = self.client.get_transport()
+            if transport is None:
+                raise paramiko.SSHException("SSH transport not available")
+            transport.set_keepalive(keepalive)
+            self.channel = transport.open_session(timeout=timeout)
+            self.channel.settimeout(timeout)
+            self.channel.exec_command(_REMOTE_WORKER_COMMAND)
+            self.stdin = self.channel.makefile_stdin("wb")
+            self.stdout = self.channel.makefile("rb")
+        except Exception:
+            self.client.close()
+            raise
+        self.last_used = time.monotonic()
+        self._next_id = 0
+
+    @property
+    def alive(self) -> bool:
+        transport = self.client.get_transport()
+        return bool(
+            transport is not None
+            and transport.is_active()
+            and not self.channel.closed
+            and not self.channel.exit_status_ready()
+        )
+
+    def request(self, op: str, payload: dict[str, Any]) -> list[dict[str, Any]]:
+        self._next_id += 1
+        request_id = self._next_id
+        line = json.dumps({"id": request_id, "op": op, "payload": payload}, ensure_ascii=False)
+        self.stdin.write((line + "\n").encode("utf-8"))
+        self.stdin.flush()
+        raw = self.stdout.readline()
+        if not raw:
+            stderr = self.channel.recv_stderr(65536) if self.channel.recv_stderr_ready() else b""
+            raise EOFError(f"remote worker exited: {stderr.decode('utf-8', errors='replace').strip()}")
+        self.last_used = time.monotonic()
+        response = json.loads(raw.decode("utf-8", errors="replace"))
+        if response.get("id") != request_id:
+            raise EOFError(f"remote worker out of sync: expected {request_id}, got {response.get('id')}")
+        if not response.get("ok"):
+            raise RemoteWorkerError(str(response.get("error") or "unknown error"))
+        rows = response.get("rows")
+        if not isinstance(rows, list):
+            raise RemoteWorkerError(f"Unexpected payload: {rows!r}")
+        return rows
+
+    def close(self) -> None:
+        try:
+            self.channel.close()
+        finally:
+            self.client.close()
+
+
+class SSHWorkerPool:
+    """Long-lived SSH connections, each running a resident worker, handed out per query.
+
+    Up to max_size queries run concurrently; a query that cannot get a
+    connection within acquire_timeout fails with TimeoutError instead of
+    queueing indefinitely. An idle connection is reused
+    instead of paying a handshake plus remote Python startup per query; one
+    that died (server restart, network drop) is replaced and the query
+    retried once. A query that merely timed out is not retried: it would
+    most likely time out again, at the same cost.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        username: str,
+        password: str,
+        timeout: float,
+        max_size: int = 3,
+        keepalive: int = 30,
+        idle_ttl: float = 600.0,
+        acquire_timeout: float | None = None,
+    ) -> None:
+        self.host = host
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.max_size = max(1, max_size)
+        self.keepalive = keepalive
+        self.idle_ttl = idle_ttl
+        self.acquire_timeout = timeout if acquire_timeout is None else acquire_timeout
+        self._idle: list[_RemoteWorker] = []
+        self._open = 0
+        self._cond = threading.Condition()
+
+    def _acquire(self, deadline: float) -> tuple[_RemoteWorker, bool]:
+        """Return (worker, reused). Blocks while max_size workers are busy, until the monotonic deadline."""
+        stale: list[_RemoteWorker] = []
+        reused: _RemoteWorker | None = None
+        with self._cond:
+            while True:
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.alive and time.monotonic() - worker.last_used < self.idle_ttl:
+                        reused = worker
+                        break
+                    self._open -= 1
+                    stale.append(worker)
+                if reused is not None or self._open < self.max_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"no free SSH worker within {self.acquire_timeout:g}s")
+                self._cond.wait(remaining)
+            if reused is None:
+                self._open += 1
+        for worker in stale:
+            worker.close()
+        if reused is not None:
+            return reused, True
+        try:
+            return _RemoteWorker(self.host, self.username, self.password, self.timeout, self.keepalive), False
+        except Exception:
+            self._discard(None)
+            raise
+
+    def _release(self, worker: _RemoteWorker) -> None:
+        with self._cond:
+            self._idle.append(worker)
+            self._cond.notify()
+
+    def _discard(self, worker: _RemoteWorker | None) -> None:
+        if worker is not None:
+            worker.close()
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def call(self, op: str, payload: dict[str, Any]) -> list[dict[str, Any]]:
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            worker, reused = self._acquire(deadline)
+            try:
+                rows = worker.request(op, payload)
+            except RemoteWorkerError:
+                self._release(worker)
+                raise
+            except (OSError, EOFError, ValueError, paramiko.SSHException) as exc:
+                connection_lost = isinstance(exc, EOFError) or (not isinstance(exc, TimeoutError) and not worker.alive)
+                self._discard(worker)
+                if reused and connection_lost:
+                    continue  # a pooled connection went stale; retry on a fresh one
+                raise
+            self._release(worker)
+            return rows
+
+    def close(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for worker in idle:
+            worker.close()
+
+
+class HistoryReplica:
+    """Local SQLite mirror of the VPS ``orders`` table, kept fresh by sync().
+
+    Rows are keyed by the remote rowid. Each sync pulls everything past the
+    stored rowid watermark, then re-copies the last RESYNC_DAYS of orders so
+    recent edits and deletions on the VPS are picked up too. If the remote
+    rowids go backwards (order_history.db was rebuilt), the mirror is
+    rebuilt from scratch into a staging table and swapped in only once the
+    copy is complete, so reads keep seeing the old mirror meanwhile. Reads run the resident worker's own SQL against
+    the mirror, so answers match the SSH path.
+    """
+
+    PAGE_SIZE = 5000
+    RESYNC_DAYS = 3
+    ORDERS_COLUMNS = "rid INTEGER PRIMARY KEY, ean TEXT, tovar TEXT, maker TEXT, post TEXT, nakl_date TEXT, kol REAL"
+
+    @beartype
+    def __init__(self, db_path: str = "") -> None:
+        self.db_path = Path(db_path).expanduser() if db_path else Path()
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._synced_at: float | None = None
+
+    @property
+    def configured(self) -> bool:
+        return str(self.db_path) != "."
+
+    @property
+    def ready(self) -> bool:
+        """True once a first full sync has completed."""
+        return self.configured and self.synced_at() > 0
+
+    def synced_at(self) -> float:
+        """Epoch seconds of the last completed sync, 0 if never."""
+        if self._synced_at is None:
+            if not self.configured or not self.db_path.is_file():
+                return 0.0
+            row = self._connect().execute("SELECT value FROM sync_meta WHERE key = 'synced_at'").fetchone()
+            self._synced_at = float(row["value"]) if row else 0.0
+        return self._synced_at
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=10.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                f"""
+CREATE TABLE IF NOT EXISTS orders ({self.ORDERS_COLUMNS});
+CREATE INDEX IF NOT EXISTS idx_orders_nakl_date ON orders(nakl_date);
+CREATE TABLE IF NOT EXISTS sync_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+""".strip()
+            )
+            self._local.conn = conn
+        return conn
+
+    def status(self) -> dict[str, Any]:
+        """rows, last_rowid, synced_at (epoch seconds, 0 = never) and age_seconds."""
+        if not self.configured or not self.db_path.is_file():
+            return {"rows": 0, "last_rowid": 0, "synced_at": 0.0, "age_seconds": None}
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM sync_meta WHERE key = 'last_rowid'").fetchone()
+        synced_at = self.synced_at()
+        return {
+            "rows": int(conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]),
+            "last_rowid": int(row["value"]) if row else 0,
+            "synced_at": synced_at,
+            "age_seconds": time.time() - synced_at if synced_at else None,
+        }
+
+    @staticmethod
+    def _order_values(rows: list[dict[str, Any]]) -> list[tuple[Any, ...]]:
+        return [
+            (int(row["rid"]), row.get("ean"), row.get("tovar"), row.get("maker"), row.get("post"), row.get("nakl_date"), row.get("kol"))
+            for row in rows
+        ]
+
+    @beartype
+    def sync(self, fetch: Callable[[str, dict[str, Any]], list[dict[str, Any]]]) -> int:
+        """Pull new and recently changed orders via fetch(op, payload). Returns rows copied."""
+        with self._sync_lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM sync_meta WHERE key = 'last_rowid'").fetchone()
+            watermark = int(row["value"]) if row else 0
+            head = fetch("orders_head", {})
+            remote_max = int(head[0]["max_rowid"]) if head else 0
+            rebuild = remote_max < watermark
+            table = "orders"
+            if rebuild:
+                table = "orders_rebuild"
+                with conn:
+                    conn.execute("DROP TABLE IF EXISTS orders_rebuild")
+                    conn.execute(f"CREATE TABLE orders_rebuild ({self.ORDERS_COLUMNS})")
+                watermark = 0
+
+            copied = 0
+            while True:
+                page = fetch("orders_since", {"after_rowid": watermark, "limit": self.PAGE_SIZE})
+                if not page:
+                    break
+                with conn:
+                    conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?,?,?,?,?,?,?)", self._order_values(page))
+                    watermark = max(int(item["rid"]) for item in page)
+                    if not rebuild:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO sync_meta(key, value) VALUES ('last_rowid', ?)",
+                            (str(watermark),),
+                        )
+                copied += len(page)
+                if len(page) < self.PAGE_SIZE:
+                    break
+
+            if rebuild:
+                with conn:
+                    conn.execute("DROP TABLE orders")
+                    conn.execute("ALTER TABLE orders_rebuild RENAME TO orders")
+                    conn.execute("CREATE INDEX idx_orders_nakl_date ON orders(nakl_date)")
+                    conn.execute(
+                        "INSERT OR REPLACE INTO sync_meta(key, value) VALUES ('last_rowid', ?)",
+                        (str(watermark),),
+                    )
+
+            recent = fetch("orders_recent", {"days": self.RESYNC_DAYS})
+            synced_at = time.time()
+            with conn:
+                conn.execute(
+                    "DELETE FROM orders WHERE date(nakl_date) >= date('now', ?)",
+                    (f"-{self.RESYNC_DAYS} days",),
+                )
+                conn.executemany("INSERT OR REPLACE INTO orders VALUES (?,?,?,?,?,?,?)", self._order_values(recent))
+                conn.execute(
+                    "INSERT OR REPLACE INTO sync_meta(key, value) VALUES ('synced_at', ?)",
+                    (str(synced_at),),
+                )
+            self._synced_at = synced_at
+            return copied + len(recent)
+
+    def query(self, op: str, payload: dict[str, Any]) -> list[dict[str, Any]]:
+        """Run a worker query op against the mirror."""
+        rows = history_worker.OPS[op]({**payload, "db_path": str(self.db_path)})
+        return [dict(row) for row in rows]
+
+
 class HistoryAnalyticsClient:
     @beartype
     def __init__(
@@ -744,156 +911,80 @@ class HistoryAnalyticsClient:
         password: str = "",
         db_path: str = "/opt/pharmorder/src/data/order_history.db",
         timeout: float = 20.0,
+        pool_size: int = 3,
+        replica_path: str = "",
+        replica_stale_after: float = 3600.0,
+        queue_timeout: float | None = None,
     ) -> None:
         self.host = host.strip()
         self.username = username.strip()
         self.password = password
         self.db_path = db_path.strip() or "/opt/pharmorder/src/data/order_history.db"
         self.timeout = timeout
+        self.pool = SSHWorkerPool(
+            self.host, self.username, self.password, timeout, max_size=pool_size, acquire_timeout=queue_timeout
+        )
+        self.replica = HistoryReplica(replica_path)
+        self.replica_stale_after = replica_stale_after
+        self._stale_reported = False
 
     @property
-    def enabled(self) -> bool:
+    def ssh_enabled(self) -> bool:
         return bool(self.host and self.username and self.password and self.db_path)
 
-    @beartype
-    def _exec_remote_json(self, payload: dict[str, Any]) -> list[dict[str, Any]]:
-        if not self.enabled:
-            return []
+    @property
+    def enabled(self) -> bool:
+        return self.ssh_enabled or self.replica.ready
 
-        safe_payload = dict(payload)
-        safe_payload["period"] = normalize_period(str(payload.get("period", "last_month")))
-        payload_b64 = base64.b64encode(json.dumps(safe_payload, ensure_ascii=False).encode("utf-8")).decode("ascii")
-        script = f"""
-import base64
-import json
-import re
-import sqlite3
+    @beartype
+    def replica_status(self) -> dict[str, Any]:
+        status = self.replica.status()
+        age = status["age_seconds"]
+        status["stale"] = age is None or age > self.replica_stale_after
+        return status
 
-payload = json.loads(base64.b64decode("{payload_b64}").decode("utf-8"))
-query = payload["query"].strip()
-variants = [v for v in payload.get("variants", []) if v]
-if not variants and query:
-    variants = [query]
-period = payload.get("period", "last_month")
-match = re.fullmatch(r"last_(\\d+)_days", period)
-dynamic_days = int(match.group(1)) if match else None
-if period not in {{"last_month", "this_month", "last_90_days", "last_180_days", "all_time"}} and not (dynamic_days and 1 <= dynamic_days <= 3650):
-    period = "last_month"
-    dynamic_days = None
-limit = int(payload.get("limit", 5))
-db_path = payload["db_path"]
-
-period_clause = ""
-period_args = []
-if period == "last_month":
-    period_clause = "AND date(nakl_date) >= date('now','start of month','-1 month') AND date(nakl_date) < date('now','start of month')"
-elif period == "this_month":
-    period_clause = "AND date(nakl_date) >= date('now','start of month')"
-elif period == "last_90_days":
-    period_clause = "AND date(nakl_date) >= date('now','-90 days')"
-elif period == "last_180_days":
-    period_clause = "AND date(nakl_date) >= date('now','-180 days')"
-elif dynamic_days:
-    period_clause = "AND date(nakl_date) >= date('now','-%s days')" % dynamic_days
-
-conn = sqlite3.connect(db_path)
-conn.row_factory = sqlite3.Row
-cur = conn.cursor()
-variant_tokens = []
-for variant in variants:
-    prepared = variant.replace(",", " ").replace("š", " ").replace("mg", " ").replace("ěă", " ")
-    tokens = [token.strip() for token in prepared.split() if token.strip()]
-    if tokens:
-        variant_tokens.append(tokens)
-
-query_clauses = []
-query_args = []
-for tokens in variant_tokens:
-    token_clauses = []
-    for token in tokens:
-        token_clauses.append("tovar LIKE ?")
-        query_args.append(f"%{{token}}%")
-    query_clauses.append("(" + " AND ".join(token_clauses) + ")")
-
-query_clause = " OR ".join(query_clauses) if query_clauses else "1=0"
-
-sql = f'''
-WITH filtered AS (
-    SELECT ean, tovar, maker, post, date(nakl_date) AS nakl_day, COALESCE(kol, 0) AS qty
-    FROM orders
-    WHERE ({{query_clause}})
-    {{period_clause}}
-),
-product_totals AS (
-    SELECT ean, tovar, maker, SUM(qty) AS qty_sum, COUNT(*) AS purchase_count, MAX(nakl_day) AS last_date
-    FROM filtered
-    GROUP BY ean, tovar, maker
-),
-supplier_totals AS (
-    SELECT ean, post, SUM(qty) AS supplier_qty
-    FROM filtered
-    GROUP BY ean, post
-),
-ranked_suppliers AS (
-    SELECT ean, post, supplier_qty,
-           ROW_NUMBER() OVER (PARTITION BY ean ORDER BY supplier_qty DESC, post ASC) AS rn
-    FROM supplier_totals
-)
-SELECT
-    p.ean,
-    p.tovar AS name,
-    COALESCE(p.maker, '') AS maker,
-    COALESCE(p.qty_sum, 0) AS qty_sum,
-    COALESCE(p.purchase_count, 0) AS purchase_count,
-    COALESCE(p.last_date, '') AS last_date,
-    COALESCE(r.post, '') AS top_supplier,
-    COALESCE(r.supplier_qty, 0) AS top_supplier_qty
-FROM product_totals p
-LEFT JOIN ranked_suppliers r ON r.ean = p.ean AND r.rn = 1
-ORDER BY p.qty_sum DESC, p.purchase_count DESC, p.last_date DESC
-LIMIT ?
-'''
+    @beartype
+    def sync_replica(self) -> int:
+        """Pull new order rows into the local replica. Returns rows copied."""
+        if not self.ssh_enabled or not self.replica.configured:
+            return 0
+        copied = self.replica.sync(lambda op, payload: self.pool.call(op, {**payload, "db_path": self.db_path}))
+        self._stale_reported = False
+        return copied
 
-rows = cur.execute(sql, [*query_args, *period_args, limit]).fetchall()
-print(json.dumps([dict(row) for row in rows], ensure_ascii=False))
-""".strip()
-        command = "python3 - <<'PY'\n" + script + "\nPY"
-
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        client.connect(
-            hostname=self.host,
-            username=self.username,
-            password=self.password,
-            timeout=self.timeout,
-        )
+    @beartype
+    def _query(self, op: str, payload: dict[str, Any], label: str) -> list[dict[str, Any]]:
+        if op in _REPLICA_OPS and self.replica.ready:
+            age = time.time() - self.replica.synced_at()
+            if age > self.replica_stale_after and not self._stale_reported:
+                self._stale_reported = True
+                print(f"[history-replica] stale: last sync {age:.0f}s ago", flush=True)
+            return self.replica.query(op, payload)
+        if not self.ssh_enabled:
+            return []
         try:
-            _stdin, stdout, stderr = client.exec_command(command, timeout=self.timeout)
-            out = stdout.read().decode("utf-8", errors="replace").strip()
-            err = stderr.read().decode("utf-8", errors="replace").strip()
-        finally:
-            client.close()
+            return self.pool.call(op, payload)
+        except (RemoteWorkerError, OSError, EOFError, ValueError, paramiko.SSHException) as exc:
+            detail = str(exc) or ("timed out" if isinstance(exc, TimeoutError) else type(exc).__name__)
+            raise RuntimeError(f"SSH {label} failed: {detail}") from exc
 
-        if err:
-            raise RuntimeError(f"SSH history query failed: {err}")
-        if not out:
-            return []
-        payload_out = json.loads(out)
-        if not isinstance(payload_out, list):
-            raise RuntimeError(f"Unexpected SSH history payload: {payload_out!r}")
-        return payload_out
+    def close(self) -> None:
+        self.pool.close()
 
     @beartype
     def get_purchase_summary(self, query: str, period: str = "last_month", limit: int = 5) -> list[HistoryProductSummary]:
         cleaned = " ".join(query.strip().split())
-        variants = build_query_variants(cleaned)
-        raw_items = self._exec_remote_json({
-            "query": cleaned,
-            "variants": variants,
-            "period": period,
-            "limit": limit,
-            "db_path": self.db_path,
-        })
+        raw_items = self._query(
+            "purchase_summary",
+            {
+                "query": cleaned,
+                "variants": build_query_variants(cleaned),
+                "period": normalize_period(period),
+                "limit": limit,
+                "db_path": self.db_path,
+            },
+            "history query",
+        )
         return [
             HistoryProductSummary(
                 ean=str(item.get("ean", "")).strip(),
@@ -911,106 +1002,17 @@ print(json.dumps([dict(row) for row in rows], ensure_ascii=False))
     @beartype
     def get_supplier_breakdown(self, query: str, period: str = "last_month", limit: int = 6) -> list[SupplierBreakdown]:
         cleaned = " ".join(query.strip().split())
-        variants = build_query_variants(cleaned)
-        payload = {
-            "query": cleaned,
-            "variants": variants,
-            "period": period,
-            "limit": limit,
-            "db_path": self.db_path,
-        }
-        payload_b64 = base64.b64encode(json.dumps(payload, ensure_ascii=False).encode("utf-8")).decode("ascii")
-        script = f"""
-import base64
-import json
-import re
-import sqlite3
-
-payload = json.loads(base64.b64decode("{payload_b64}").decode("utf-8"))
-query = payload["query"].strip()
-variants = [v for v in payload.get("variants", []) if v]
-if not variants and query:
-    variants = [query]
-period = payload.get("period", "last_month")
-match = re.fullmatch(r"last_(\\d+)_days", period)
-dynamic_days = int(match.group(1)) if match else None
-if period not in {{"last_month", "this_month", "last_90_days", "last_180_days", "all_time"}} and not (dynamic_days and 1 <= dynamic_days <= 3650):
-    period = "last_month"
-    dynamic_days = None
-limit = int(payload.get("limit", 6))
-db_path = payload["db_path"]
-
-period_clause = ""
-if period == "last_month":
-    period_clause = "AND date(nakl_date) >= date('now','start of month','-1 month') AND date(nakl_date) < date('now','start of month')"
-elif period == "this_month":
-    period_clause = "AND date(nakl_date) >= date('now','start of month')"
-elif period == "last_90_days":
-    period_clause = "AND date(nakl_date) >= date('now','-90 days')"
-elif period == "last_180_days":
-    period_clause = "AND date(nakl_date) >= date('now','-180 days')"
-elif dynamic_days:
-    period_clause = "AND date(nakl_date) >= date('now','-%s days')" % dynamic_days
-
-conn = sqlite3.connect(db_path)
-conn.row_factory = sqlite3.Row
-cur = conn.cursor()
-variant_tokens = []
-for variant in variants:
-    prepared = variant.replace(",", " ").replace("ЕЎ", " ").replace("mg", " ").replace("Д›Дѓ", " ")
-    tokens = [token.strip() for token in prepared.split() if token.strip()]
-    if tokens:
-        variant_tokens.append(tokens)
-
-query_clauses = []
-query_args = []
-for tokens in variant_tokens:
-    token_clauses = []
-    for token in tokens:
-        token_clauses.append("tovar LIKE ?")
-        query_args.append(f"%{{token}}%")
-    query_clauses.append("(" + " AND ".join(token_clauses) + ")")
-
-query_clause = " OR ".join(query_clauses) if query_clauses else "1=0"
-sql = f'''
-SELECT
-    COALESCE(post, '') AS supplier,
-    COALESCE(SUM(COALESCE(kol, 0)), 0) AS qty_sum,
-    COUNT(*) AS purchase_count,
-    COALESCE(MAX(date(nakl_date)), '') AS last_date
-FROM orders
-WHERE ({{query_clause}})
-{{period_clause}}
-GROUP BY post
-ORDER BY qty_sum DESC, purchase_count DESC, supplier ASC
-LIMIT ?
-'''
-
-rows = cur.execute(sql, [*query_args, limit]).fetchall()
-print(json.dumps([dict(row) for row in rows], ensure_ascii=False))
-""".strip()
-        command = "python3 - <<'PY'\n" + script + "\nPY"
-
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        client.connect(
-            hostname=self.host,
-            username=self.username,
-            password=self.password,
-            timeout=self.timeout,
+        payload_out = self._query(
+            "supplier_breakdown",
+            {
+                "query": cleaned,
+                "variants": build_query_variants(cleaned),
+                "period": period,
+                "limit": limit,
+                "db_path": self.db_path,
+            },
+            "supplier breakdown",
         )
-        try:
-            _stdin, stdout, stderr = client.exec_command(command, timeout=self.timeout)
-            out = stdout.read().decode("utf-8", errors="replace").strip()
-            err = stderr.read().decode("utf-8", errors="replace").strip()
-        finally:
-            client.close()
-
-        if err:
-            raise RuntimeError(f"SSH supplier breakdown failed: {err}")
-        if not out:
-            return []
-        payload_out = json.loads(out)
         return [
             SupplierBreakdown(
                 supplier=str(item.get("supplier", "")).strip(),
@@ -1029,92 +1031,22 @@ print(json.dumps([dict(row) for row in rows], ensure_ascii=False))
         limit: int = 5,
         catalog_db_path: str = "/opt/pharmorder/src/data/sklit_cache.db",
     ) -> list[CatalogProduct]:
-        if not self.enabled:
+        if not self.ssh_enabled:
             return []
 
         cleaned = " ".join(query.strip().split())
         if not cleaned:
             return []
 
-        variants = build_query_variants(cleaned)
-
-        payload = {
-            "variants": variants,
-            "limit": limit,
-            "db_path": catalog_db_path,
-        }
-        payload_b64 = base64.b64encode(json.dumps(payload, ensure_ascii=False).encode("utf-8")).decode("ascii")
-        script = f"""
-import base64
-import json
-import sqlite3
-
-payload = json.loads(base64.b64decode("{payload_b64}").decode("utf-8"))
-variants = [v for v in payload.get("variants", []) if v]
-limit = int(payload.get("limit", 5))
-db_path = payload["db_path"]
-
-conn = sqlite3.connect(db_path)
-conn.row_factory = sqlite3.Row
-cur = conn.cursor()
-
-variant_tokens = []
-for variant in variants:
-    prepared = variant.replace(",", " ").replace("š", " ").replace("mg", " ").replace("ěă", " ")
-    tokens = [token.strip() for token in prepared.split() if token.strip()]
-    if tokens:
-        variant_tokens.append(tokens)
-
-clauses = []
-args = []
-for tokens in variant_tokens:
-    token_clauses = []
-    for token in tokens:
-        token_clauses.append("(name LIKE ? OR maker LIKE ?)")
-        args.extend([f"%{{token}}%", f"%{{token}}%"])
-    clauses.append("(" + " AND ".join(token_clauses) + ")")
-
-where_sql = " OR ".join(clauses) if clauses else "1=0"
-sql = f'''
-SELECT
-    ean,
-    name,
-    COALESCE(maker, '') AS maker,
-    id_name,
-    COUNT(*) AS offer_count,
-    MIN(COALESCE(supplier_priority, 999)) AS best_priority
-FROM products
-WHERE {{where_sql}}
-GROUP BY ean, name, maker, id_name
-ORDER BY best_priority ASC, offer_count DESC, name ASC
-LIMIT ?
-'''.replace("{{where_sql}}", where_sql)
-
-rows = cur.execute(sql, [*args, limit]).fetchall()
-print(json.dumps([dict(row) for row in rows], ensure_ascii=False))
-""".strip()
-        command = "python3 - <<'PY'\n" + script + "\nPY"
-
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        client.connect(
-            hostname=self.host,
-            username=self.username,
-            password=self.password,
-            timeout=self.timeout,
+        payload_out = self._query(
+            "catalog_search",
+            {
+                "variants": build_query_variants(cleaned),
+                "limit": limit,
+                "db_path": catalog_db_path,
+            },
+            "catalog search",
         )
-        try:
-            _stdin, stdout, stderr = client.exec_command(command, timeout=self.timeout)
-            out = stdout.read().decode("utf-8", errors="replace").strip()
-            err = stderr.read().decode("utf-8", errors="replace").strip()
-        finally:
-            client.close()
-
-        if err:
-            raise RuntimeError(f"SSH catalog search failed: {err}")
-        if not out:
-            return []
-        payload_out = json.loads(out)
         return [
             CatalogProduct(
                 ean=str(item.get("ean", "")).strip(),
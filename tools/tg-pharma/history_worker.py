@@ -0,0 +1,212 @@
+"""Resident order_history query worker.
+
+history_client starts this file over SSH once per pooled connection (the
+source is sent inline, the VPS needs nothing installed besides python3). It
+reads one JSON request per line on stdin ({"id", "op", "payload"}), keeps its
+SQLite connections open between requests and answers one JSON line on stdout
+({"id", "ok", "rows"} or {"id", "ok": false, "error"}). The bot also imports it
+to run the same SQL against the local HistoryReplica mirror.
+
+Standard library only: this runs on the VPS's system python3.
+"""
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import sys
+import threading
+from typing import Any
+
+PERIODS = {"last_month", "this_month", "last_90_days", "last_180_days", "all_time"}
+LAST_MONTH = "AND date(nakl_date) >= date('now','start of month','-1 month') AND date(nakl_date) < date('now','start of month')"
+SUMMARY_JUNK = ("š", "ěă")
+SUPPLIER_JUNK = ("ЕЎ", "Д›Дѓ")
+_local = threading.local()
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """Open (once per thread) a connection to db_path."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = conns[db_path] = sqlite3.connect(db_path, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+    return conn
+
+
+def period_clause(period: str) -> str:
+    match = re.fullmatch(r"last_(\d+)_days", period)
+    dynamic_days = int(match.group(1)) if match else None
+    if period not in PERIODS and not (dynamic_days and 1 <= dynamic_days <= 3650):
+        return LAST_MONTH
+    if period == "last_month":
+        return LAST_MONTH
+    if period == "this_month":
+        return "AND date(nakl_date) >= date('now','start of month')"
+    if period == "last_90_days":
+        return "AND date(nakl_date) >= date('now','-90 days')"
+    if period == "last_180_days":
+        return "AND date(nakl_date) >= date('now','-180 days')"
+    if dynamic_days:
+        return f"AND date(nakl_date) >= date('now','-{dynamic_days} days')"
+    return ""
+
+
+def variant_tokens(payload: dict[str, Any], junk: tuple[str, str]) -> list[list[str]]:
+    variants = [v for v in payload.get("variants", []) if v]
+    query = str(payload.get("query", "")).strip()
+    if not variants and query:
+        variants = [query]
+    groups = []
+    for variant in variants:
+        prepared = variant.replace(",", " ").replace(junk[0], " ").replace("mg", " ").replace(junk[1], " ")
+        tokens = [token.strip() for token in prepared.split() if token.strip()]
+        if tokens:
+            groups.append(tokens)
+    return groups
+
+
+def where_clause(groups: list[list[str]], token_sql: str, per_token: int) -> tuple[str, list[str]]:
+    clauses = []
+    args = []
+    for tokens in groups:
+        clauses.append("(" + " AND ".join(token_sql for _ in tokens) + ")")
+        for token in tokens:
+            args.extend(["%" + token + "%"] * per_token)
+    return (" OR ".join(clauses) if clauses else "1=0"), args
+
+
+SUMMARY_SQL = '''
+WITH filtered AS (
+    SELECT ean, tovar, maker, post, date(nakl_date) AS nakl_day, COALESCE(kol, 0) AS qty
+    FROM orders
+    WHERE ({where})
+    {period}
+),
+product_totals AS (
+    SELECT ean, tovar, maker, SUM(qty) AS qty_sum, COUNT(*) AS purchase_count, MAX(nakl_day) AS last_date
+    FROM filtered
+    GROUP BY ean, tovar, maker
+),
+supplier_totals AS (
+    SELECT ean, post, SUM(qty) AS supplier_qty
+    FROM filtered
+    GROUP BY ean, post
+),
+ranked_suppliers AS (
+    SELECT ean, post, supplier_qty,
+           ROW_NUMBER() OVER (PARTITION BY ean ORDER BY supplier_qty DESC, post ASC) AS rn
+    FROM supplier_totals
+)
+SELECT
+    p.ean,
+    p.tovar AS name,
+    COALESCE(p.maker, '') AS maker,
+    COALESCE(p.qty_sum, 0) AS qty_sum,
+    COALESCE(p.purchase_count, 0) AS purchase_count,
+    COALESCE(p.last_date, '') AS last_date,
+    COALESCE(r.post, '') AS top_supplier,
+    COALESCE(r.supplier_qty, 0) AS top_supplier_qty
+FROM product_totals p
+LEFT JOIN ranked_suppliers r ON r.ean = p.ean AND r.rn = 1
+ORDER BY p.qty_sum DESC, p.purchase_count DESC, p.last_date DESC
+LIMIT ?
+'''
+
+SUPPLIERS_SQL = '''
+SELECT
+    COALESCE(post, '') AS supplier,
+    COALESCE(SUM(COALESCE(kol, 0)), 0) AS qty_sum,
+    COUNT(*) AS purchase_count,
+    COALESCE(MAX(date(nakl_date)), '') AS last_date
+FROM orders
+WHERE ({where})
+{period}
+GROUP BY post
+ORDER BY qty_sum DESC, purchase_count DESC, supplier ASC
+LIMIT ?
+'''
+
+CATALOG_SQL = '''
+SELECT
+    ean,
+    name,
+    COALESCE(maker, '') AS maker,
+    id_name,
+    COUNT(*) AS offer_count,
+    MIN(COALESCE(supplier_priority, 999)) AS best_priority
+FROM products
+WHERE {where}
+GROUP BY ean, name, maker, id_name
+ORDER BY best_priority ASC, offer_count DESC, name ASC
+LIMIT ?
+'''
+
+
+def purchase_summary(payload: dict[str, Any]) -> list[sqlite3.Row]:
+    where_sql, args = where_clause(variant_tokens(payload, SUMMARY_JUNK), "tovar LIKE ?", 1)
+    sql = SUMMARY_SQL.format(where=where_sql, period=period_clause(payload.get("period", "last_month")))
+    return connect(payload["db_path"]).execute(sql, [*args, int(payload.get("limit", 5))]).fetchall()
+
+
+def supplier_breakdown(payload: dict[str, Any]) -> list[sqlite3.Row]:
+    where_sql, args = where_clause(variant_tokens(payload, SUPPLIER_JUNK), "tovar LIKE ?", 1)
+    sql = SUPPLIERS_SQL.format(where=where_sql, period=period_clause(payload.get("period", "last_month")))
+    return connect(payload["db_path"]).execute(sql, [*args, int(payload.get("limit", 6))]).fetchall()
+
+
+def catalog_search(payload: dict[str, Any]) -> list[sqlite3.Row]:
+    where_sql, args = where_clause(variant_tokens(payload, SUMMARY_JUNK), "(name LIKE ? OR maker LIKE ?)", 2)
+    sql = CATALOG_SQL.format(where=where_sql)
+    return connect(payload["db_path"]).execute(sql, [*args, int(payload.get("limit", 5))]).fetchall()
+
+
+ORDER_COLUMNS = "rowid AS rid, ean, tovar, maker, post, nakl_date, kol"
+
+
+def orders_head(payload: dict[str, Any]) -> list[sqlite3.Row]:
+    sql = "SELECT COALESCE(MAX(rowid), 0) AS max_rowid, COUNT(*) AS row_count FROM orders"
+    return connect(payload["db_path"]).execute(sql).fetchall()
+
+
+def orders_since(payload: dict[str, Any]) -> list[sqlite3.Row]:
+    sql = f"SELECT {ORDER_COLUMNS} FROM orders WHERE rowid > ? ORDER BY rowid LIMIT ?"
+    args = (int(payload["after_rowid"]), int(payload.get("limit", 5000)))
+    return connect(payload["db_path"]).execute(sql, args).fetchall()
+
+
+def orders_recent(payload: dict[str, Any]) -> list[sqlite3.Row]:
+    sql = f"SELECT {ORDER_COLUMNS} FROM orders WHERE date(nakl_date) >= date('now', ?) ORDER BY rowid"
+    args = (f"-{int(payload['days'])} days",)
+    return connect(payload["db_path"]).execute(sql, args).fetchall()
+
+
+OPS = {
+    "purchase_summary": purchase_summary,
+    "supplier_breakdown": supplier_breakdown,
+    "catalog_search": catalog_search,
+    "orders_head": orders_head,
+    "orders_since": orders_since,
+    "orders_recent": orders_recent,
+}
+
+
+def serve() -> None:
+    """Answer requests from stdin until it closes."""
+    for line in sys.stdin:
+        request: dict[str, Any] = {}
+        try:
+            request = json.loads(line)
+            rows = OPS[request["op"]](request["payload"])
+            response = {"id": request.get("id"), "ok": True, "rows": [dict(row) for row in rows]}
+        except (sqlite3.Error, ValueError, KeyError, TypeError) as exc:  # client raises RemoteWorkerError
+            response = {"id": request.get("id"), "ok": False, "error": f"{type(exc).__name__}: {exc}"}
+        sys.stdout.write(json.dumps(response, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    serve()
@@ -7,6 +7,9 @@ import tempfile
 import threading
 import time
 import uuid
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
@@ -25,6 +28,7 @@ from history_client import (
 )
 from intent import IntentParser, ParsedIntent
 from pharm_api import InventoryItem, PharmOrderAPI, PharmOrderError, ProductCandidate
+from query_text import normalize_alias_token
 from segment_actions import load_draft
 
 ROOT_DIR = Path(__file__).resolve().parents[2]
@@ -65,6 +69,17 @@ SSH_PASSWORD = os.environ.get("PHARMORDER_SSH_PASSWORD", "")
 SSH_ORDER_DB = os.environ.get("PHARMORDER_REMOTE_ORDER_HISTORY_DB", "/opt/pharmorder/src/data/order_history.db").strip()
 REFS_DB = os.environ.get("PHARMA_REFS_DB", str(SCRIPT_DIR / "data" / "bot_refs.db")).strip()
 LOCAL_ANALYTICS_DB = os.environ.get("PHARMA_ANALYTICS_DB", str(SCRIPT_DIR / "data" / "bot_analytics.db")).strip()
+HISTORY_REPLICA_DB = os.environ.get("PHARMA_HISTORY_REPLICA_DB", str(SCRIPT_DIR / "data" / "order_history_replica.db")).strip()
+HISTORY_SYNC_INTERVAL_SECONDS = int(os.environ.get("PHARMA_HISTORY_SYNC_INTERVAL_SECONDS", "300"))
+LOOKUP_WORKERS = int(os.environ.get("PHARMA_LOOKUP_WORKERS", "8"))
+# Seconds from the start of a fan-out after which a source's answer is dropped.
+SOURCE_DEADLINES: dict[str, float] = {
+    "api_search": 6.0,
+    "catalog": 8.0,
+    "summary": 8.0,
+    "inventory": 6.0,
+}
+DEFAULT_SOURCE_DEADLINE = 8.0
 
 ALLOWED_CHAT_IDS = {
     int(chunk.strip())
@@ -79,9 +94,16 @@ HISTORY = HistoryAnalyticsClient(
     username=SSH_USER,
     password=SSH_PASSWORD,
     db_path=SSH_ORDER_DB,
+    replica_path=HISTORY_REPLICA_DB,
+    replica_stale_after=HISTORY_SYNC_INTERVAL_SECONDS * 3.0,
+    queue_timeout=DEFAULT_SOURCE_DEADLINE,
 )
 REFS = BotRefsClient(db_path=REFS_DB)
 LOCAL_ANALYTICS = LocalAnalyticsClient(db_path=LOCAL_ANALYTICS_DB)
+LOOKUP_POOL = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix="lookup")
+# Lookups that missed their deadline but still hold a LOOKUP_POOL thread, by source kind.
+OVERDUE_LOOKUPS: dict[str, int] = {}
+OVERDUE_LOCK = threading.Lock()
 
 
 @dataclass(slots=True)
@@ -711,46 +733,6 @@ def product_line(candidate: ProductCandidate) -> str:
     return f"{candidate.name}{maker}"
 
 
-@beartype
-def normalize_alias_token(value: str) -> str:
-    normalized = value.lower().replace("ё", "е")
-    normalized = re.sub(r"[^а-яa-z0-9]+", "", normalized)
-    for suffix in (
-        "овского",
-        "евского",
-        "ского",
-        "ового",
-        "евого",
-        "ского",
-        "овский",
-        "евский",
-        "ского",
-        "овск",
-        "евск",
-        "ового",
-        "евого",
-        "ового",
-        "ого",
-        "его",
-        "ому",
-        "ему",
-        "ыми",
-        "ими",
-        "ым",
-        "им",
-        "ая",
-        "яя",
-        "ый",
-        "ий",
-        "ой",
-        "ого",
-        "его",
-    ):
-        if normalized.endswith(suffix) and len(normalized) - len(suffix) >= 4:
-            return normalized[: -len(suffix)]
-    return normalized
-
-
 @beartype
 def candidate_aliases(name: str, maker: str) -> set[str]:
     source = f"{name} {maker}"
@@ -1312,47 +1294,120 @@ def resolve_catalog_candidates(query: str) -> dict[str, CatalogProduct]:
 
 
 @beartype
-def collect_candidates(query: str) -> list[tuple[ProductCandidate, CatalogProduct | None]]:
-    merged: dict[str, tuple[ProductCandidate, CatalogProduct | None]] = {}
+def gather_sources(calls: dict[str, Callable[[], Any]]) -> dict[str, Any]:
+    """Run independent lookups on LOOKUP_POOL and collect what arrives in time.
+
+    Each call's deadline comes from SOURCE_DEADLINES by the name prefix before
+    ":" (the source kind) and counts from the start of the fan-out. Calls that
+    fail or miss it are logged and left out. A missed call that never started
+    is cancelled; one already running keeps its thread until it returns, so
+    while any call of a kind is still overdue, new calls of that kind are
+    skipped, and nothing is submitted once half the pool is held by overdue
+    calls. Stuck backends therefore cannot starve the rest of the lookups.
+    """
+    started = time.monotonic()
+    with OVERDUE_LOCK:
+        overdue = dict(OVERDUE_LOOKUPS)
+    saturated = sum(overdue.values()) >= max(1, LOOKUP_WORKERS // 2)
+    futures: dict[str, Future[Any]] = {}
+    for name, call in calls.items():
+        kind = name.partition(":")[0]
+        if saturated or overdue.get(kind):
+            reason = "lookup pool saturated" if saturated else f"earlier {kind} lookup still running"
+            print(f"[lookup] {name} skipped: {reason}", flush=True)
+            continue
+        futures[name] = LOOKUP_POOL.submit(call)
+    results: dict[str, Any] = {}
+    for name, future in futures.items():
+        kind = name.partition(":")[0]
+        deadline = SOURCE_DEADLINES.get(kind, DEFAULT_SOURCE_DEADLINE)
+        try:
+            results[name] = future.result(timeout=max(0.0, deadline - (time.monotonic() - started)))
+        except FutureTimeout:
+            if not future.cancel():
+                track_overdue_lookup(kind, future)
+            print(f"[lookup] {name} missed its {deadline:g}s deadline", flush=True)
+        except Exception as exc:
+            print(f"[lookup] {name}: {exc}", flush=True)
+    return results
 
-    try:
-        for candidate in API.search_product(query, limit=6):
-            canonical_candidate, identity_key = resolve_candidate_identity(candidate)
-            payload = (canonical_candidate, None)
-            merged[identity_key] = choose_better_candidate(merged[identity_key], payload) if identity_key in merged else payload
-    except Exception:
-        pass
 
-    catalog_map = resolve_catalog_candidates(query)
-    for row in catalog_map.values():
-        canonical_candidate, identity_key = resolve_candidate_identity(
-            ProductCandidate(ean=row.ean, name=row.name, maker=row.maker, id_name=row.id_name)
-        )
-        payload = (canonical_candidate, row)
-        merged[identity_key] = choose_better_candidate(merged[identity_key], payload) if identity_key in merged else payload
+@beartype
+def track_overdue_lookup(kind: str, future: Future[Any]) -> None:
+    """Count a running lookup that missed its deadline until its thread frees up."""
+
+    def release(_future: Future[Any]) -> None:
+        with OVERDUE_LOCK:
+            OVERDUE_LOOKUPS[kind] -= 1
+
+    with OVERDUE_LOCK:
+        OVERDUE_LOOKUPS[kind] = OVERDUE_LOOKUPS.get(kind, 0) + 1
+    future.add_done_callback(release)
+
+
+@beartype
+def candidate_source_calls(query: str) -> dict[str, Callable[[], Any]]:
+    return {
+        "api_search": lambda: API.search_product(query, limit=6),
+        "catalog": lambda: resolve_catalog_candidates(query),
+        "summary:top": lambda: get_purchase_summary(query, period="all_time", limit=5),
+    }
 
-    try:
-        for item in get_purchase_summary(query, period="all_time", limit=5):
-            canonical_candidate, identity_key = resolve_candidate_identity(
-                ProductCandidate(ean=item.ean, name=item.name, maker=item.maker, id_name=None)
-            )
-            payload = (canonical_candidate, None)
-            merged[identity_key] = choose_better_candidate(merged[identity_key], payload) if identity_key in merged else payload
-    except Exception:
-        pass
 
+@beartype
+def merge_candidates(results: dict[str, Any]) -> list[tuple[ProductCandidate, CatalogProduct | None]]:
+    merged: dict[str, tuple[ProductCandidate, CatalogProduct | None]] = {}
+
+    def push(candidate: ProductCandidate, catalog: CatalogProduct | None) -> None:
+        canonical_candidate, identity_key = resolve_candidate_identity(candidate)
+        payload = (canonical_candidate, catalog)
+        merged[identity_key] = choose_better_candidate(merged[identity_key], payload) if identity_key in merged else payload
+
+    for candidate in results.get("api_search", []):
+        push(candidate, None)
+    for row in results.get("catalog", {}).values():
+        push(ProductCandidate(ean=row.ean, name=row.name, maker=row.maker, id_name=row.id_name), row)
+    for item in results.get("summary:top", []):
+        push(ProductCandidate(ean=item.ean, name=item.name, maker=item.maker, id_name=None), None)
     return list(merged.values())
 
 
+@beartype
+def collect_candidates(query: str) -> list[tuple[ProductCandidate, CatalogProduct | None]]:
+    return merge_candidates(gather_sources(candidate_source_calls(query)))
+
+
+@beartype
+def lookup_inventory(eans: list[str]) -> dict[str, InventoryItem]:
+    """Inventory for the given EANs: one bulk request, then parallel per-EAN requests for any it left out."""
+    eans = list(dict.fromkeys(ean for ean in eans if ean))
+    if not eans:
+        return {}
+    found = dict(gather_sources({"inventory": lambda: API.get_inventory_many(eans)}).get("inventory", {}))
+    missing = [ean for ean in eans if ean not in found]
+    if missing:
+        single = gather_sources({f"inventory:{ean}": (lambda ean=ean: API.get_inventory(ean)) for ean in missing})
+        found.update({name.partition(":")[2]: item for name, item in single.items() if item is not None})
+    return found
+
+
 @beartype
 def build_ranked_candidates(query: str) -> list[RankedCandidate]:
-    month = summary_identity_map(get_purchase_summary(query, period="last_month", limit=8))
-    all_time = summary_identity_map(get_purchase_summary(query, period="all_time", limit=8))
+    results = gather_sources(
+        {
+            **candidate_source_calls(query),
+            "summary:month": lambda: get_purchase_summary(query, period="last_month", limit=8),
+            "summary:all_time": lambda: get_purchase_summary(query, period="all_time", limit=8),
+        }
+    )
+    month = summary_identity_map(results.get("summary:month", []))
+    all_time = summary_identity_map(results.get("summary:all_time", []))
+    resolved = [(resolve_candidate_identity(candidate), catalog) for candidate, catalog in merge_candidates(results)]
+    inventory_by_ean = lookup_inventory([candidate.ean for (candidate, _key), _catalog in resolved])
     ranked: list[RankedCandidate] = []
 
-    for candidate, catalog in collect_candidates(query):
-        candidate, identity_key = resolve_candidate_identity(candidate)
-        inventory = API.get_inventory(candidate.ean)
+    for (candidate, identity_key), catalog in resolved:
+        inventory = inventory_by_ean.get(candidate.ean)
         month_item = month.get(identity_key)
         all_time_item = all_time.get(identity_key)
         score = 0.0
@@ -2090,6 +2145,9 @@ def handle_message(client: httpx.Client, message: dict[str, Any]) -> None:
                 "какой у нас азитромицин; начать пачку -> покажи пачку -> применить пачку.",
             )
             return
+        if text == "/status":
+            send_message(client, chat_id, f"build={BOT_BUILD}\n{history_status_text()}")
+            return
         if should_describe_recent_voice_draft(chat_id, text):
             send_message(client, chat_id, recent_voice_draft_reply(chat_id))
             return
@@ -2342,6 +2400,29 @@ def handle_callback(client: httpx.Client, callback: dict[str, Any]) -> None:
         answer_callback(client, callback_id, "Применил.")
 
 
+def history_sync_loop() -> None:
+    while True:
+        try:
+            copied = HISTORY.sync_replica()
+            if copied:
+                print(f"[history-sync] +{copied} rows | replica rows={HISTORY.replica_status()['rows']}", flush=True)
+        except Exception as exc:
+            print(f"[history-sync] {exc}", flush=True)
+        time.sleep(HISTORY_SYNC_INTERVAL_SECONDS)
+
+
+@beartype
+def history_status_text() -> str:
+    if not HISTORY.replica.configured:
+        return "История закупок: напрямую с сервера (локальная копия выключена)."
+    status = HISTORY.replica_status()
+    if status["age_seconds"] is None:
+        return "История закупок: локальная копия ещё синхронизируется, пока спрашиваю сервер."
+    minutes = int(status["age_seconds"] // 60)
+    freshness = "устарела" if status["stale"] else "актуальна"
+    return f"История закупок: локальная копия {freshness}, {status['rows']} строк, синхронизирована {minutes} мин назад."
+
+
 def main() -> None:
     if not BOT_TOKEN:
         raise SystemExit("Telegram bot token not set")
@@ -2351,9 +2432,12 @@ def main() -> None:
         f"tg-pharma started | build={BOT_BUILD} | file={__file__} | "
         f"api={API_BASE} | allowed={sorted(ALLOWED_CHAT_IDS)} | model={GEMINI_MODEL} | "
         f"refs={'on' if REFS.enabled else 'off'} | refs_db={REFS_DB} | "
-        f"local_analytics_fallback={'on' if LOCAL_ANALYTICS.enabled else 'off'}",
+        f"local_analytics_fallback={'on' if LOCAL_ANALYTICS.enabled else 'off'} | "
+        f"history_replica={'ready' if HISTORY.replica.ready else 'off' if not HISTORY.replica.configured else 'pending'}",
         flush=True,
     )
+    if HISTORY.ssh_enabled and HISTORY.replica.configured:
+        threading.Thread(target=history_sync_loop, name="history-sync", daemon=True).start()
     offset = 0
     last_pending_cleanup = 0.0
     allowed_updates = json.dumps(["message", "callback_query"])
@@ -2393,6 +2477,8 @@ def main() -> None:
             except Exception as exc:
                 print(f"loop error: {exc}", flush=True)
                 time.sleep(2)
+    LOOKUP_POOL.shutdown(wait=False, cancel_futures=True)
+    HISTORY.close()
 
 
 if __name__ == "__main__":
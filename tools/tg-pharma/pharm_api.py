@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-import re
 from typing import Any
 
 import httpx
 from beartype import beartype
 
+from query_text import build_api_query_variants
+
 
 @dataclass(slots=True)
 class ProductCandidate:
@@ -53,35 +54,6 @@ class PharmOrderAPI:
             params.update(extra)
         return params
 
-    @beartype
-    def _query_variants(self, query: str) -> list[str]:
-        cleaned = " ".join(query.strip().split())
-        if not cleaned:
-            return []
-
-        variants: list[str] = [cleaned]
-        tokens = cleaned.split()
-        last = tokens[-1]
-
-        def push(value: str) -> None:
-            normalized = " ".join(value.strip().split())
-            if normalized and normalized not in variants:
-                variants.append(normalized)
-
-        if len(last) >= 6 and last[-1] in "аеиоуыэюяё":
-            tokens_copy = tokens[:]
-            tokens_copy[-1] = last[:-1]
-            push(" ".join(tokens_copy))
-
-        if len(last) >= 7 and re.fullmatch(r"[а-яё-]+", last, flags=re.IGNORECASE):
-            push(" ".join(tokens[:-1] + [last[: max(6, len(last) - 2)]]))
-            push(" ".join(tokens[:-1] + [last[: max(6, len(last) - 1)]]))
-
-        if len(cleaned) >= 7:
-            push(cleaned[: max(6, len(cleaned) - 1)])
-
-        return variants
-
     @beartype
     def search_product(self, query: str, limit: int = 3) -> list[ProductCandidate]:
         query = query.strip()
@@ -91,7 +63,7 @@ class PharmOrderAPI:
         deduped: list[ProductCandidate] = []
         seen: set[str] = set()
         with self._client() as client:
-            for variant in self._query_variants(query):
+            for variant in build_api_query_variants(query):
                 response = client.get("/api/search", params=self._params({"q": variant}))
                 response.raise_for_status()
                 payload = response.json()
@@ -146,11 +118,42 @@ class PharmOrderAPI:
                 return None
             response.raise_for_status()
             payload = response.json()
+        return self._inventory_item(payload)
+
+    @beartype
+    def get_inventory_many(self, eans: list[str]) -> dict[str, InventoryItem]:
+        """Inventory for several EANs from one GET /api/inventory?ean=a,b,c.
+
+        EANs the response does not mention are absent from the result; that
+        means "unknown", not "out of stock", so callers should look them up
+        with get_inventory().
+        """
+        wanted = list(dict.fromkeys(ean.strip() for ean in eans if ean.strip()))
+        if not wanted:
+            return {}
+        with self._client() as client:
+            response = client.get("/api/inventory", params=self._params({"ean": ",".join(wanted)}))
+            response.raise_for_status()
+            payload = response.json()
+        rows = payload.get("items", payload.get("inventory")) if isinstance(payload, dict) else payload
+        if not isinstance(rows, list):
+            raise PharmOrderError("Unexpected /api/inventory payload")
+        found: dict[str, InventoryItem] = {}
+        for row in rows:
+            if not isinstance(row, dict):
+                continue
+            item = self._inventory_item(row)
+            if item.ean in wanted:
+                found[item.ean] = item
+        return found
+
+    @staticmethod
+    def _inventory_item(payload: dict[str, Any]) -> InventoryItem:
         return InventoryItem(
             ean=str(payload.get("ean", "")).strip(),
             name=str(payload.get("name", "")).strip(),
             maker=str(payload.get("maker", "")).strip(),
-            qty=int(payload.get("qty", 0)),
+            qty=int(payload.get("qty", 0) or 0),
             updated_at=str(payload.get("updated_at", "")).strip(),
         )
 
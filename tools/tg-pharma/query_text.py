@@ -0,0 +1,313 @@
+"""Query normalization, variant expansion and stemming shared by the bot's product lookups.
+
+One user turn asks the PharmOrder API, the SSH history worker, the refs DB and
+the local analytics DB about the same phrase, so the expansions are memoized
+in bounded LRU caches keyed by the whitespace-normalized query.
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+
+from beartype import beartype
+
+SOFT_QUERY_FILLERS = (
+    "давай",
+    "ещё",
+    "еще",
+    "разок",
+    "снова",
+    "слушай",
+    "возьми",
+    "потом",
+    "ка",
+    "тест",
+    "очередной",
+    "очередная",
+    "очередное",
+    "очередную",
+    "тоже",
+)
+SPECIAL_TOKEN_ALIASES: dict[str, tuple[str, ...]] = {
+    "македонский": ("македония",),
+    "македонского": ("македония",),
+    "македонскому": ("македония",),
+    "македонским": ("македония",),
+    "македонская": ("македония",),
+    "македонскую": ("македония",),
+    "венгерский": ("венгрия",),
+    "венгерского": ("венгрия",),
+    "венгерскому": ("венгрия",),
+    "хорватский": ("хорватия",),
+    "хорватского": ("хорватия",),
+    "хорватскому": ("хорватия",),
+    "активированный": ("актив",),
+    "активированного": ("актив",),
+    "активированному": ("актив",),
+    "активированным": ("актив",),
+    "активированная": ("актив",),
+    "активированную": ("актив",),
+    "угля": ("уголь",),
+    "азитромицинов": ("азитромицин",),
+    "азитромицинам": ("азитромицин",),
+    "азитромицинах": ("азитромицин",),
+}
+
+
+SPOKEN_NUMERIC_ALIASES: dict[str, tuple[str, ...]] = {
+    "пятисотый": ("500", "0.5"),
+    "пятисотого": ("500", "0.5"),
+    "пятисотому": ("500", "0.5"),
+    "пятисотым": ("500", "0.5"),
+    "пятисотая": ("500", "0.5"),
+    "пятисотую": ("500", "0.5"),
+    "пятисотые": ("500", "0.5"),
+    "пятисотых": ("500", "0.5"),
+    "пятисотыми": ("500", "0.5"),
+    "двухсотпятидесятый": ("250", "0.25"),
+    "двухсотпятидесятого": ("250", "0.25"),
+    "двухсотпятидесятому": ("250", "0.25"),
+    "двухсотпятидесятым": ("250", "0.25"),
+    "стопятидесятый": ("150", "0.15"),
+    "стопятидесятого": ("150", "0.15"),
+    "стодвадцатипятый": ("125", "0.125"),
+    "стодвадцатипятого": ("125", "0.125"),
+    "восьмисотсемьдесятпятый": ("875", "0.875"),
+    "восьмисотсемьдесятпятого": ("875", "0.875"),
+    "тысячный": ("1000", "1.0"),
+    "тысячного": ("1000", "1.0"),
+    "сотый": ("100",),
+    "сотого": ("100",),
+    "пятидесятый": ("50",),
+    "пятидесятого": ("50",),
+    "десятый": ("10",),
+    "десятого": ("10",),
+}
+
+
+VARIANT_CACHE_SIZE = 512
+STOP_TOKENS = frozenset({"в", "во", "и", "с", "со", "на", "по", "для", "из", "к", "у", "о", "об", "от", "до"})
+TOKEN_ENDINGS: tuple[tuple[str, str], ...] = (
+    ("ов", ""),
+    ("ев", ""),
+    ("ах", ""),
+    ("ях", ""),
+    ("ых", "ый"),
+    ("их", "ий"),
+    ("ого", "ый"),
+    ("ому", "ый"),
+    ("ыми", "ый"),
+    ("ими", "ий"),
+    ("а", ""),
+    ("я", ""),
+    ("у", "а"),
+    ("ю", "я"),
+    ("ы", "а"),
+    ("и", "а"),
+    ("ой", "а"),
+    ("ей", "я"),
+)
+DOSAGE_REPLACEMENTS: tuple[tuple[str, tuple[str, ...]], ...] = (
+    (" 125 ", (" 0.125 ", " 0,125 ")),
+    (" 250 ", (" 0.25 ", " 0,25 ")),
+    (" 500 ", (" 0.5 ", " 0,5 ")),
+    (" 750 ", (" 0.75 ", " 0,75 ")),
+    (" 875 ", (" 0.875 ", " 0,875 ")),
+    (" 1000 ", (" 1.0 ", " 1,0 ")),
+)
+ALIAS_SUFFIXES = (
+    "овского",
+    "евского",
+    "ского",
+    "ового",
+    "евого",
+    "овский",
+    "евский",
+    "овск",
+    "евск",
+    "ого",
+    "его",
+    "ому",
+    "ему",
+    "ыми",
+    "ими",
+    "ым",
+    "им",
+    "ая",
+    "яя",
+    "ый",
+    "ий",
+    "ой",
+)
+
+_SPACES_RE = re.compile(r"\s+")
+_NOT_FORTE_RE = re.compile(r"\bне\s+форте\b", re.IGNORECASE)
+_IMENNO_RE = re.compile(r"\bименно\b", re.IGNORECASE)
+_PLAIN_RE = re.compile(r"\bобычн(?:ый|ого|ому|ым|ом|ая|ую|ой|ое|ые|ых|ыми)?\b", re.IGNORECASE)
+_PRONOUN_RE = re.compile(r"\b(его|её|ее)\b", re.IGNORECASE)
+_FILLERS_RE = re.compile(rf"\b({'|'.join(re.escape(item) for item in SOFT_QUERY_FILLERS)})\b", re.IGNORECASE)
+_CYRILLIC_WORD_RE = re.compile(r"[а-яё-]+", re.IGNORECASE)
+_ALIAS_JUNK_RE = re.compile(r"[^а-яa-z0-9]+")
+
+
+def _clean_query(query: str) -> str:
+    return " ".join(query.strip().split())
+
+
+@beartype
+def normalize_search_text(text: str) -> str:
+    lowered = text.casefold()
+    lowered = lowered.replace("ё", "е")
+    lowered = lowered.replace("№", " ")
+    lowered = lowered.replace(",", " ")
+    lowered = lowered.replace(".", " ")
+    lowered = lowered.replace("/", " ")
+    lowered = lowered.replace("\\", " ")
+    lowered = lowered.replace("-", " ")
+    lowered = _SPACES_RE.sub(" ", lowered)
+    return lowered.strip()
+
+
+def _strip_soft_modifiers(value: str) -> str:
+    normalized = f" {value.strip()} "
+    normalized = _NOT_FORTE_RE.sub(" ", normalized)
+    normalized = _IMENNO_RE.sub(" ", normalized)
+    normalized = _PLAIN_RE.sub(" ", normalized)
+    normalized = _PRONOUN_RE.sub(" ", normalized)
+    normalized = _FILLERS_RE.sub(" ", normalized)
+    normalized = _SPACES_RE.sub(" ", normalized)
+    return normalized.strip()
+
+
+@lru_cache(maxsize=VARIANT_CACHE_SIZE * 4)
+def _token_fallbacks(token: str) -> tuple[str, ...]:
+    token = token.strip().strip(" ,.;:!?")
+    if len(token) < 4:
+        return ()
+    options: set[str] = set(SPECIAL_TOKEN_ALIASES.get(token.lower(), ()))
+    options.update(SPOKEN_NUMERIC_ALIASES.get(token.lower(), ()))
+    for old, new in TOKEN_ENDINGS:
+        if token.endswith(old) and len(token) - len(old) >= 3:
+            options.add(token[: -len(old)] + new)
+    return tuple(item for item in options if item != token)
+
+
+@lru_cache(maxsize=VARIANT_CACHE_SIZE)
+def _query_variants(cleaned: str) -> tuple[str, ...]:
+    variants: list[str] = [cleaned]
+
+    def push(value: str) -> None:
+        normalized = " ".join(value.strip().split())
+        if normalized and normalized not in variants:
+            variants.append(normalized)
+
+    push(cleaned[:1].upper() + cleaned[1:])
+    stripped = _strip_soft_modifiers(cleaned)
+    if stripped and stripped != cleaned:
+        push(stripped)
+        push(stripped[:1].upper() + stripped[1:])
+
+    base_tokens = cleaned.split()
+    for idx, token in enumerate(base_tokens):
+        for alt in _token_fallbacks(token):
+            mutated = list(base_tokens)
+            mutated[idx] = alt
+            push(" ".join(mutated))
+
+    padded = f" {cleaned} "
+    for needle, options in DOSAGE_REPLACEMENTS:
+        if needle in padded:
+            for option in options:
+                push(padded.replace(needle, option).strip())
+
+    for variant in list(variants):
+        push(variant.replace(" 0.5", ",0.5"))
+        push(variant.replace(" 0,5", ",0.5"))
+        push(variant.replace(" 0.25", ",0.25"))
+        push(variant.replace(" 0,25", ",0.25"))
+
+    for variant in list(variants):
+        stripped_variant = _strip_soft_modifiers(variant)
+        if stripped_variant and stripped_variant != variant:
+            push(stripped_variant)
+            push(stripped_variant[:1].upper() + stripped_variant[1:])
+
+    for variant in list(variants):
+        tokens = variant.split()
+        for idx, token in enumerate(tokens):
+            for alt in _token_fallbacks(token):
+                mutated = list(tokens)
+                mutated[idx] = alt
+                push(" ".join(mutated))
+
+    for variant in list(variants):
+        if variant:
+            push(variant[:1].upper() + variant[1:])
+
+    return tuple(variants)
+
+
+@lru_cache(maxsize=VARIANT_CACHE_SIZE)
+def _variant_tokens(cleaned: str) -> tuple[tuple[str, ...], ...]:
+    token_groups: list[tuple[str, ...]] = []
+    for variant in _query_variants(cleaned):
+        prepared = normalize_search_text(variant).replace("mg", " ")
+        tokens = tuple(token for token in prepared.split() if len(token) > 1 and token not in STOP_TOKENS)
+        if tokens and tokens not in token_groups:
+            token_groups.append(tokens)
+    return tuple(token_groups)
+
+
+@beartype
+def build_query_variants(query: str) -> list[str]:
+    cleaned = _clean_query(query)
+    return list(_query_variants(cleaned)) if cleaned else []
+
+
+@beartype
+def build_variant_tokens(query: str) -> list[list[str]]:
+    cleaned = _clean_query(query)
+    return [list(tokens) for tokens in _variant_tokens(cleaned)] if cleaned else []
+
+
+@lru_cache(maxsize=VARIANT_CACHE_SIZE)
+@beartype
+def build_api_query_variants(query: str) -> tuple[str, ...]:
+    """Truncated spellings for PharmOrder's /api/search, which has no stemming of its own."""
+    cleaned = _clean_query(query)
+    if not cleaned:
+        return ()
+
+    variants: list[str] = [cleaned]
+    tokens = cleaned.split()
+    last = tokens[-1]
+
+    def push(value: str) -> None:
+        normalized = " ".join(value.strip().split())
+        if normalized and normalized not in variants:
+            variants.append(normalized)
+
+    if len(last) >= 6 and last[-1] in "аеиоуыэюяё":
+        tokens_copy = tokens[:]
+        tokens_copy[-1] = last[:-1]
+        push(" ".join(tokens_copy))
+
+    if len(last) >= 7 and _CYRILLIC_WORD_RE.fullmatch(last):
+        push(" ".join(tokens[:-1] + [last[: max(6, len(last) - 2)]]))
+        push(" ".join(tokens[:-1] + [last[: max(6, len(last) - 1)]]))
+
+    if len(cleaned) >= 7:
+        push(cleaned[: max(6, len(cleaned) - 1)])
+
+    return tuple(variants)
+
+
+@lru_cache(maxsize=VARIANT_CACHE_SIZE * 4)
+@beartype
+def normalize_alias_token(value: str) -> str:
+    normalized = value.lower().replace("ё", "е")
+    normalized = _ALIAS_JUNK_RE.sub("", normalized)
+    for suffix in ALIAS_SUFFIXES:
+        if normalized.endswith(suffix) and len(normalized) - len(suffix) >= 4:
+            return normalized[: -len(suffix)]
+    return normalized
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import history_client
+import pytest
+from history_client import (
+    HistoryReplica,
+    SSHWorkerPool,
+    build_like_clause,
+    build_search_source,
+)
+from query_text import normalize_search_text
+
+
+class FakeWorker:
+    """Stands in for _RemoteWorker: no SSH, replies scripted per test."""
+
+    def __init__(self, host: str, username: str, password: str, timeout: float, keepalive: int) -> None:
+        self.alive = True
+        self.closed = False
+        self.last_used = time.monotonic()
+        self.replies: list[Any] = []  # rows to return, or an exception to raise, per request
+
+    def request(self, op: str, payload: dict[str, Any]) -> list[dict[str, Any]]:
+        reply = self.replies.pop(0) if self.replies else [{"op": op}]
+        if isinstance(reply, BaseException):
+            raise reply
+        return reply
+
+    def close(self) -> None:
+        self.closed = True
+        self.alive = False
+
+
+@pytest.fixture
+def workers(monkeypatch: pytest.MonkeyPatch) -> list[FakeWorker]:
+    """Every worker the pool opens, in creation order."""
+    created: list[FakeWorker] = []
+
+    def factory(*args: Any) -> FakeWorker:
+        worker = FakeWorker(*args)
+        created.append(worker)
+        return worker
+
+    monkeypatch.setattr(history_client, "_RemoteWorker", factory)
+    return created
+
+
+def make_pool(**kwargs: Any) -> SSHWorkerPool:
+    return SSHWorkerPool("vps", "user", "secret", timeout=5.0, **kwargs)
+
+
+def test_call_reuses_an_idle_worker(workers: list[FakeWorker]) -> None:
+    pool = make_pool()
+    assert pool.call("orders_head", {}) == [{"op": "orders_head"}]
+    assert pool.call("orders_head", {}) == [{"op": "orders_head"}]
+    assert len(workers) == 1
+
+    pool.close()
+    assert workers[0].closed
+
+
+def test_acquire_fails_after_acquire_timeout_when_pool_is_busy(workers: list[FakeWorker]) -> None:
+    pool = make_pool(max_size=1, acquire_timeout=0.05)
+    busy, _ = pool._acquire(time.monotonic() + 1)
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError, match="no free SSH worker"):
+        pool.call("orders_head", {})
+    assert 0.05 <= time.monotonic() - started < 1.0
+    assert len(workers) == 1
+
+    pool._release(busy)
+    assert pool.call("orders_head", {}) == [{"op": "orders_head"}]
+
+
+def test_waiting_call_gets_the_worker_released_before_its_deadline(workers: list[FakeWorker]) -> None:
+    pool = make_pool(max_size=1, acquire_timeout=5.0)
+    busy, _ = pool._acquire(time.monotonic() + 1)
+    threading.Timer(0.05, pool._release, args=(busy,)).start()
+
+    assert pool.call("orders_head", {}) == [{"op": "orders_head"}]
+    assert len(workers) == 1
+
+
+def test_stale_reused_worker_is_replaced_and_retried_once(workers: list[FakeWorker]) -> None:
+    pool = make_pool()
+    pool.call("orders_head", {})
+    workers[0].replies = [EOFError("remote worker exited: ")]
+
+    assert pool.call("orders_since", {"after_rowid": 0}) == [{"op": "orders_since"}]
+    assert len(workers) == 2
+    assert workers[0].closed
+    assert not workers[1].closed
+    assert pool._open == 1
+
+
+def test_fresh_worker_failure_is_not_retried(monkeypatch: pytest.MonkeyPatch) -> None:
+    created: list[FakeWorker] = []
+
+    class DeadOnArrival(FakeWorker):
+        def __init__(self, *args: Any) -> None:
+            super().__init__(*args)
+            self.replies = [EOFError("remote worker exited: python3: not found")]
+            created.append(self)
+
+    monkeypatch.setattr(history_client, "_RemoteWorker", DeadOnArrival)
+    pool = make_pool()
+
+    with pytest.raises(EOFError, match="not found"):
+        pool.call("orders_head", {})
+    assert len(created) == 1
+    assert created[0].closed
+    assert pool._open == 0
+
+
+def test_timed_out_query_is_not_retried(workers: list[FakeWorker]) -> None:
+    pool = make_pool()
+    pool.call("orders_head", {})
+    workers[0].replies = [TimeoutError("timed out")]
+
+    with pytest.raises(TimeoutError, match="timed out"):
+        pool.call("orders_since", {"after_rowid": 0})
+    assert len(workers) == 1
+    assert workers[0].closed
+    assert pool._open == 0
+
+
+def test_query_error_keeps_the_worker(workers: list[FakeWorker]) -> None:
+    pool = make_pool()
+    pool.call("orders_head", {})
+    workers[0].replies = [history_client.RemoteWorkerError("no such table: orders")]
+
+    with pytest.raises(history_client.RemoteWorkerError):
+        pool.call("orders_head", {})
+    assert pool.call("orders_head", {}) == [{"op": "orders_head"}]
+    assert len(workers) == 1
+
+
+def order(rid: int, tovar: str, days_ago: int, kol: float = 1.0) -> dict[str, Any]:
+    nakl_date = (datetime.now(UTC) - timedelta(days=days_ago)).strftime("%Y-%m-%d %H:%M:%S")
+    return {"rid": rid, "ean": f"46{rid:011d}", "tovar": tovar, "maker": "", "post": "Протек", "nakl_date": nakl_date, "kol": kol}
+
+
+class FakeRemote:
+    """The VPS orders table behind the worker's orders_* ops."""
+
+    def __init__(self, rows: list[dict[str, Any]]) -> None:
+        self.rows = {row["rid"]: row for row in rows}
+        self.calls: list[tuple[str, dict[str, Any]]] = []
+        self.on_page: Any = None  # called before each orders_since page is served
+
+    def __call__(self, op: str, payload: dict[str, Any]) -> list[dict[str, Any]]:
+        self.calls.append((op, payload))
+        ordered = [self.rows[rid] for rid in sorted(self.rows)]
+        if op == "orders_head":
+            return [{"max_rowid": max(self.rows, default=0), "row_count": len(ordered)}]
+        if op == "orders_since":
+            if self.on_page is not None:
+                self.on_page()
+            return [row for row in ordered if row["rid"] > payload["after_rowid"]][: payload["limit"]]
+        if op == "orders_recent":
+            cutoff = (datetime.now(UTC) - timedelta(days=payload["days"])).strftime("%Y-%m-%d")
+            return [row for row in ordered if row["nakl_date"][:10] >= cutoff]
+        raise AssertionError(f"unexpected op {op}")
+
+
+def replica_rows(path: Path) -> dict[int, tuple[str, float]]:
+    with sqlite3.connect(path) as conn:
+        return {rid: (tovar, kol) for rid, tovar, kol in conn.execute("SELECT rid, tovar, kol FROM orders")}
+
+
+@pytest.fixture
+def replica(tmp_path: Path) -> HistoryReplica:
+    replica = HistoryReplica(str(tmp_path / "replica.db"))
+    replica.PAGE_SIZE = 2
+    return replica
+
+
+def test_replica_sync_pages_past_the_watermark(replica: HistoryReplica) -> None:
+    remote = FakeRemote([order(rid, f"Товар {rid}", days_ago=30) for rid in range(1, 6)])
+    assert not replica.ready
+
+    assert replica.sync(remote) == 5
+    assert replica.ready
+    assert [payload["after_rowid"] for op, payload in remote.calls if op == "orders_since"] == [0, 2, 4]
+    assert replica.status()["last_rowid"] == 5
+    assert sorted(replica_rows(replica.db_path)) == [1, 2, 3, 4, 5]
+
+    remote.rows[6] = order(6, "Товар 6", days_ago=30)
+    remote.calls.clear()
+    assert replica.sync(remote) == 1
+    assert [payload["after_rowid"] for op, payload in remote.calls if op == "orders_since"] == [5]
+    status = replica.status()
+    assert (status["rows"], status["last_rowid"]) == (6, 6)
+    assert 0 <= status["age_seconds"] < 60
+
+
+def test_replica_resync_window_picks_up_recent_edits_and_deletes(replica: HistoryReplica) -> None:
+    remote = FakeRemote([
+        order(1, "Старый", days_ago=30),
+        order(2, "Вчерашний", days_ago=1, kol=2.0),
+        order(3, "Удалённый", days_ago=1),
+        order(4, "Старый удалённый", days_ago=30),
+    ])
+    replica.sync(remote)
+
+    remote.rows[1]["kol"] = 9.0  # outside RESYNC_DAYS: not re-copied
+    remote.rows[2]["kol"] = 5.0
+    del remote.rows[3]
+    del remote.rows[4]
+    remote.rows[5] = order(5, "Новый", days_ago=0)
+    replica.sync(remote)
+
+    assert ("orders_recent", {"days": HistoryReplica.RESYNC_DAYS}) in remote.calls
+    assert replica_rows(replica.db_path) == {
+        1: ("Старый", 1.0),
+        2: ("Вчерашний", 5.0),
+        4: ("Старый удалённый", 1.0),
+        5: ("Новый", 1.0),
+    }
+
+
+def test_replica_rebuilds_into_staging_when_remote_rowids_go_back(replica: HistoryReplica) -> None:
+    remote = FakeRemote([order(rid, f"Старый {rid}", days_ago=30) for rid in range(1, 6)])
+    replica.sync(remote)
+
+    remote.rows = {rid: order(rid, f"Новый {rid}", days_ago=30) for rid in range(1, 4)}
+    seen_during_copy: list[dict[int, tuple[str, float]]] = []
+    remote.on_page = lambda: seen_during_copy.append(replica_rows(replica.db_path))
+    assert replica.sync(remote) == 3
+
+    assert seen_during_copy
+    assert all(sorted(rows) == [1, 2, 3, 4, 5] for rows in seen_during_copy)  # old mirror kept meanwhile
+    assert replica_rows(replica.db_path) == {rid: (f"Новый {rid}", 1.0) for rid in range(1, 4)}
+    assert replica.status()["last_rowid"] == 3
+    with sqlite3.connect(replica.db_path) as conn:
+        names = {name for (name,) in conn.execute("SELECT name FROM sqlite_master")}
+    assert "orders_rebuild" not in names
+    assert "idx_orders_nakl_date" in names
+
+
+PRODUCTS = [
+    "Нурофен таб 200мг №10",
+    'Нурофен "Экспресс" капс',
+    "Аспирин (кардио) таб 100мг",
+    "Витамин D3 капли",
+    "Витамин C таб",
+    "Но-шпа 40мг таб",
+    "L'Oreal крем",
+    "NEAR(a b) тест",
+    "AND/OR набор",
+]
+
+
+@pytest.fixture
+def products() -> sqlite3.Connection:
+    """Products table with a contentless trigram index, as build_analytics lays it out."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE products (name TEXT, search_text TEXT)")
+    conn.execute("CREATE VIRTUAL TABLE products_fts USING fts5(search_text, content='', tokenize='trigram')")
+    conn.executemany("INSERT INTO products VALUES (?, ?)", [(name, normalize_search_text(name)) for name in PRODUCTS])
+    conn.execute("INSERT INTO products_fts (rowid, search_text) SELECT rowid, search_text FROM products")
+    return conn
+
+
+def search(conn: sqlite3.Connection, query: str) -> tuple[bool, list[str]]:
+    source, where_sql, args, rank = build_search_source(conn, "products", "products.search_text", "products_fts", query)
+    rows = conn.execute(f"SELECT products.name FROM {source} WHERE {where_sql} ORDER BY {rank}, products.name", args)
+    return source != "products", sorted(name for (name,) in rows)
+
+
+@pytest.mark.parametrize(
+    ("query", "uses_fts", "expected"),
+    [
+        ("нурофен", True, ['Нурофен "Экспресс" капс', "Нурофен таб 200мг №10"]),
+        ('"экспресс"', True, ['Нурофен "Экспресс" капс']),
+        ("l'oreal", True, ["L'Oreal крем"]),
+        ("аспирин (кардио)", True, ["Аспирин (кардио) таб 100мг"]),
+        ("NEAR(a b)", True, ["NEAR(a b) тест"]),
+        ("AND", True, ["AND/OR набор"]),
+        ("нурофен OR NOT", True, []),  # operators are literal terms, not FTS syntax
+        ("нуроф*", True, []),  # no prefix queries either
+        ("витамин d3", True, ["Витамин D3 капли"]),  # "d3" is too short for trigrams, LIKE re-checks it
+        ("но-шпа 40", False, ["Но-шпа 40мг таб"]),  # a variant has no trigram-sized term
+        ("ab", False, []),
+        ("", False, []),
+    ],
+)
+def test_fts_search_matches_like_scan(products: sqlite3.Connection, query: str, uses_fts: bool, expected: list[str]) -> None:
+    assert search(products, query) == (uses_fts, expected)
+
+    where_sql, args = build_like_clause("search_text", query)
+    like_only = sorted(name for (name,) in products.execute(f"SELECT name FROM products WHERE {where_sql}", args))
+    assert like_only == expected
+
+
+def test_search_source_without_fts_index_is_plain_like(products: sqlite3.Connection) -> None:
+    products.execute("DROP TABLE products_fts")
+    assert search(products, "нурофен") == (False, ['Нурофен "Экспресс" капс', "Нурофен таб 200мг №10"])
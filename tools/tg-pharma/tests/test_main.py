@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+pytest.importorskip("google.genai")
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")  # main builds its Gemini client at import
+
+import main
+from history_client import HistoryAnalyticsClient
+from pharm_api import InventoryItem
+
+
+class StopLoop(Exception):
+    pass
+
+
+def remote_orders(rows: list[dict[str, Any]]) -> Any:
+    """Fake SSH pool call serving the worker's orders_* ops from rows."""
+
+    def call(op: str, payload: dict[str, Any]) -> list[dict[str, Any]]:
+        if op == "orders_head":
+            return [{"max_rowid": len(rows), "row_count": len(rows)}]
+        if op == "orders_since":
+            return rows[payload["after_rowid"]:][: payload["limit"]]
+        return []
+
+    return call
+
+
+@pytest.fixture
+def history(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> HistoryAnalyticsClient:
+    client = HistoryAnalyticsClient(
+        host="vps", username="bot", password="secret", replica_path=str(tmp_path / "replica.db"), replica_stale_after=600.0
+    )
+    monkeypatch.setattr(main, "HISTORY", client)
+    return client
+
+
+def test_history_sync_loop_survives_failures_and_reports_copies(
+    history: HistoryAnalyticsClient, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    rows = [{"rid": rid, "tovar": f"Товар {rid}", "nakl_date": "2025-01-10"} for rid in (1, 2)]
+    sleeps: list[float] = []
+
+    def fake_sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        if len(sleeps) == 2:
+            raise StopLoop
+
+    outcomes = iter([OSError("connection refused"), None])
+
+    def fetch(op: str, payload: dict[str, Any]) -> list[dict[str, Any]]:
+        if op == "orders_head" and (error := next(outcomes)) is not None:
+            raise error
+        return remote_orders(rows)(op, payload)
+
+    monkeypatch.setattr(history.pool, "call", fetch)
+    monkeypatch.setattr(main.time, "sleep", fake_sleep)
+    with pytest.raises(StopLoop):
+        main.history_sync_loop()
+
+    assert sleeps == [main.HISTORY_SYNC_INTERVAL_SECONDS] * 2
+    assert capsys.readouterr().out.splitlines() == [
+        "[history-sync] connection refused",
+        "[history-sync] +2 rows | replica rows=2",
+    ]
+
+
+def test_history_status_text(history: HistoryAnalyticsClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    assert "ещё синхронизируется" in main.history_status_text()
+
+    rows = [{"rid": 1, "tovar": "Нурофен", "nakl_date": "2025-01-10"}]
+    monkeypatch.setattr(history.pool, "call", remote_orders(rows))
+    history.sync_replica()
+    assert main.history_status_text() == (
+        "История закупок: локальная копия актуальна, 1 строк, синхронизирована 0 мин назад."
+    )
+
+    history.replica_stale_after = -1.0
+    assert "локальная копия устарела" in main.history_status_text()
+
+    monkeypatch.setattr(main, "HISTORY", HistoryAnalyticsClient())
+    assert main.history_status_text() == "История закупок: напрямую с сервера (локальная копия выключена)."
+
+
+@pytest.fixture
+def lookups(monkeypatch: pytest.MonkeyPatch) -> Iterator[threading.Event]:
+    """Private lookup pool and overdue counters; set the event to unblock slow sources."""
+    release = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="test-lookup")
+    monkeypatch.setattr(main, "LOOKUP_POOL", pool)
+    monkeypatch.setattr(main, "LOOKUP_WORKERS", 4)
+    monkeypatch.setattr(main, "OVERDUE_LOOKUPS", {})
+    monkeypatch.setattr(main, "SOURCE_DEADLINES", {"fast": 2.0, "slow": 0.05})
+    yield release
+    release.set()
+    pool.shutdown(wait=True)
+
+
+def test_gather_sources_drops_late_and_failing_calls(lookups: threading.Event) -> None:
+    def broken() -> None:
+        raise RuntimeError("backend down")
+
+    started = time.monotonic()
+    results = main.gather_sources({"fast": lambda: "ok", "slow": lookups.wait, "fast:broken": broken})
+
+    assert results == {"fast": "ok"}
+    assert time.monotonic() - started < 1.0
+    assert main.OVERDUE_LOOKUPS == {"slow": 1}
+
+
+def test_overdue_kind_is_skipped_until_its_call_returns(lookups: threading.Event) -> None:
+    main.gather_sources({"slow:a": lookups.wait})
+    assert main.OVERDUE_LOOKUPS == {"slow": 1}
+
+    calls: list[str] = []
+    results = main.gather_sources({"slow:b": lambda: calls.append("slow") or "late", "fast": lambda: "ok"})
+    assert results == {"fast": "ok"}
+    assert calls == []
+
+    lookups.set()
+    deadline = time.monotonic() + 2.0
+    while main.OVERDUE_LOOKUPS["slow"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert main.OVERDUE_LOOKUPS == {"slow": 0}
+    assert main.gather_sources({"slow:c": lambda: "back"}) == {"slow:c": "back"}
+
+
+def test_gather_sources_submits_nothing_once_half_the_pool_is_overdue(lookups: threading.Event) -> None:
+    main.gather_sources({"slow:a": lookups.wait, "slow:b": lookups.wait})
+    assert main.OVERDUE_LOOKUPS == {"slow": 2}
+
+    assert main.gather_sources({"fast": lambda: "ok"}) == {}
+
+
+class FakeInventoryAPI:
+    def __init__(self, stock: dict[str, int], bulk_knows: set[str] | None) -> None:
+        self.stock = stock
+        self.bulk_knows = bulk_knows  # None: the bulk endpoint fails
+        self.calls: list[tuple[str, Any]] = []
+
+    def item(self, ean: str) -> InventoryItem:
+        return InventoryItem(ean=ean, name=f"Товар {ean}", maker="", qty=self.stock[ean])
+
+    def get_inventory_many(self, eans: list[str]) -> dict[str, InventoryItem]:
+        self.calls.append(("many", eans))
+        if self.bulk_knows is None:
+            raise OSError("connection reset")
+        return {ean: self.item(ean) for ean in eans if ean in self.bulk_knows}
+
+    def get_inventory(self, ean: str) -> InventoryItem | None:
+        self.calls.append(("one", ean))
+        return self.item(ean) if ean in self.stock else None
+
+
+@pytest.mark.parametrize(
+    ("bulk_knows", "per_ean"),
+    [
+        ({"a", "b"}, ["c", "d"]),  # bulk answered for some: only the rest go one by one
+        ({"a", "b", "c"}, ["d"]),  # an EAN the bulk reply leaves out is unknown, not out of stock
+        (None, ["a", "b", "c", "d"]),  # bulk failed: every EAN one by one
+    ],
+)
+def test_lookup_inventory_falls_back_per_ean(
+    lookups: threading.Event, monkeypatch: pytest.MonkeyPatch, bulk_knows: set[str] | None, per_ean: list[str]
+) -> None:
+    api = FakeInventoryAPI({"a": 1, "b": 0, "c": 5}, bulk_knows)  # "d" is not stocked at all
+    monkeypatch.setattr(main, "API", api)
+
+    found = main.lookup_inventory(["a", "b", "", "a", "c", "d"])
+
+    assert {ean: item.qty for ean, item in found.items()} == {"a": 1, "b": 0, "c": 5}
+    assert api.calls[0] == ("many", ["a", "b", "c", "d"])
+    assert sorted(ean for kind, ean in api.calls[1:]) == per_ean
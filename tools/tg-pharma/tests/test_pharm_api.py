@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import Any
+
+import httpx
+import pytest
+from pharm_api import InventoryItem, PharmOrderAPI, PharmOrderError
+
+
+def make_api(monkeypatch: pytest.MonkeyPatch, payload: Any, requests: list[httpx.Request]) -> PharmOrderAPI:
+    """PharmOrderAPI whose HTTP calls are answered with payload by a mock transport."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json=payload)
+
+    api = PharmOrderAPI("http://pharmorder.test", "secret")
+    monkeypatch.setattr(
+        api, "_client", lambda: httpx.Client(base_url=api.base_url, transport=httpx.MockTransport(handler))
+    )
+    return api
+
+
+ROWS = [
+    {"ean": "4600001", "name": "Нурофен", "maker": "Reckitt", "qty": 3, "updated_at": "2026-03-01"},
+    {"ean": "4600002", "name": "Но-шпа", "maker": "Sanofi", "qty": None},
+    {"ean": "4600009", "name": "Not asked for", "qty": 7},
+    "garbage",
+]
+
+
+@pytest.mark.parametrize("payload", [ROWS, {"items": ROWS}, {"inventory": ROWS}])
+def test_get_inventory_many_parses_every_payload_shape(monkeypatch: pytest.MonkeyPatch, payload: Any) -> None:
+    requests: list[httpx.Request] = []
+    api = make_api(monkeypatch, payload, requests)
+
+    found = api.get_inventory_many(["4600001", " 4600002 ", "4600001", "", "4600003"])
+
+    assert found == {
+        "4600001": InventoryItem("4600001", "Нурофен", "Reckitt", 3, "2026-03-01"),
+        "4600002": InventoryItem("4600002", "Но-шпа", "Sanofi", 0),
+    }
+    assert len(requests) == 1
+    assert requests[0].url.path == "/api/inventory"
+    assert dict(requests[0].url.params) == {"key": "secret", "ean": "4600001,4600002,4600003"}
+
+
+def test_get_inventory_many_without_eans_sends_nothing(monkeypatch: pytest.MonkeyPatch) -> None:
+    requests: list[httpx.Request] = []
+    api = make_api(monkeypatch, ROWS, requests)
+
+    assert api.get_inventory_many(["", "  "]) == {}
+    assert requests == []
+
+
+@pytest.mark.parametrize("payload", [{"detail": "not found"}, {"items": None}, "oops"])
+def test_get_inventory_many_rejects_unexpected_payloads(monkeypatch: pytest.MonkeyPatch, payload: Any) -> None:
+    api = make_api(monkeypatch, payload, [])
+
+    with pytest.raises(PharmOrderError, match="Unexpected /api/inventory payload"):
+        api.get_inventory_many(["4600001"])